@@ -3,10 +3,25 @@ Customer Models - Kundenverwaltung
 """
 
 from django.db import models
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Concat, Trim
 
 from apps.users.models import Tenant
 
 
+def display_name_expression(prefix: str = ""):
+    """
+    SQL expression matching Customer.display_name (company, else first and last name).
+
+    prefix: lookup path to the customer, e.g. "customer__" for invoice querysets
+    """
+    return Case(
+        When(~Q(**{f"{prefix}company_name": ""}), then=f"{prefix}company_name"),
+        default=Trim(Concat(f"{prefix}first_name", Value(" "), f"{prefix}last_name")),
+        output_field=models.CharField(),
+    )
+
+
 class Customer(models.Model):
     """
     Customer model for storing customer/recipient data.
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.contrib.admin.utils import unquote
 
-from .models import Invoice, InvoiceItem
+from .models import ArchiveChunk, Invoice, InvoiceArchive, InvoiceItem
+from .summaries import track_summaries
 
 
 class InvoiceItemInline(admin.TabularInline):
@@ -18,3 +20,62 @@ class InvoiceAdmin(admin.ModelAdmin):
     date_hierarchy = "invoice_date"
     inlines = [InvoiceItemInline]
     readonly_fields = ("subtotal", "tax_amount", "total", "created_at", "updated_at")
+
+    # Änderungen im Admin halten die Umsatz-Zusammenfassungen (InvoiceSummary) aktuell
+
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        if request.method != "POST" or object_id is None:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+        # Rechnung und Positionen (Inlines) werden gemeinsam bilanziert
+        with track_summaries(self.get_object(request, unquote(object_id))):
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    def save_related(self, request, form, formsets, change):
+        if change:
+            return super().save_related(request, form, formsets, change)
+
+        with track_summaries() as tracker:
+            tracker.add(form.instance)
+            super().save_related(request, form, formsets, change)
+
+    def delete_model(self, request, obj):
+        with track_summaries(obj):
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with track_summaries(*queryset):
+            super().delete_queryset(request, queryset)
+
+
+class ReadOnlyArchiveAdmin(admin.ModelAdmin):
+    """Archive sind unveränderlich (GoBD) - nur Größe und Hash anzeigen, nie den Inhalt."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(InvoiceArchive)
+class InvoiceArchiveAdmin(ReadOnlyArchiveAdmin):
+    list_display = ("invoice", "storage_format", "file_size", "data_hash", "created_at")
+    list_filter = ("storage_format", "created_at")
+    list_select_related = ("invoice",)
+    search_fields = ("invoice__invoice_number", "data_hash")
+    date_hierarchy = "created_at"
+    fields = ("invoice", "storage_format", "file_size", "data_hash", "created_at")
+    readonly_fields = fields
+
+
+@admin.register(ArchiveChunk)
+class ArchiveChunkAdmin(ReadOnlyArchiveAdmin):
+    list_display = ("digest", "tenant", "size", "created_at")
+    list_filter = ("tenant",)
+    search_fields = ("digest",)
+    fields = ("tenant", "digest", "size", "created_at")
+    readonly_fields = fields
@@ -0,0 +1,251 @@
+"""
+Analyse-Export (Parquet / Arrow IPC)
+- Rechnungen und Positionen als spaltenorientierte Dateien für BI-Tools
+- Partitioniert nach Monat (Hive-Layout: invoices/month=2025-01/part-0.parquet)
+- Gestreamt in Record-Batches aus serverseitigen Cursorn, Monate parallel
+- Beträge bleiben exakt (decimal128)
+
+pyarrow ist Abhängigkeit (requirements/base.txt), wird aber erst beim Export
+importiert: Web- und Worker-Prozesse laden es nur, wenn sie exportieren.
+"""
+
+import os
+import tempfile
+import threading
+import zipfile
+from datetime import timedelta
+from typing import Callable
+
+from apps.customers.models import display_name_expression
+
+from .export_shards import map_shards
+
+ANALYTICS_BATCH_SIZE = 5000
+
+ANALYTICS_FORMATS = {
+    'parquet': '.parquet',
+    'arrow': '.arrow',
+}
+
+# (Spaltenname, ORM-Pfad, Arrow-Typ)
+INVOICE_COLUMNS = [
+    ('id', 'id', 'int64'),
+    ('invoice_number', 'invoice_number', 'string'),
+    ('invoice_date', 'invoice_date', 'date32'),
+    ('due_date', 'due_date', 'date32'),
+    ('customer_id', 'customer_id', 'int64'),
+    ('customer_name', 'customer_name', 'string'),  # annotiert: Firma oder Vor-/Nachname
+    ('status', 'status', 'string'),
+    ('format', 'format', 'string'),
+    ('subtotal', 'subtotal', (12, 2)),
+    ('tax_amount', 'tax_amount', (12, 2)),
+    ('total', 'total', (12, 2)),
+    ('created_at', 'created_at', 'timestamp'),
+    ('updated_at', 'updated_at', 'timestamp'),
+]
+
+ITEM_COLUMNS = [
+    ('id', 'id', 'int64'),
+    ('invoice_id', 'invoice_id', 'int64'),
+    ('invoice_date', 'invoice__invoice_date', 'date32'),
+    ('position', 'position', 'int32'),
+    ('sku', 'sku', 'string'),
+    ('description', 'description', 'string'),
+    ('quantity', 'quantity', (10, 3)),
+    ('unit', 'unit', 'string'),
+    ('unit_price', 'unit_price', (10, 2)),
+    ('vat_rate', 'vat_rate', (5, 2)),
+    ('line_total', 'line_total', (12, 2)),
+    ('tax_amount', 'tax_amount', (12, 2)),
+]
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ImportError("Für den Analyse-Export wird pyarrow benötigt (pip install pyarrow).")
+    return pyarrow
+
+
+def build_schema(columns):
+    pa = _pyarrow()
+    types = {
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'string': pa.string(),
+        'date32': pa.date32(),
+        'timestamp': pa.timestamp('us', tz='UTC'),
+    }
+    return pa.schema([
+        (name, pa.decimal128(*arrow_type) if isinstance(arrow_type, tuple) else types[arrow_type])
+        for name, _, arrow_type in columns
+    ])
+
+
+class _PartitionWriter:
+    """Schreibt eine Tabelle monatsweise; pro Monat eine offene Datei."""
+
+    def __init__(self, root: str, table: str, schema, fmt: str):
+        self.root = root
+        self.table = table
+        self.schema = schema
+        self.fmt = fmt
+        self.month = None
+        self.writer = None
+
+    def _open(self, month: str):
+        pa = _pyarrow()
+        directory = os.path.join(self.root, self.table, f"month={month}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-0{ANALYTICS_FORMATS[self.fmt]}")
+
+        if self.fmt == 'parquet':
+            self.writer = pa.parquet.ParquetWriter(path, self.schema)
+        else:
+            self.writer = pa.ipc.new_file(path, self.schema)
+
+        self.month = month
+
+    def write(self, month: str, rows: list[tuple]):
+        pa = _pyarrow()
+
+        if month != self.month:
+            self.close()
+            self._open(month)
+
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, self.schema)],
+            schema=self.schema,
+        )
+        self.writer.write_batch(batch)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def _write_table(queryset, columns, root: str, table: str, fmt: str,
+                 batch_size: int, progress: Callable[[int], None] | None) -> int:
+    """
+    Streamt ein nach Rechnungsdatum sortiertes QuerySet in Monatspartitionen.
+
+    Ein Batch endet bei batch_size Zeilen oder beim Monatswechsel.
+    """
+    paths = [path for _, path, _ in columns]
+    date_index = [name for name, _, _ in columns].index('invoice_date')
+
+    writer = _PartitionWriter(root, table, build_schema(columns), fmt)
+    rows = []
+    month = None
+    count = 0
+
+    try:
+        for row in queryset.values_list(*paths).iterator(chunk_size=batch_size):
+            row_month = row[date_index].strftime('%Y-%m')
+            if rows and (row_month != month or len(rows) >= batch_size):
+                writer.write(month, rows)
+                count += len(rows)
+                if progress:
+                    progress(len(rows))
+                rows = []
+            month = row_month
+            rows.append(row)
+
+        if rows:
+            writer.write(month, rows)
+            count += len(rows)
+            if progress:
+                progress(len(rows))
+    finally:
+        writer.close()
+
+    return count
+
+
+def analytics_querysets(tenant, date_from=None, date_to=None):
+    """Rechnungen und Positionen des Exports (ohne Entwürfe), nach Datum sortiert."""
+    from .models import Invoice, InvoiceItem
+
+    invoices = Invoice.objects.filter(tenant=tenant).exclude(status='draft')
+    if date_from:
+        invoices = invoices.filter(invoice_date__gte=date_from)
+    if date_to:
+        invoices = invoices.filter(invoice_date__lte=date_to)
+
+    items = InvoiceItem.objects.filter(invoice__in=invoices)
+
+    return (
+        invoices.annotate(customer_name=display_name_expression('customer__')).order_by('invoice_date', 'id'),
+        items.order_by('invoice__invoice_date', 'invoice_id', 'position', 'id'),
+    )
+
+
+def write_analytics_dataset(tenant, root: str, date_from=None, date_to=None,
+                            fmt: str = 'parquet', batch_size: int = ANALYTICS_BATCH_SIZE,
+                            progress: Callable[[int], None] | None = None,
+                            workers: int = None) -> dict:
+    """
+    Schreibt Rechnungen und Positionen als partitionierten Datensatz nach root.
+
+    Jeder Monat ist eine eigene Partition und wird parallel geschrieben
+    (workers, Standard: EXPORT_SHARD_WORKERS).
+
+    Returns:
+        Anzahl Zeilen je Tabelle und die exportierten Monate
+    """
+    if fmt not in ANALYTICS_FORMATS:
+        raise ValueError(f"Unbekanntes Format: {fmt}")
+
+    invoices, items = analytics_querysets(tenant, date_from, date_to)
+    months = [
+        (month, (month + timedelta(days=32)).replace(day=1) - timedelta(days=1))
+        for month in invoices.dates('invoice_date', 'month')
+    ]
+
+    lock = threading.Lock()
+
+    def report(rows: int) -> None:
+        if progress:
+            with lock:
+                progress(rows)
+
+    def write_month(month):
+        invoice_count = _write_table(
+            invoices.filter(invoice_date__range=month), INVOICE_COLUMNS,
+            root, 'invoices', fmt, batch_size, report)
+        item_count = _write_table(
+            items.filter(invoice__invoice_date__range=month), ITEM_COLUMNS,
+            root, 'invoice_items', fmt, batch_size, report)
+        return invoice_count, item_count
+
+    counts = list(map_shards(write_month, months, workers))
+
+    return {
+        'invoices': sum(invoice_count for invoice_count, _ in counts),
+        'invoice_items': sum(item_count for _, item_count in counts),
+        'months': [f"{month:%Y-%m}" for month, _ in months],
+    }
+
+
+def write_analytics_zip(tenant, fileobj, date_from=None, date_to=None,
+                        fmt: str = 'parquet', batch_size: int = ANALYTICS_BATCH_SIZE,
+                        progress: Callable[[int], None] | None = None,
+                        workers: int = None) -> dict:
+    """Wie write_analytics_dataset, verpackt als ZIP (für Export-Jobs)."""
+    with tempfile.TemporaryDirectory() as root:
+        stats = write_analytics_dataset(
+            tenant, root, date_from, date_to, fmt, batch_size, progress, workers)
+
+        # Parquet ist bereits komprimiert
+        with zipfile.ZipFile(fileobj, 'w', zipfile.ZIP_STORED) as zf:
+            for directory, _, files in sorted(os.walk(root)):
+                for name in sorted(files):
+                    path = os.path.join(directory, name)
+                    zf.write(path, os.path.relpath(path, root))
+
+    return stats
@@ -5,3 +5,7 @@ class InvoicesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.invoices"
     verbose_name = "Invoices"
+
+    def ready(self):
+        # XRechnung-Vorprüfung: Regeln beim Start übersetzen, nicht beim ersten Request
+        from . import prevalidation  # noqa: F401
@@ -7,10 +7,12 @@ GoBD-Archivierung für Rechnungen
 import hashlib
 import json
 import zipfile
+from decimal import Decimal
 from io import BytesIO
 
 from cryptography.fernet import Fernet
 from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 from requests import Response
 
@@ -44,52 +46,85 @@ def decrypt_data(encrypted_data: bytes) -> bytes:
     return fernet.decrypt(encrypted_data)
 
 
-def create_archive_zip(invoice) -> bytes:
-    buffer = BytesIO()
+def render_archive_artifacts(invoice) -> dict:
+    """
+    Liefert XML und PDF der Rechnung für das Archiv.
+
+    Bereits gespeicherte Dateien werden übernommen, fehlende werden gerendert.
+    Das XML wird nur einmal erzeugt und direkt in das ZUGFeRD-PDF eingebettet.
+    """
+    from .xrechnung import generate_xrechnung
+    from .zugferd import generate_zugferd_pdf
+
+    artifacts = {}
+
+    if invoice.xml_file:
+        invoice.xml_file.open('rb')
+        try:
+            artifacts['invoice.xml'] = invoice.xml_file.read()
+        finally:
+            invoice.xml_file.close()
+    else:
+        artifacts['invoice.xml'] = generate_xrechnung(invoice).encode('utf-8')
+
+    if invoice.pdf_file:
+        invoice.pdf_file.open('rb')
+        try:
+            artifacts['invoice.pdf'] = invoice.pdf_file.read()
+        finally:
+            invoice.pdf_file.close()
+    else:
+        artifacts['invoice.pdf'] = generate_zugferd_pdf(
+            invoice, xml_content=artifacts['invoice.xml'].decode('utf-8'))
+
+    return artifacts
+
+
+def create_archive_members(invoice, artifacts: dict = None) -> dict:
+    """Alle Archivdateien (metadata.json, invoice.xml, invoice.pdf) als Bytes."""
+    if artifacts is None:
+        artifacts = render_archive_artifacts(invoice)
+
+    metadata = {
+        'invoice_number': invoice.invoice_number,
+        'invoice_date': str(invoice.invoice_date),
+        'due_date': str(invoice.due_date),
+        'status': invoice.status,
+        'format': invoice.format,
+        'customer': {
+            'name': invoice.customer.company_name,
+            'email': invoice.customer.email,
+        },
+        'subtotal': str(invoice.subtotal),
+        'tax_amount': str(invoice.tax_amount),
+        'total': str(invoice.total),
+        'items': [
+            {
+                'description': item.description,
+                'quantity': str(item.quantity),
+                'unit_price': str(item.unit_price),
+                'vat_rate': str(item.vat_rate),
+                'total': str(item.line_total),
+            }
+            for item in invoice.items.all()
+        ],
+        'archived_at': timezone.now().isoformat(),
+    }
 
-    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
-        metadata = {
-            'invoice_number': invoice.invoice_number,
-            'invoice_date': str(invoice.invoice_date),
-            'due_date': str(invoice.due_date),
-            'status': invoice.status,
-            'format': invoice.format,
-            'customer': {
-                'name': invoice.customer.company_name,
-                'email': invoice.customer.email,
-            },
-            'subtotal': str(invoice.subtotal),
-            'tax_amount': str(invoice.tax_amount),
-            'total': str(invoice.total),
-            'items': [
-                {
-                    'description': item.description,
-                    'quantity': str(item.quantity),
-                    'unit_price': str(item.unit_price),
-                    'vat_rate': str(item.vat_rate),
-                    'total': str(item.line_total),
-                }
-                for item in invoice.items.all()
-            ],
-            'archived_at': timezone.now().isoformat(),
-        }
+    members = {
+        'metadata.json': json.dumps(
+            metadata, indent=2, ensure_ascii=False).encode('utf-8'),
+    }
+    members.update(artifacts)
+    return members
 
-        zf.writestr('metadata.json', json.dumps(
-            metadata, indent=2, ensure_ascii=False))
 
-        if invoice.pdf_file:
-            try:
-                invoice.pdf_file.seek(0)
-                zf.writestr('invoice.pdf', invoice.pdf_file.read())
-            except Exception:
-                pass
+def create_archive_zip(invoice, artifacts: dict = None) -> bytes:
+    buffer = BytesIO()
 
-        if invoice.xml_file:
-            try:
-                invoice.xml_file.seek(0)
-                zf.writestr('invoice.xml', invoice.xml_file.read())
-            except Exception:
-                pass
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in create_archive_members(invoice, artifacts).items():
+            zf.writestr(name, content)
 
     return buffer.getvalue()
 
@@ -104,29 +139,102 @@ def archive_invoice(invoice) -> dict:
     if invoice.status == 'draft':
         raise ValueError("Entwürfe können nicht archiviert werden.")
 
-    zip_data = create_archive_zip(invoice)
-    data_hash = calculate_hash(zip_data)
-    encrypted_data = encrypt_data(zip_data)
-
-    archive = InvoiceArchive.objects.create(
-        invoice=invoice,
-        encrypted_data=encrypted_data,
-        data_hash=data_hash,
-        file_size=len(zip_data),
-    )
-
-    invoice.archived_at = timezone.now()
-    invoice.archive_hash = data_hash
-    invoice.save(update_fields=['archived_at', 'archive_hash'])
+    storage_format = getattr(settings, 'ARCHIVE_STORAGE_FORMAT', 'zip')
+
+    with transaction.atomic():
+        if storage_format == 'chunked':
+            from .archive_store import encode_manifest, store_members
+
+            members = create_archive_members(invoice)
+            manifest_data = encode_manifest(store_members(invoice.tenant, members))
+            data_hash = calculate_hash(manifest_data)
+            encrypted_data = encrypt_data(manifest_data)
+            file_size = sum(len(content) for content in members.values())
+        else:
+            zip_data = create_archive_zip(invoice)
+            data_hash = calculate_hash(zip_data)
+            encrypted_data = encrypt_data(zip_data)
+            file_size = len(zip_data)
+
+        archive = InvoiceArchive.objects.create(
+            invoice=invoice,
+            storage_format=storage_format,
+            encrypted_data=encrypted_data,
+            data_hash=data_hash,
+            file_size=file_size,
+        )
+
+        invoice.archived_at = timezone.now()
+        invoice.archive_hash = data_hash
+        invoice.archive_status = 'archived'
+        invoice.archive_error = ''
+        invoice.save(update_fields=[
+            'archived_at', 'archive_hash', 'archive_status', 'archive_error'])
+
+        index_archive(invoice, archive)
 
     return {
         'archive_id': archive.id,
         'hash': data_hash,
         'archived_at': invoice.archived_at.isoformat(),
-        'file_size': len(zip_data),
+        'file_size': file_size,
+    }
+
+
+def build_vat_breakdown(items) -> dict:
+    """Netto- und Steuerbeträge je USt-Satz, Schlüssel z.B. "19.00"."""
+    breakdown = {}
+    for item in items:
+        rate = f'{item.vat_rate:.2f}'
+        entry = breakdown.setdefault(rate, {'net': Decimal('0'), 'tax': Decimal('0')})
+        entry['net'] += item.line_total
+        entry['tax'] += item.tax_amount
+
+    return {
+        rate: {'net': f"{entry['net']:.2f}", 'tax': f"{entry['tax']:.2f}"}
+        for rate, entry in breakdown.items()
     }
 
 
+def index_archive(invoice, archive):
+    """Legt den durchsuchbaren Archiv-Index für eine archivierte Rechnung an."""
+    from .models import ArchiveIndex
+
+    items = list(invoice.items.all())
+
+    return ArchiveIndex.objects.create(
+        archive=archive,
+        invoice=invoice,
+        tenant_id=invoice.tenant_id,
+        customer_id=invoice.customer_id,
+        invoice_number=invoice.invoice_number,
+        invoice_date=invoice.invoice_date,
+        due_date=invoice.due_date,
+        subtotal=invoice.subtotal,
+        tax_amount=invoice.tax_amount,
+        total=invoice.total,
+        vat_breakdown=build_vat_breakdown(items),
+        item_count=len(items),
+        archived_at=invoice.archived_at,
+    )
+
+
+def schedule_archive(invoice) -> None:
+    """
+    Markiert die Rechnung als "Archivierung ausstehend" und übergibt sie
+    nach dem Commit an den Celery-Worker. Rendering, Verschlüsselung und
+    Speicherung laufen damit außerhalb des Requests.
+    """
+    from .tasks import archive_invoice_task
+
+    invoice.archive_status = 'pending'
+    invoice.archive_error = ''
+    invoice.save(update_fields=['archive_status', 'archive_error'])
+
+    invoice_id = invoice.pk
+    transaction.on_commit(lambda: archive_invoice_task.delay(invoice_id))
+
+
 def verify_archive(invoice) -> dict:
     from .models import InvoiceArchive
 
@@ -134,7 +242,7 @@ def verify_archive(invoice) -> dict:
         return {'valid': False, 'error': 'Rechnung ist nicht archiviert.'}
 
     try:
-        archive = InvoiceArchive.objects.get(invoice=invoice)
+        archive = InvoiceArchive.objects.with_payload().get(invoice=invoice)
     except InvoiceArchive.DoesNotExist:
         return {'valid': False, 'error': 'Archiv-Eintrag nicht gefunden.'}
 
@@ -153,23 +261,137 @@ def verify_archive(invoice) -> dict:
             'actual_hash': current_hash,
         }
 
+    if archive.storage_format == 'chunked':
+        from .archive_store import load_members
+
+        try:
+            members = load_members(invoice.tenant, json.loads(decrypted_data))
+        except Exception as e:
+            return {'valid': False, 'error': f'Chunk-Prüfung fehlgeschlagen: {e}'}
+        archived_xml = members.get('invoice.xml')
+    else:
+        with zipfile.ZipFile(BytesIO(decrypted_data)) as zf:
+            archived_xml = zf.read('invoice.xml') if 'invoice.xml' in zf.namelist() else None
+
     return {
         'valid': True,
         'hash': current_hash,
         'archived_at': archive.created_at.isoformat(),
         'file_size': archive.file_size,
+        'xrechnung': _archived_validation(archived_xml),
+    }
+
+
+def _archived_validation(xml_content: bytes | None) -> dict | None:
+    """Gespeichertes Validierungsergebnis des archivierten XML (ohne Validator-Aufruf)."""
+    from .validation import lookup_validation
+
+    record = lookup_validation(xml_content) if xml_content else None
+    if record is None:
+        return None
+
+    return {
+        'is_valid': record.is_valid,
+        'errors': record.errors,
+        'validator_version': record.validator_version,
+        'validated_at': record.created_at.isoformat(),
     }
 
 
 def download_archive(invoice) -> bytes:
+    """
+    Liefert das Archiv als ZIP.
+
+    Bei deduplizierten Archiven werden die Dateien byte-identisch aus den
+    Chunks rekonstruiert und in ein neues ZIP gepackt.
+    """
     from .models import InvoiceArchive
 
     if not invoice.archived_at:
         return None
 
     try:
-        archive = InvoiceArchive.objects.get(invoice=invoice)
-        return decrypt_data(archive.encrypted_data)
+        archive = InvoiceArchive.objects.with_payload().get(invoice=invoice)
+        data = decrypt_data(archive.encrypted_data)
+
+        if archive.storage_format == 'chunked':
+            from .archive_store import build_zip, load_members
+            return build_zip(load_members(invoice.tenant, json.loads(data)))
+
+        return data
     except Exception:
         return None
 
+
+MEMBER_CONTENT_TYPES = {
+    '.json': 'application/json',
+    '.xml': 'application/xml',
+    '.pdf': 'application/pdf',
+}
+
+
+def _load_manifest(archive) -> dict:
+    """
+    Inhaltsverzeichnis eines Archivs.
+
+    Bei deduplizierten Archiven ist das das separat verschlüsselte Manifest,
+    bei ZIP-Archiven wird es aus dem entschlüsselten ZIP gebildet.
+    """
+    data = decrypt_data(archive.encrypted_data)
+
+    if archive.storage_format == 'chunked':
+        return json.loads(data)
+
+    with zipfile.ZipFile(BytesIO(data)) as zf:
+        return {
+            'members': [
+                {
+                    'name': name,
+                    'size': len(content),
+                    'sha256': calculate_hash(content),
+                    'content': content,
+                }
+                for name, content in ((n, zf.read(n)) for n in zf.namelist())
+            ],
+        }
+
+
+def list_archive_members(invoice) -> list[dict] | None:
+    """Name, Größe und SHA-256 aller Dateien im Archiv."""
+    from .models import InvoiceArchive
+
+    try:
+        archive = InvoiceArchive.objects.with_payload().get(invoice=invoice)
+    except InvoiceArchive.DoesNotExist:
+        return None
+
+    return [
+        {'name': entry['name'], 'size': entry['size'], 'sha256': entry['sha256']}
+        for entry in _load_manifest(archive)['members']
+    ]
+
+
+def read_archive_member(invoice, name: str) -> bytes | None:
+    """
+    Liest eine einzelne Datei (z.B. metadata.json) aus dem Archiv.
+
+    Deduplizierte Archive entschlüsseln nur das Manifest und die Chunks
+    dieser Datei, nicht das gesamte Archiv.
+    """
+    from .models import InvoiceArchive
+
+    try:
+        archive = InvoiceArchive.objects.with_payload().get(invoice=invoice)
+    except InvoiceArchive.DoesNotExist:
+        return None
+
+    manifest = _load_manifest(archive)
+
+    if archive.storage_format == 'chunked':
+        from .archive_store import load_member
+        return load_member(invoice.tenant, manifest, name)
+
+    for entry in manifest['members']:
+        if entry['name'] == name:
+            return entry['content']
+    return None
@@ -0,0 +1,183 @@
+"""
+Deduplizierter Archivspeicher (GoBD)
+- Content-Defined Chunking der Archivdateien
+- Chunks werden pro Mandant nur einmal gespeichert (SHA-256 adressiert)
+- Manifest beschreibt, aus welchen Chunks jede Datei besteht
+"""
+
+import hashlib
+import json
+import zipfile
+import zlib
+from io import BytesIO
+
+from .archive import calculate_hash, decrypt_data, encrypt_data
+
+# Chunk-Grenzen: klein genug, damit gemeinsame XML-Header und eingebettete
+# Logo-Streams eigene Chunks bilden, groß genug für wenige DB-Zeilen je Archiv.
+CHUNK_MIN_SIZE = 512
+CHUNK_AVG_BITS = 11  # ~2 KB durchschnittliche Chunkgröße
+CHUNK_MAX_SIZE = 16 * 1024
+
+MANIFEST_VERSION = 1
+
+# Fester Zeitstempel, damit rekonstruierte ZIPs deterministisch sind
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+_MASK_64 = (1 << 64) - 1
+
+# Gear-Tabelle für den Rolling Hash (deterministisch, damit Chunk-Grenzen stabil bleiben)
+_GEAR = [
+    int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], 'big')
+    for i in range(256)
+]
+
+
+def split_chunks(data: bytes,
+                 min_size: int = CHUNK_MIN_SIZE,
+                 avg_bits: int = CHUNK_AVG_BITS,
+                 max_size: int = CHUNK_MAX_SIZE) -> list[bytes]:
+    """
+    Zerlegt Daten inhaltsabhängig (Gear-Hash) in Chunks.
+
+    Grenzen hängen nur von den umgebenden Bytes ab, gleiche Abschnitte in
+    verschiedenen Dateien ergeben daher gleiche Chunks.
+    """
+    mask = ((1 << avg_bits) - 1) << (64 - avg_bits)
+    gear = _GEAR
+    length = len(data)
+    chunks = []
+    start = 0
+
+    while start < length:
+        end = min(start + max_size, length)
+        pos = start + min_size
+
+        if pos >= end:
+            chunks.append(data[start:end])
+            break
+
+        h = 0
+        while pos < end:
+            h = ((h << 1) + gear[data[pos]]) & _MASK_64
+            pos += 1
+            if not h & mask:
+                break
+
+        chunks.append(data[start:pos])
+        start = pos
+
+    return chunks
+
+
+def store_members(tenant, members: dict[str, bytes]) -> dict:
+    """
+    Speichert Archivdateien als Chunks und liefert das Manifest.
+
+    Bereits vorhandene Chunks des Mandanten werden nur referenziert.
+    """
+    from .models import ArchiveChunk
+
+    entries = []
+    new_chunks = {}
+
+    for name, content in members.items():
+        digests = []
+        for chunk in split_chunks(content):
+            digest = calculate_hash(chunk)
+            digests.append(digest)
+            new_chunks.setdefault(digest, chunk)
+
+        entries.append({
+            'name': name,
+            'size': len(content),
+            'sha256': calculate_hash(content),
+            'chunks': digests,
+        })
+
+    existing = set(
+        ArchiveChunk.objects.filter(tenant=tenant, digest__in=new_chunks.keys())
+        .values_list('digest', flat=True)
+    )
+
+    ArchiveChunk.objects.bulk_create(
+        [
+            ArchiveChunk(
+                tenant=tenant,
+                digest=digest,
+                encrypted_data=encrypt_data(zlib.compress(chunk)),
+                size=len(chunk),
+            )
+            for digest, chunk in new_chunks.items()
+            if digest not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+    return {'version': MANIFEST_VERSION, 'members': entries}
+
+
+def load_chunks(tenant, digests) -> dict[str, bytes]:
+    """Lädt und entschlüsselt Chunks, Schlüssel ist der SHA-256 Digest."""
+    from .models import ArchiveChunk
+
+    rows = ArchiveChunk.objects.filter(
+        tenant=tenant, digest__in=set(digests)
+    ).values_list('digest', 'encrypted_data')
+
+    return {
+        digest: zlib.decompress(decrypt_data(bytes(encrypted)))
+        for digest, encrypted in rows
+    }
+
+
+def _assemble_member(entry: dict, chunks: dict[str, bytes]) -> bytes:
+    try:
+        content = b''.join(chunks[digest] for digest in entry['chunks'])
+    except KeyError as e:
+        raise ValueError(f"Chunk {e.args[0]} für {entry['name']} fehlt.")
+
+    if calculate_hash(content) != entry['sha256']:
+        raise ValueError(f"Prüfsumme von {entry['name']} stimmt nicht.")
+
+    return content
+
+
+def load_members(tenant, manifest: dict) -> dict[str, bytes]:
+    """
+    Setzt alle Dateien eines Manifests byte-identisch wieder zusammen.
+
+    Raises:
+        ValueError: Chunk fehlt oder Prüfsumme einer Datei stimmt nicht
+    """
+    entries = manifest['members']
+    chunks = load_chunks(tenant, [d for entry in entries for d in entry['chunks']])
+    return {entry['name']: _assemble_member(entry, chunks) for entry in entries}
+
+
+def load_member(tenant, manifest: dict, name: str) -> bytes | None:
+    """
+    Lädt eine einzelne Datei aus dem Archiv.
+
+    Es werden nur die Chunks dieser Datei gelesen und entschlüsselt.
+    """
+    for entry in manifest['members']:
+        if entry['name'] == name:
+            return _assemble_member(entry, load_chunks(tenant, entry['chunks']))
+    return None
+
+
+def encode_manifest(manifest: dict) -> bytes:
+    return json.dumps(manifest, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def build_zip(members: dict[str, bytes]) -> bytes:
+    """Erzeugt ein deterministisches ZIP aus den rekonstruierten Dateien."""
+    buffer = BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(zipfile.ZipInfo(name, date_time=ZIP_DATE_TIME), content,
+                        compress_type=zipfile.ZIP_DEFLATED)
+
+    return buffer.getvalue()
@@ -0,0 +1,100 @@
+"""
+Async Endpunkte für ASGI-Deployments
+- Validierung und Validator-Status ohne blockierten Worker-Thread
+- Authentifizierung wie bei der API (DRF, JWT)
+
+DRF-Views laufen unter ASGI synchron in einem Thread; diese Views warten
+stattdessen im Event-Loop auf den Validator, viele parallele Validierungen
+kommen so mit einem Prozess aus.
+
+Unter WSGI laufen die Views über async_to_sync in einer Loop je Request;
+die Validator-Clients werden dann am Ende des Requests geschlossen.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .validation import avalidate_invoice
+from .validator import aclose_async_clients
+from .validator_status import avalidator_status, probe_validator_health, status_payload
+
+
+def _authenticate(request):
+    drf_request = Request(
+        request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        user = drf_request.user
+    except exceptions.APIException:
+        return None
+    return user if user.is_authenticated else None
+
+
+async def _authenticated_user(request):
+    return await sync_to_async(_authenticate)(request)
+
+
+def _not_authenticated() -> JsonResponse:
+    return JsonResponse({'detail': str(exceptions.NotAuthenticated.default_detail)}, status=401)
+
+
+def _request_scoped_clients(view):
+    """Außerhalb von ASGI endet die Loop mit dem Request: Clients danach schließen."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(request, *args, **kwargs)
+        finally:
+            if not isinstance(request, ASGIRequest):
+                await aclose_async_clients()
+    return wrapper
+
+
+@require_GET
+@_request_scoped_clients
+async def validate(request, pk):
+    """XRechnung validieren (async Gegenstück zu invoices/<id>/validate/)"""
+    from .models import Invoice
+
+    user = await _authenticated_user(request)
+    if user is None:
+        return _not_authenticated()
+
+    invoice = await (
+        Invoice.objects.filter(tenant_id=user.tenant_id, pk=pk)
+        .select_related('tenant', 'customer')
+        .prefetch_related('items')
+        .afirst()
+    )
+    if invoice is None:
+        return JsonResponse({'detail': str(exceptions.NotFound.default_detail)}, status=404)
+
+    if invoice.status == 'draft':
+        return JsonResponse({'error': 'Entwürfe können nicht validiert werden.'}, status=400)
+
+    result = await avalidate_invoice(invoice)
+
+    return JsonResponse({
+        'is_valid': result.is_valid,
+        'errors': result.errors,
+        'warnings': result.warnings,
+    })
+
+
+@require_GET
+@_request_scoped_clients
+async def validator_status(request):
+    """Status des Validators aus dem Health-Monitor (async)"""
+    if await _authenticated_user(request) is None:
+        return _not_authenticated()
+
+    status = await avalidator_status()
+    if status is None:
+        status = await sync_to_async(probe_validator_health, thread_sensitive=False)()
+    return JsonResponse(status_payload(status))
@@ -0,0 +1,189 @@
+"""
+Massenversand und Mahnläufe
+- Auswahl in einer Query, bei Mahnungen samt aktueller Mahnstufe
+  (Aggregat über invoice_reminders statt einer Query je Rechnung)
+- Outbox-Einträge per bulk_create, Versand parallel über Batch-Tasks (outbox.dispatch)
+- Fortschritt je Lauf (run_id) aus den Status der Outbox-Einträge
+"""
+
+import uuid
+
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .outbox import dispatch
+
+MAX_REMINDER_LEVEL = 3
+
+# Zeilen für enqueue_reminder_rows: (Rechnung, Mandant, Empfänger, aktuelle Stufe)
+REMINDER_ROW_FIELDS = ('pk', 'tenant_id', 'customer__email', 'reminder_level')
+
+
+def _filter(invoices, params: dict, date_field: str = 'invoice_date'):
+    """Filter aus geprüften Parametern (BulkSelectionSerializer: ids, customer, from/to als date)."""
+    if params.get('ids'):
+        invoices = invoices.filter(pk__in=params['ids'])
+    if params.get('customer'):
+        invoices = invoices.filter(customer_id=params['customer'])
+    if params.get('from'):
+        invoices = invoices.filter(**{f'{date_field}__gte': params['from']})
+    if params.get('to'):
+        invoices = invoices.filter(**{f'{date_field}__lte': params['to']})
+    # Ohne E-Mail-Adresse kann nicht versendet werden
+    return invoices.exclude(customer__email='')
+
+
+def select_for_sending(tenant, params: dict):
+    """Finalisierte Rechnungen für den Massenversand (ids/customer/from/to), nicht schon in der Outbox."""
+    from .models import Invoice
+
+    invoices = Invoice.objects.filter(tenant=tenant, status='final').exclude(email_status='queued')
+    return _filter(invoices, params)
+
+
+def select_for_dunning(tenant, params: dict, today=None):
+    """
+    Überfällige Rechnungen, die die nächste Mahnstufe erhalten können.
+
+    Die aktuelle Stufe (reminder_level) kommt als Aggregat in derselben Query;
+    fehlgeschlagene Mahnungen zählen nicht, Rechnungen mit noch wartender
+    Mahnung werden übersprungen. Filter from/to beziehen sich auf das
+    Fälligkeitsdatum, level beschränkt auf eine Mahnstufe.
+    """
+    from .models import Invoice
+
+    today = today or timezone.localdate()
+
+    invoices = (
+        Invoice.objects
+        .filter(tenant=tenant, status__in=['sent', 'final'], due_date__lt=today)
+        .annotate(
+            reminder_level=Coalesce(
+                Max('reminders__level', filter=~Q(reminders__delivery_status='failed')), 0),
+            pending_reminders=Count('reminders', filter=Q(reminders__delivery_status='queued')),
+        )
+        .filter(reminder_level__lt=MAX_REMINDER_LEVEL, pending_reminders=0)
+    )
+    if params.get('level'):
+        invoices = invoices.filter(reminder_level=params['level'] - 1)
+
+    return _filter(invoices, params, date_field='due_date')
+
+
+def enqueue_invoice_emails(invoices, user=None) -> tuple[uuid.UUID, int]:
+    """
+    Rechnungs-Mails für alle ausgewählten Rechnungen in die Outbox stellen.
+
+    Die Rechnungen werden in derselben Transaktion gesperrt und auf "queued"
+    gesetzt; parallele Läufe überspringen gesperrte bzw. schon eingereihte
+    Rechnungen, jede Rechnung wird nur einmal versendet.
+
+    Returns:
+        tuple: (run_id, Anzahl)
+    """
+    from .models import Invoice, OutboundEmail
+
+    run_id = uuid.uuid4()
+
+    with transaction.atomic():
+        rows = list(
+            invoices.exclude(email_status='queued')
+            .select_for_update(skip_locked=True, of=('self',))
+            .order_by()
+            .values_list('pk', 'tenant_id', 'customer__email')
+        )
+        emails = OutboundEmail.objects.bulk_create([
+            OutboundEmail(
+                tenant_id=tenant_id,
+                invoice_id=invoice_id,
+                kind='invoice',
+                recipient=recipient,
+                run_id=run_id,
+                created_by=user,
+            )
+            for invoice_id, tenant_id, recipient in rows
+        ])
+        Invoice.objects.filter(pk__in=[row[0] for row in rows]).update(email_status='queued')
+
+        email_ids = [email.pk for email in emails]
+        transaction.on_commit(lambda: dispatch(email_ids))
+
+    return run_id, len(email_ids)
+
+
+def enqueue_reminders(invoices, fee=0, user=None, fees: dict = None) -> tuple[uuid.UUID, int]:
+    """
+    Nächste Mahnstufe für alle ausgewählten Rechnungen anlegen und versenden.
+
+    Args:
+        invoices: Ergebnis von select_for_dunning (mit reminder_level)
+        fee: Mahngebühr für alle Stufen
+        fees: optional Gebühr je Stufe ({1: 0, 2: 5, 3: 10}), hat Vorrang vor fee
+
+    Returns:
+        tuple: (run_id, Anzahl)
+    """
+    run_id = uuid.uuid4()
+    rows = list(invoices.order_by().values_list(*REMINDER_ROW_FIELDS))
+    return run_id, enqueue_reminder_rows(rows, run_id, fee=fee, fees=fees, user=user)
+
+
+def enqueue_reminder_rows(rows, run_id, fee=0, fees: dict = None, user=None) -> int:
+    """Mahnungen und Outbox-Einträge für ein Paket von Zeilen in einer Transaktion anlegen."""
+    from .models import OutboundEmail, Reminder
+
+    fees = fees or {}
+
+    with transaction.atomic():
+        reminders = Reminder.objects.bulk_create([
+            Reminder(
+                invoice_id=invoice_id,
+                level=level + 1,
+                sent_to=recipient,
+                fee=fees.get(level + 1, fee),
+                delivery_status='queued',
+            )
+            for invoice_id, _, recipient, level in rows
+        ])
+        emails = OutboundEmail.objects.bulk_create([
+            OutboundEmail(
+                tenant_id=tenant_id,
+                invoice_id=invoice_id,
+                reminder=reminder,
+                kind='reminder',
+                recipient=recipient,
+                run_id=run_id,
+                created_by=user,
+            )
+            for (invoice_id, tenant_id, recipient, _), reminder in zip(rows, reminders)
+        ])
+
+        email_ids = [email.pk for email in emails]
+        transaction.on_commit(lambda: dispatch(email_ids))
+
+    return len(email_ids)
+
+
+def run_progress(tenant, run_id) -> dict:
+    """Fortschritt eines Laufs: Anzahl je Status und Anteil abgeschlossen (sent/failed)."""
+    from .models import OutboundEmail
+
+    counts = dict.fromkeys(('queued', 'sending', 'sent', 'failed'), 0)
+    counts.update(
+        OutboundEmail.objects.filter(tenant=tenant, run_id=run_id)
+        .order_by()
+        .values_list('status')
+        .annotate(count=Count('id'))
+    )
+    total = sum(counts.values())
+    done = counts['sent'] + counts['failed']
+
+    return {
+        'run_id': str(run_id),
+        'total': total,
+        **counts,
+        'done': done,
+        'progress_percent': round(done * 100 / total, 1) if total else 100.0,
+    }
@@ -3,151 +3,240 @@ DATEV Export Generator
 CSV-Format für Buchhalter/Steuerberater
 """
 import csv
-import io
-from datetime import date
+from datetime import date, datetime
 from decimal import Decimal
-from typing import TYPE_CHECKING, List
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+from django.db.models import OuterRef, Subquery, Sum
 
 if TYPE_CHECKING:
+    from django.db.models import QuerySet
+
     from .models import Invoice
 
 
+DEFAULT_VAT_RATE = Decimal('19')
+
+# Nicht exportiert: Entwürfe sind nicht gebucht, stornierte Rechnungen keine Erlöse
+EXCLUDED_STATUSES = ('draft', 'cancelled')
+
+# Erlöskonten (SKR03) je MwSt-Satz
+ERLOES_KONTEN = {
+    Decimal('19'): 8400,  # Erlöse 19% USt
+    Decimal('7'): 8300,   # Erlöse 7% USt
+    Decimal('0'): 8100,   # Steuerfreie Erlöse
+}
+
+
+def load_datev_invoices(invoices: 'QuerySet[Invoice]') -> 'QuerySet[Invoice]':
+    """
+    Bereitet einen Rechnungs-QuerySet für den DATEV-Export vor.
+
+    Kunde per JOIN, Haupt-MwSt-Satz (höchster Nettoanteil) per Subquery:
+    ein Export von N Rechnungen braucht damit eine konstante Anzahl Queries.
+    """
+    from .models import InvoiceItem
+
+    dominant_rate = (
+        InvoiceItem.objects
+        .filter(invoice=OuterRef('pk'))
+        .values('vat_rate')
+        .annotate(net=Sum('line_total'))
+        .order_by('-net', '-vat_rate')
+        .values('vat_rate')[:1]
+    )
+
+    return (
+        invoices
+        .prefetch_related(None)
+        .select_related('customer')
+        .annotate(datev_vat_rate=Subquery(dominant_rate))
+    )
+
+
+# Spalten des DATEV Buchungsstapels (Formatversion 13)
+BUCHUNGSSTAPEL_COLUMNS = [
+    'Umsatz (ohne Soll/Haben-Kz)',
+    'Soll/Haben-Kennzeichen',
+    'WKZ Umsatz',
+    'Kurs',
+    'Basis-Umsatz',
+    'WKZ Basis-Umsatz',
+    'Konto',
+    'Gegenkonto (ohne BU-Schlüssel)',
+    'BU-Schlüssel',
+    'Belegdatum',
+    'Belegfeld 1',
+    'Belegfeld 2',
+    'Skonto',
+    'Buchungstext',
+    'Postensperre',
+    'Diverse Adressnummer',
+    'Geschäftspartnerbank',
+    'Sachverhalt',
+    'Zinssperre',
+    'Beleglink',
+    'Beleginfo - Art 1',
+    'Beleginfo - Inhalt 1',
+    'Beleginfo - Art 2',
+    'Beleginfo - Inhalt 2',
+    'Beleginfo - Art 3',
+    'Beleginfo - Inhalt 3',
+    'Beleginfo - Art 4',
+    'Beleginfo - Inhalt 4',
+    'Beleginfo - Art 5',
+    'Beleginfo - Inhalt 5',
+    'Beleginfo - Art 6',
+    'Beleginfo - Inhalt 6',
+    'Beleginfo - Art 7',
+    'Beleginfo - Inhalt 7',
+    'Beleginfo - Art 8',
+    'Beleginfo - Inhalt 8',
+    'KOST1 - Kostenstelle',
+    'KOST2 - Kostenstelle',
+    'Kost-Menge',
+    'EU-Land u. UStID',
+    'EU-Steuersatz',
+    'Abw. Versteuerungsart',
+    'Sachverhalt L+L',
+    'Funktionsergänzung L+L',
+    'BU 49 Hauptfunktionstyp',
+    'BU 49 Hauptfunktionsnummer',
+    'BU 49 Funktionsergänzung',
+    'Zusatzinformation - Art 1',
+    'Zusatzinformation - Inhalt 1',
+    'Zusatzinformation - Art 2',
+    'Zusatzinformation - Inhalt 2',
+    'Zusatzinformation - Art 3',
+    'Zusatzinformation - Inhalt 3',
+    'Zusatzinformation - Art 4',
+    'Zusatzinformation - Inhalt 4',
+    'Zusatzinformation - Art 5',
+    'Zusatzinformation - Inhalt 5',
+    'Zusatzinformation - Art 6',
+    'Zusatzinformation - Inhalt 6',
+    'Zusatzinformation - Art 7',
+    'Zusatzinformation - Inhalt 7',
+    'Zusatzinformation - Art 8',
+    'Zusatzinformation - Inhalt 8',
+    'Zusatzinformation - Art 9',
+    'Zusatzinformation - Inhalt 9',
+    'Zusatzinformation - Art 10',
+    'Zusatzinformation - Inhalt 10',
+    'Zusatzinformation - Art 11',
+    'Zusatzinformation - Inhalt 11',
+    'Zusatzinformation - Art 12',
+    'Zusatzinformation - Inhalt 12',
+    'Zusatzinformation - Art 13',
+    'Zusatzinformation - Inhalt 13',
+    'Zusatzinformation - Art 14',
+    'Zusatzinformation - Inhalt 14',
+    'Zusatzinformation - Art 15',
+    'Zusatzinformation - Inhalt 15',
+    'Zusatzinformation - Art 16',
+    'Zusatzinformation - Inhalt 16',
+    'Zusatzinformation - Art 17',
+    'Zusatzinformation - Inhalt 17',
+    'Zusatzinformation - Art 18',
+    'Zusatzinformation - Inhalt 18',
+    'Zusatzinformation - Art 19',
+    'Zusatzinformation - Inhalt 19',
+    'Zusatzinformation - Art 20',
+    'Zusatzinformation - Inhalt 20',
+    'Stück',
+    'Gewicht',
+    'Zahlweise',
+    'Fälligkeit',
+    'Skontotyp',
+    'Auftragsnummer',
+    'Buchungstyp',
+    'USt-Schlüssel (Anzahlungen)',
+    'EU-Land (Anzahlungen)',
+    'Sachverhalt L+L (Anzahlungen)',
+    'EU-Steuersatz (Anzahlungen)',
+    'Erlöskonto (Anzahlungen)',
+    'Herkunft-Kz',
+    'Buchungs GUID',
+    'KOST-Datum',
+    'SEPA-Mandatsreferenz',
+    'Skontosperre',
+    'Gesellschaftername',
+    'Beteiligtennummer',
+    'Identifikationsnummer',
+    'Zeichnernummer',
+    'Postensperre bis',
+    'Bezeichnung SoBil-Sachverhalt',
+    'Kennzeichen SoBil-Buchung',
+    'Festschreibung',
+    'Leistungsdatum',
+    'Datum Zuord. Steuerperiode',
+    'Fälligkeit',
+    'Generalumkehr (GU)',
+    'Steuersatz',
+    'Land',
+]
+
+
+GENERALUMKEHR_COLUMN = BUCHUNGSSTAPEL_COLUMNS.index('Generalumkehr (GU)')
+
+
+def _buchung_row(umsatz: str, konto: int, gegenkonto: int, beleg_datum: str,
+                 belegfeld: str, buchungstext: str, generalumkehr: bool = False) -> list:
+    """Eine Buchungszeile, auf die volle Spaltenanzahl aufgefüllt."""
+    row = [
+        umsatz,       # Umsatz
+        'S',          # Soll
+        'EUR',        # Währung
+        '',           # Kurs
+        '',           # Basis-Umsatz
+        '',           # WKZ Basis
+        konto,        # Konto (Debitor)
+        gegenkonto,   # Gegenkonto (Erlös)
+        '',           # BU-Schlüssel
+        beleg_datum,  # Belegdatum (DDMM)
+        belegfeld,    # Belegfeld 1
+        '',           # Belegfeld 2
+        '',           # Skonto
+        buchungstext,  # Buchungstext
+    ]
+    row += [''] * (len(BUCHUNGSSTAPEL_COLUMNS) - len(row))
+    if generalumkehr:
+        row[GENERALUMKEHR_COLUMN] = 1
+    return row
+
+
+class _Echo:
+    """Pseudo-Puffer: csv.writer gibt jede geschriebene Zeile direkt zurück."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _row_writer():
+    return csv.writer(_Echo(), delimiter=';', quoting=csv.QUOTE_MINIMAL)
+
+
 def generate_datev_export(invoices: List['Invoice']) -> str:
     """
     Generiert DATEV-kompatibles CSV für Buchungsstapel.
     Format: DATEV Buchungsstapel (ASCII)
     """
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    return ''.join(iter_datev_export(invoices))
+
+
+def iter_datev_export(invoices: Iterable['Invoice']) -> Iterator[str]:
+    """Buchungsstapel zeilenweise, für StreamingHttpResponse."""
+    writer = _row_writer()
     
     # DATEV Header
-    writer.writerow([
-        'Umsatz (ohne Soll/Haben-Kz)',
-        'Soll/Haben-Kennzeichen',
-        'WKZ Umsatz',
-        'Kurs',
-        'Basis-Umsatz',
-        'WKZ Basis-Umsatz',
-        'Konto',
-        'Gegenkonto (ohne BU-Schlüssel)',
-        'BU-Schlüssel',
-        'Belegdatum',
-        'Belegfeld 1',
-        'Belegfeld 2',
-        'Skonto',
-        'Buchungstext',
-        'Postensperre',
-        'Diverse Adressnummer',
-        'Geschäftspartnerbank',
-        'Sachverhalt',
-        'Zinssperre',
-        'Beleglink',
-        'Beleginfo - Art 1',
-        'Beleginfo - Inhalt 1',
-        'Beleginfo - Art 2',
-        'Beleginfo - Inhalt 2',
-        'Beleginfo - Art 3',
-        'Beleginfo - Inhalt 3',
-        'Beleginfo - Art 4',
-        'Beleginfo - Inhalt 4',
-        'Beleginfo - Art 5',
-        'Beleginfo - Inhalt 5',
-        'Beleginfo - Art 6',
-        'Beleginfo - Inhalt 6',
-        'Beleginfo - Art 7',
-        'Beleginfo - Inhalt 7',
-        'Beleginfo - Art 8',
-        'Beleginfo - Inhalt 8',
-        'KOST1 - Kostenstelle',
-        'KOST2 - Kostenstelle',
-        'Kost-Menge',
-        'EU-Land u. UStID',
-        'EU-Steuersatz',
-        'Abw. Versteuerungsart',
-        'Sachverhalt L+L',
-        'Funktionsergänzung L+L',
-        'BU 49 Hauptfunktionstyp',
-        'BU 49 Hauptfunktionsnummer',
-        'BU 49 Funktionsergänzung',
-        'Zusatzinformation - Art 1',
-        'Zusatzinformation - Inhalt 1',
-        'Zusatzinformation - Art 2',
-        'Zusatzinformation - Inhalt 2',
-        'Zusatzinformation - Art 3',
-        'Zusatzinformation - Inhalt 3',
-        'Zusatzinformation - Art 4',
-        'Zusatzinformation - Inhalt 4',
-        'Zusatzinformation - Art 5',
-        'Zusatzinformation - Inhalt 5',
-        'Zusatzinformation - Art 6',
-        'Zusatzinformation - Inhalt 6',
-        'Zusatzinformation - Art 7',
-        'Zusatzinformation - Inhalt 7',
-        'Zusatzinformation - Art 8',
-        'Zusatzinformation - Inhalt 8',
-        'Zusatzinformation - Art 9',
-        'Zusatzinformation - Inhalt 9',
-        'Zusatzinformation - Art 10',
-        'Zusatzinformation - Inhalt 10',
-        'Zusatzinformation - Art 11',
-        'Zusatzinformation - Inhalt 11',
-        'Zusatzinformation - Art 12',
-        'Zusatzinformation - Inhalt 12',
-        'Zusatzinformation - Art 13',
-        'Zusatzinformation - Inhalt 13',
-        'Zusatzinformation - Art 14',
-        'Zusatzinformation - Inhalt 14',
-        'Zusatzinformation - Art 15',
-        'Zusatzinformation - Inhalt 15',
-        'Zusatzinformation - Art 16',
-        'Zusatzinformation - Inhalt 16',
-        'Zusatzinformation - Art 17',
-        'Zusatzinformation - Inhalt 17',
-        'Zusatzinformation - Art 18',
-        'Zusatzinformation - Inhalt 18',
-        'Zusatzinformation - Art 19',
-        'Zusatzinformation - Inhalt 19',
-        'Zusatzinformation - Art 20',
-        'Zusatzinformation - Inhalt 20',
-        'Stück',
-        'Gewicht',
-        'Zahlweise',
-        'Fälligkeit',
-        'Skontotyp',
-        'Auftragsnummer',
-        'Buchungstyp',
-        'USt-Schlüssel (Anzahlungen)',
-        'EU-Land (Anzahlungen)',
-        'Sachverhalt L+L (Anzahlungen)',
-        'EU-Steuersatz (Anzahlungen)',
-        'Erlöskonto (Anzahlungen)',
-        'Herkunft-Kz',
-        'Buchungs GUID',
-        'KOST-Datum',
-        'SEPA-Mandatsreferenz',
-        'Skontosperre',
-        'Gesellschaftername',
-        'Beteiligtennummer',
-        'Identifikationsnummer',
-        'Zeichnernummer',
-        'Postensperre bis',
-        'Bezeichnung SoBil-Sachverhalt',
-        'Kennzeichen SoBil-Buchung',
-        'Festschreibung',
-        'Leistungsdatum',
-        'Datum Zuord. Steuerperiode',
-        'Fälligkeit',
-        'Generalumkehr (GU)',
-        'Steuersatz',
-        'Land',
-    ])
+    yield writer.writerow(BUCHUNGSSTAPEL_COLUMNS)
     
     for invoice in invoices:
         if invoice.status == 'draft':
             continue
             
         # Debitorenkonto aus Kundennummer (10000 + ID)
-        debitor_konto = 10000 + invoice.customer.id
+        debitor_konto = 10000 + invoice.customer_id
         
         # Erlöskonto (Standard: 8400 für Erlöse 19% USt)
         erlos_konto = _get_erlos_konto(invoice)
@@ -158,52 +247,35 @@ def generate_datev_export(invoices: List['Invoice']) -> str:
         # Bruttobetrag
         umsatz = f"{invoice.total:.2f}".replace('.', ',')
         
-        writer.writerow([
-            umsatz,                          # Umsatz
-            'S',                             # Soll
-            'EUR',                           # Währung
-            '',                              # Kurs
-            '',                              # Basis-Umsatz
-            '',                              # WKZ Basis
-            debitor_konto,                   # Konto (Debitor)
-            erlos_konto,                     # Gegenkonto (Erlös)
-            '',                              # BU-Schlüssel
-            beleg_datum,                     # Belegdatum
-            invoice.invoice_number,          # Belegfeld 1
-            '',                              # Belegfeld 2
-            '',                              # Skonto
-            f"RE {invoice.customer.display_name[:20]}",  # Buchungstext
-            '',                              # Postensperre
-            '',                              # Diverse Adressnummer
-            '',                              # Geschäftspartnerbank
-            '',                              # Sachverhalt
-            '',                              # Zinssperre
-            '',                              # Beleglink
-            # Rest leer...
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '', '', '', '', '', '', '',
-            '', '', '', '',
-        ])
-    
-    return output.getvalue()
+        yield writer.writerow(_buchung_row(
+            umsatz=umsatz,
+            konto=debitor_konto,
+            gegenkonto=erlos_konto,
+            beleg_datum=beleg_datum,
+            belegfeld=invoice.invoice_number,
+            buchungstext=f"RE {invoice.customer.display_name[:20]}",
+        ))
 
 
 def generate_datev_simple(invoices: List['Invoice']) -> str:
     """
     Vereinfachtes DATEV-Format für einfachen Import.
     """
-    output = io.StringIO()
-    writer = csv.writer(output, delimiter=';', quoting=csv.QUOTE_MINIMAL)
+    return ''.join(iter_datev_simple(invoices))
+
+
+def iter_datev_simple(invoices: Iterable['Invoice'], reversals: Iterable = ()) -> Iterator[str]:
+    """
+    Vereinfachtes DATEV-Format zeilenweise, für StreamingHttpResponse.
+
+    Args:
+        reversals: zu stornierende frühere Buchungen (DatevExportedInvoice),
+            als Zeilen mit negativen Beträgen vor den Rechnungen
+    """
+    writer = _row_writer()
     
     # Header
-    writer.writerow([
+    yield writer.writerow([
         'Rechnungsnummer',
         'Rechnungsdatum',
         'Fälligkeitsdatum',
@@ -217,17 +289,36 @@ def generate_datev_simple(invoices: List['Invoice']) -> str:
         'Status',
         'Zahlungsbedingungen',
     ])
-    
+
+    for entry in reversals:
+        nets = {Decimal(rate): Decimal(net) for rate, net, _ in entry.bookings}
+        net = sum(nets.values(), Decimal('0'))
+        tax = sum((Decimal(tax) for _, _, tax in entry.bookings), Decimal('0'))
+        vat_rate = max(nets, key=nets.get) if nets else DEFAULT_VAT_RATE
+
+        yield writer.writerow([
+            entry.invoice.invoice_number,
+            entry.invoice_date.strftime('%d.%m.%Y'),
+            '',
+            entry.customer.display_name,
+            entry.customer.customer_number or '',
+            f"{-net:.2f}".replace('.', ','),
+            f"{-tax:.2f}".replace('.', ','),
+            f"{vat_rate:.0f}",
+            f"{-entry.amount:.2f}".replace('.', ','),
+            'EUR',
+            'Storno',
+            '',
+        ])
+
     for invoice in invoices:
         if invoice.status == 'draft':
             continue
         
         # Haupt-MwSt-Satz ermitteln
-        vat_rate = Decimal('19')
-        if invoice.items.exists():
-            vat_rate = invoice.items.first().vat_rate
+        vat_rate = _dominant_vat_rate(invoice)
         
-        writer.writerow([
+        yield writer.writerow([
             invoice.invoice_number,
             invoice.invoice_date.strftime('%d.%m.%Y'),
             invoice.due_date.strftime('%d.%m.%Y') if invoice.due_date else '',
@@ -241,22 +332,191 @@ def generate_datev_simple(invoices: List['Invoice']) -> str:
             invoice.get_status_display(),
             invoice.payment_terms or '',
         ])
-    
-    return output.getvalue()
+
+
+# EXTF-Kopfsatz: Formatversion 700, Kategorie 21 = Buchungsstapel (Version 13)
+EXTF_FORMAT_VERSION = 700
+EXTF_CATEGORY = 21
+EXTF_CATEGORY_NAME = 'Buchungsstapel'
+EXTF_CATEGORY_VERSION = 13
+
+
+def load_datev_bookings(invoices: 'QuerySet[Invoice]'):
+    """
+    Eine Buchung je Rechnung und MwSt-Satz als ein gruppiertes Aggregat.
+
+    Netto- und Steuerbeträge werden in SQL über invoice_items summiert,
+    die Rechnungs- und Kundenfelder kommen per JOIN mit.
+    """
+    from .models import InvoiceItem
+
+    return (
+        InvoiceItem.objects
+        .filter(invoice__in=invoices.values('pk'))
+        .values(
+            'invoice_id',
+            'vat_rate',
+            'invoice__invoice_number',
+            'invoice__invoice_date',
+            'invoice__customer_id',
+            'invoice__customer__company_name',
+            'invoice__customer__first_name',
+            'invoice__customer__last_name',
+        )
+        .annotate(net=Sum('line_total'), tax=Sum('tax_amount'))
+        .order_by('invoice__invoice_date', 'invoice__invoice_number', '-vat_rate')
+    )
+
+
+def reversal_bookings(entries: Iterable) -> Iterator[dict]:
+    """
+    Gespeicherte Buchungen (DatevExportedInvoice) im Format von load_datev_bookings,
+    für die Generalumkehr in iter_datev_extf.
+    """
+    for entry in entries:
+        for vat_rate, net, tax in entry.bookings:
+            yield {
+                'invoice_id': entry.invoice_id,
+                'vat_rate': Decimal(vat_rate),
+                'invoice__invoice_number': entry.invoice.invoice_number,
+                'invoice__invoice_date': entry.invoice_date,
+                'invoice__customer_id': entry.customer_id,
+                'invoice__customer__company_name': entry.customer.company_name,
+                'invoice__customer__first_name': entry.customer.first_name,
+                'invoice__customer__last_name': entry.customer.last_name,
+                'net': Decimal(net),
+                'tax': Decimal(tax),
+            }
+
+
+def extf_settings_error(tenant) -> str:
+    """
+    Prüft, ob der Mandant für einen EXTF-Export eingerichtet ist.
+
+    Ohne Berater- und Mandantennummer lehnt DATEV den Import des Kopfsatzes ab.
+
+    Returns:
+        str: Fehlermeldung oder '' wenn exportiert werden kann
+    """
+    if not tenant.datev_consultant_number or not tenant.datev_client_number:
+        return "DATEV-Berater- und Mandantennummer müssen für den EXTF-Export hinterlegt sein."
+    return ''
+
+
+def fiscal_year_start(tenant, day: date) -> date:
+    """Beginn des Wirtschaftsjahres, in dem day liegt (Monat: tenant.datev_fiscal_year_start)."""
+    month = tenant.datev_fiscal_year_start or 1
+    return date(day.year if day.month >= month else day.year - 1, month, 1)
+
+
+def extf_period_error(tenant, date_from: date, date_to: date) -> str:
+    """
+    Prüft den Zeitraum eines Buchungsstapels.
+
+    DATEV lehnt Stapel ab, die über ein Wirtschaftsjahr hinausgehen; je
+    Wirtschaftsjahr ist ein eigener Export nötig.
+
+    Returns:
+        str: Fehlermeldung oder '' wenn exportiert werden kann
+    """
+    if date_from > date_to:
+        return "Das Enddatum liegt vor dem Startdatum."
+    if fiscal_year_start(tenant, date_from) != fiscal_year_start(tenant, date_to):
+        return (
+            f"Der Zeitraum {date_from:%d.%m.%Y} - {date_to:%d.%m.%Y} umfasst mehrere Wirtschaftsjahre. "
+            "Bitte je Wirtschaftsjahr einen eigenen Buchungsstapel exportieren."
+        )
+    return ''
+
+
+def _extf_header(tenant, date_from: date, date_to: date, created_at: datetime) -> list:
+    """DATEV EXTF-Kopfsatz (Zeile 1) mit Berater-/Mandantennummer des Mandanten."""
+    return [
+        'EXTF',
+        EXTF_FORMAT_VERSION,
+        EXTF_CATEGORY,
+        EXTF_CATEGORY_NAME,
+        EXTF_CATEGORY_VERSION,
+        created_at.strftime('%Y%m%d%H%M%S%f')[:17],  # Erzeugt am
+        '',                                         # Importiert
+        'RE',                                       # Herkunft
+        '',                                         # Exportiert von
+        '',                                         # Importiert von
+        tenant.datev_consultant_number,             # Berater
+        tenant.datev_client_number,                 # Mandant
+        fiscal_year_start(tenant, date_from).strftime('%Y%m%d'),  # WJ-Beginn
+        tenant.datev_account_length,                # Sachkontenlänge
+        date_from.strftime('%Y%m%d'),               # Datum vom
+        date_to.strftime('%Y%m%d'),                 # Datum bis
+        f"Rechnungsausgang {date_from:%m/%Y}",      # Bezeichnung
+        '',                                         # Diktatkürzel
+        1,                                          # Buchungstyp: Finanzbuchführung
+        0,                                          # Rechnungslegungszweck
+        0,                                          # Festschreibung
+        'EUR',                                      # WKZ
+        '', '', '', '', '', '', '', '', '',
+    ]
+
+
+def _extf_booking_row(booking: dict, generalumkehr: bool = False) -> list:
+    gross = booking['net'] + booking['tax']
+    name = booking['invoice__customer__company_name'] or (
+        f"{booking['invoice__customer__first_name']} {booking['invoice__customer__last_name']}".strip()
+    )
+
+    return _buchung_row(
+        umsatz=f"{gross:.2f}".replace('.', ','),
+        konto=10000 + booking['invoice__customer_id'],
+        gegenkonto=ERLOES_KONTEN.get(booking['vat_rate'], ERLOES_KONTEN[DEFAULT_VAT_RATE]),
+        beleg_datum=booking['invoice__invoice_date'].strftime('%d%m'),
+        belegfeld=booking['invoice__invoice_number'],
+        buchungstext=f"{'Storno RE' if generalumkehr else 'RE'} {name[:20]}",
+        generalumkehr=generalumkehr,
+    )
+
+
+def iter_datev_extf(bookings: Iterable[dict], tenant, date_from: date, date_to: date,
+                    created_at: datetime = None, reversals: Iterable[dict] = ()) -> Iterator[str]:
+    """
+    DATEV EXTF Buchungsstapel: Kopfsatz, Spaltenüberschriften und eine
+    Buchung je Rechnung und MwSt-Satz mit passendem Erlöskonto.
+
+    Args:
+        bookings: Ergebnis von load_datev_bookings() (gerne per .iterator())
+        reversals: frühere Buchungen (reversal_bookings), die vorab per
+            Generalumkehr (GU = 1) storniert werden
+    """
+    writer = _row_writer()
+    created_at = created_at or datetime.now()
+
+    yield writer.writerow(_extf_header(tenant, date_from, date_to, created_at))
+    yield writer.writerow(BUCHUNGSSTAPEL_COLUMNS)
+
+    for booking in reversals:
+        yield writer.writerow(_extf_booking_row(booking, generalumkehr=True))
+
+    for booking in bookings:
+        yield writer.writerow(_extf_booking_row(booking))
+
+
+def _dominant_vat_rate(invoice: 'Invoice') -> Decimal:
+    """
+    MwSt-Satz mit dem höchsten Nettoanteil.
+
+    Kommt die Rechnung aus load_datev_invoices(), ist der Satz bereits per SQL
+    annotiert; sonst wird er aus den (ggf. vorgeladenen) Positionen bestimmt.
+    """
+    if hasattr(invoice, 'datev_vat_rate'):
+        rate = invoice.datev_vat_rate
+    else:
+        nets = {}
+        for item in invoice.items.all():
+            nets[item.vat_rate] = nets.get(item.vat_rate, Decimal('0')) + item.line_total
+        rate = max(nets, key=nets.get) if nets else None
+
+    return rate if rate is not None else DEFAULT_VAT_RATE
 
 
 def _get_erlos_konto(invoice: 'Invoice') -> int:
     """Ermittelt das Erlöskonto basierend auf MwSt-Satz."""
-    if not invoice.items.exists():
-        return 8400  # Standard 19%
-    
-    vat_rate = invoice.items.first().vat_rate
-    
-    if vat_rate == Decimal('19'):
-        return 8400  # Erlöse 19% USt
-    elif vat_rate == Decimal('7'):
-        return 8300  # Erlöse 7% USt
-    elif vat_rate == Decimal('0'):
-        return 8100  # Steuerfreie Erlöse
-    else:
-        return 8400  # Fallback
\ No newline at end of file
+    return ERLOES_KONTEN.get(_dominant_vat_rate(invoice), ERLOES_KONTEN[DEFAULT_VAT_RATE])
@@ -0,0 +1,271 @@
+"""
+Inkrementelle DATEV-Exporte mit High-Watermark je Mandant und Abnehmer
+- Gebuchter Stand je Rechnung und Abnehmer (DatevExportedInvoice): nur neue
+  oder buchungsrelevant geänderte Rechnungen werden erneut gebucht
+- Stornierte oder geänderte Rechnungen erhalten eine Generalumkehr der alten Buchung
+"""
+
+import tempfile
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Exists, F, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from .datev import (
+    EXCLUDED_STATUSES, extf_period_error, extf_settings_error, iter_datev_extf, iter_datev_simple,
+    load_datev_bookings, load_datev_invoices, reversal_bookings,
+)
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _watermark_lag() -> timedelta:
+    """
+    Sicherheitsabstand zur aktuellen Zeit.
+
+    updated_at wird beim save() gesetzt, nicht beim Commit. Rechnungen, deren
+    Transaktion noch offen ist, würden sonst hinter dem Watermark landen und
+    nie exportiert.
+    """
+    return timedelta(seconds=getattr(settings, 'DATEV_EXPORT_WATERMARK_LAG_SECONDS', 60))
+
+
+def advances_watermark(mode: str, date_from: date = None, date_to: date = None) -> bool:
+    """
+    Nur ungefilterte inkrementelle Läufe setzen den Watermark.
+
+    Ein auf einen Zeitraum beschränkter Lauf würde sonst Rechnungen anderer
+    Zeiträume, die vor seinem Watermark geändert wurden, für alle folgenden
+    Läufe überspringen; ein Vollexport soll den Stand nicht verschieben.
+    """
+    return mode == 'incremental' and not date_from and not date_to
+
+
+def last_export_run(tenant, consumer: str):
+    """Letzter Lauf, der den Watermark des Abnehmers gesetzt hat."""
+    from .models import DatevExportRun
+
+    return (
+        DatevExportRun.objects
+        .filter(tenant=tenant, consumer=consumer, mode='incremental',
+                date_from__isnull=True, date_to__isnull=True,
+                watermark_updated_at__isnull=False)
+        .order_by('-created_at', '-id')
+        .first()
+    )
+
+
+def _changed_invoices(tenant, consumer: str, mode: str, date_from: date = None, date_to: date = None):
+    """Rechnungen im Zeitraum, inkrementell nur nach dem Watermark (alle Status)."""
+    from .models import Invoice
+
+    invoices = Invoice.objects.filter(tenant=tenant, updated_at__lte=timezone.now() - _watermark_lag())
+
+    if date_from:
+        invoices = invoices.filter(invoice_date__gte=date_from)
+    if date_to:
+        invoices = invoices.filter(invoice_date__lte=date_to)
+
+    if mode == 'incremental':
+        last_run = last_export_run(tenant, consumer)
+        if last_run:
+            invoices = invoices.filter(
+                Q(updated_at__gt=last_run.watermark_updated_at)
+                | Q(updated_at=last_run.watermark_updated_at, id__gt=last_run.watermark_id)
+            )
+
+    return invoices
+
+
+def select_export_invoices(tenant, consumer: str, mode: str,
+                           date_from: date = None, date_to: date = None):
+    """
+    Rechnungen für einen Export-Lauf, sortiert nach (updated_at, id).
+
+    Inkrementell: nur Rechnungen nach dem Watermark des letzten Laufs
+    dieses Abnehmers (Keyset-Bedingung, nutzt invoice_tenant_updated_idx),
+    davon nur solche, die der Abnehmer noch nicht oder mit anderem Betrag,
+    Rechnungsdatum oder Kunden gebucht hat. Ein reiner Statuswechsel
+    (versendet, bezahlt) wird nicht erneut gebucht.
+    """
+    from .models import DatevExportedInvoice
+
+    invoices = _changed_invoices(tenant, consumer, mode, date_from, date_to).exclude(
+        status__in=EXCLUDED_STATUSES)
+
+    if mode == 'incremental':
+        booked = DatevExportedInvoice.objects.filter(
+            consumer=consumer,
+            invoice=OuterRef('pk'),
+            reversed=False,
+            amount=OuterRef('total'),
+            invoice_date=OuterRef('invoice_date'),
+            customer=OuterRef('customer'),
+        )
+        invoices = invoices.exclude(Exists(booked))
+
+    return invoices.order_by('updated_at', 'id')
+
+
+def select_reversals(tenant, consumer: str, mode: str,
+                     date_from: date = None, date_to: date = None):
+    """
+    Frühere Buchungen des Abnehmers, die per Generalumkehr storniert werden.
+
+    Betrifft Rechnungen, die nach dem Export storniert wurden oder deren
+    Betrag, Rechnungsdatum oder Kunde sich geändert hat (die neue Buchung
+    liefert dann select_export_invoices). Nur inkrementelle Läufe.
+    """
+    from .models import DatevExportedInvoice
+
+    if mode != 'incremental':
+        return DatevExportedInvoice.objects.none()
+
+    changed = _changed_invoices(tenant, consumer, mode, date_from, date_to)
+    return (
+        DatevExportedInvoice.objects
+        .filter(tenant=tenant, consumer=consumer, reversed=False, invoice__in=changed.values('pk'))
+        .filter(
+            Q(invoice__status__in=EXCLUDED_STATUSES)
+            | ~Q(amount=F('invoice__total'))
+            | ~Q(invoice_date=F('invoice__invoice_date'))
+            | ~Q(customer=F('invoice__customer'))
+        )
+        .select_related('invoice', 'customer')
+        .order_by('invoice_date', 'id')
+    )
+
+
+def _record_bookings(run, invoices, reversals) -> None:
+    """
+    Buchungsstand des Abnehmers nach einem inkrementellen Lauf speichern.
+
+    Stornierte Buchungen werden markiert, gebuchte Rechnungen mit Betrag,
+    Datum, Kunde und den Beträgen je MwSt-Satz (für eine spätere
+    Generalumkehr) angelegt bzw. überschrieben.
+    """
+    from .models import DatevExportedInvoice, Invoice
+
+    DatevExportedInvoice.objects.filter(pk__in=[entry.pk for entry in reversals]).update(
+        reversed=True, run=run)
+
+    invoice_ids = list(invoices.order_by().values_list('pk', flat=True))
+    for start in range(0, len(invoice_ids), EXPORT_CHUNK_SIZE):
+        chunk = Invoice.objects.filter(pk__in=invoice_ids[start:start + EXPORT_CHUNK_SIZE])
+
+        bookings = defaultdict(list)
+        for booking in load_datev_bookings(chunk):
+            bookings[booking['invoice_id']].append(
+                [str(booking['vat_rate']), str(booking['net']), str(booking['tax'])])
+
+        DatevExportedInvoice.objects.bulk_create(
+            [
+                DatevExportedInvoice(
+                    tenant=run.tenant,
+                    consumer=run.consumer,
+                    invoice_id=invoice_id,
+                    run=run,
+                    customer_id=customer_id,
+                    invoice_date=invoice_date,
+                    amount=total,
+                    bookings=bookings[invoice_id],
+                )
+                for invoice_id, customer_id, invoice_date, total
+                in chunk.values_list('pk', 'customer_id', 'invoice_date', 'total')
+            ],
+            update_conflicts=True,
+            unique_fields=['consumer', 'invoice'],
+            update_fields=['run', 'customer', 'invoice_date', 'amount', 'bookings', 'reversed', 'exported_at'],
+        )
+
+
+def run_datev_export(tenant, consumer: str = 'default', mode: str = 'incremental',
+                     export_format: str = 'simple', date_from: date = None,
+                     date_to: date = None, user=None):
+    """
+    Führt einen DATEV-Export aus und speichert Datei und ggf. Watermark
+    (nur ungefilterte inkrementelle Läufe, siehe advances_watermark).
+
+    Inkrementelle Läufe stornieren geänderte oder stornierte Buchungen per
+    Generalumkehr und merken sich den gebuchten Stand je Rechnung
+    (DatevExportedInvoice); Vollexporte ändern den Buchungsstand nicht.
+
+    Die Datei wird zeilenweise in eine temporäre Datei geschrieben und dann
+    in den Media-Storage übernommen - der Speicherbedarf bleibt konstant.
+    Ohne neue Rechnungen bleibt der Watermark des Vorläufers erhalten.
+    """
+    from .models import DatevExportRun
+
+    if export_format == 'extf' and extf_settings_error(tenant):
+        raise ValueError(extf_settings_error(tenant))
+
+    invoices = select_export_invoices(tenant, consumer, mode, date_from, date_to)
+    reversals = list(select_reversals(tenant, consumer, mode, date_from, date_to))
+
+    # Watermark vorab bestimmen: der Export liest genau diese Menge (updated_at <= Obergrenze)
+    newest = (
+        _changed_invoices(tenant, consumer, mode, date_from, date_to)
+        .order_by('-updated_at', '-id').values_list('updated_at', 'id').first()
+    )
+    invoice_count = invoices.count()
+
+    run = DatevExportRun(
+        tenant=tenant,
+        consumer=consumer,
+        mode=mode,
+        export_format=export_format,
+        date_from=date_from,
+        date_to=date_to,
+        invoice_count=invoice_count,
+        reversal_count=len(reversals),
+        created_by=user,
+    )
+
+    if advances_watermark(mode, date_from, date_to):
+        if newest:
+            run.watermark_updated_at, run.watermark_id = newest
+        else:
+            previous = last_export_run(tenant, consumer)
+            if previous:
+                run.watermark_updated_at = previous.watermark_updated_at
+                run.watermark_id = previous.watermark_id
+
+    if export_format == 'extf':
+        today = timezone.localdate()
+        bounds = invoices.aggregate(first=Min('invoice_date'), last=Max('invoice_date'))
+        dates = [d for d in (bounds['first'], bounds['last'], *(e.invoice_date for e in reversals)) if d]
+        period = (date_from or min(dates, default=today), date_to or max(dates, default=today))
+        # Ein Buchungsstapel je Wirtschaftsjahr: sonst Lauf mit date_from/date_to je Jahr
+        error = extf_period_error(tenant, *period)
+        if error:
+            raise ValueError(error)
+
+        rows = iter_datev_extf(
+            load_datev_bookings(invoices).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            tenant,
+            *period,
+            reversals=reversal_bookings(reversals),
+        )
+        encoding = 'cp1252'
+    else:
+        rows = iter_datev_simple(
+            load_datev_invoices(invoices).iterator(chunk_size=EXPORT_CHUNK_SIZE), reversals=reversals)
+        encoding = 'utf-8'
+
+    with tempfile.TemporaryFile() as tmp:
+        for row in rows:
+            tmp.write(row.encode(encoding, errors='replace'))
+        tmp.seek(0)
+
+        filename = f"datev_{export_format}_{consumer}_{timezone.now():%Y%m%d_%H%M%S}.csv"
+        run.file.save(filename, File(tmp), save=False)
+
+    with transaction.atomic():
+        run.save()
+        if mode == 'incremental':
+            _record_bookings(run, invoices, reversals)
+    return run
@@ -0,0 +1,95 @@
+"""
+Automatischer Mahnlauf (Celery Beat, täglich)
+- Je Mandant eine Query über den Index (tenant, status, due_date): überfällige
+  Rechnungen samt aktueller Mahnstufe und Zeitpunkt der letzten Mahnung
+- Wartefristen und Gebühren je Stufe aus den Einstellungen, je Mandant überschreibbar
+- Mahnungen werden paketweise angelegt und über die Outbox versendet
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .bulk_send import (
+    MAX_REMINDER_LEVEL, REMINDER_ROW_FIELDS, enqueue_reminder_rows, select_for_dunning,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _per_level(defaults: dict, overrides: dict, cast) -> dict:
+    values = {int(level): cast(value) for level, value in (defaults or {}).items()}
+    values.update({int(level): cast(value) for level, value in (overrides or {}).items()})
+    return values
+
+
+def waiting_days(tenant) -> dict:
+    """Wartefrist je Stufe: Stufe 1 ab Fälligkeit, weitere ab der vorherigen Mahnung."""
+    return _per_level(getattr(settings, 'DUNNING_WAITING_DAYS', {}), tenant.dunning_waiting_days, int)
+
+
+def dunning_fees(tenant) -> dict:
+    return _per_level(
+        getattr(settings, 'DUNNING_FEES', {}), tenant.dunning_fees, lambda value: Decimal(str(value)))
+
+
+def select_due(tenant, today=None):
+    """
+    Rechnungen, deren Wartefrist für die nächste Mahnstufe abgelaufen ist.
+
+    Stufe und letzte Mahnung kommen als Aggregat in derselben Query, die
+    Fristen je Stufe werden im HAVING geprüft.
+    """
+    today = today or timezone.localdate()
+    waits = waiting_days(tenant)
+    now = timezone.now()
+
+    due = Q(reminder_level=0, due_date__lte=today - timedelta(days=waits.get(1, 0)))
+    for level in range(2, MAX_REMINDER_LEVEL + 1):
+        due |= Q(
+            reminder_level=level - 1,
+            last_reminder_at__lte=now - timedelta(days=waits.get(level, 0)),
+        )
+
+    return (
+        select_for_dunning(tenant, {}, today=today)
+        .annotate(last_reminder_at=Max(
+            'reminders__sent_at', filter=~Q(reminders__delivery_status='failed')))
+        .filter(due)
+    )
+
+
+def run_dunning(tenant, today=None) -> dict:
+    """
+    Mahnlauf für einen Mandanten.
+
+    Die Auswahl wird gestreamt und in Paketen zu DUNNING_BATCH_SIZE angelegt;
+    jedes Paket ist eine eigene Transaktion und geht nach dem Commit an die
+    Batch-Tasks der Outbox.
+
+    Returns:
+        dict: run_id und Anzahl angelegter Mahnungen
+    """
+    batch_size = max(1, getattr(settings, 'DUNNING_BATCH_SIZE', 500))
+    fees = dunning_fees(tenant)
+    run_id = uuid.uuid4()
+    count = 0
+
+    rows = select_due(tenant, today).order_by().values_list(*REMINDER_ROW_FIELDS)
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            count += enqueue_reminder_rows(batch, run_id, fees=fees)
+            batch = []
+    if batch:
+        count += enqueue_reminder_rows(batch, run_id, fees=fees)
+
+    if count:
+        logger.info("Mahnlauf %s: %s Mahnungen für %s", run_id, count, tenant)
+    return {'run_id': str(run_id), 'count': count}
@@ -1,15 +1,19 @@
 """
 E-Mail Service für Rechnungsversand
+- Betreff und Text aus Vorlagen (mail_templates.py, je Mandant anpassbar)
 """
 from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
+from .mail_templates import render_invoice_mail, render_reminder_mail
 from .zugferd import generate_zugferd_pdf
 from .xrechnung import generate_xrechnung
+from .validation import ensure_valid
 
 
 def send_invoice_email(invoice, recipient_email: str = None) -> bool:
     """
-    Versendet eine Rechnung per E-Mail.
+    Versendet eine Rechnung per E-Mail (synchron).
+
+    Im Request nicht verwenden, dafür gibt es die Outbox (outbox.py).
     
     Args:
         invoice: Invoice Objekt
@@ -17,6 +21,21 @@ def send_invoice_email(invoice, recipient_email: str = None) -> bool:
     
     Returns:
         bool: True wenn erfolgreich
+
+    Raises:
+        InvoiceNotValid: XRechnung wurde vom Validator abgelehnt
+    """
+    build_invoice_email(invoice, recipient_email).send(fail_silently=False)
+    return True
+
+
+def build_invoice_email(invoice, recipient_email: str = None) -> EmailMessage:
+    """
+    Baut die Rechnungs-Mail inkl. Anhang (PDF bzw. validiertes XML).
+
+    Raises:
+        ValueError: keine E-Mail-Adresse
+        InvoiceNotValid: XRechnung wurde vom Validator abgelehnt
     """
     to_email = recipient_email or invoice.customer.email
     
@@ -24,35 +43,8 @@ def send_invoice_email(invoice, recipient_email: str = None) -> bool:
         raise ValueError("Keine E-Mail-Adresse vorhanden")
     
     tenant = invoice.tenant
-    subject = f"Rechnung {invoice.invoice_number} von {tenant.name}"
-    
-    # E-Mail Body
-    body = f"""Sehr geehrte Damen und Herren,
-
-anbei erhalten Sie die Rechnung {invoice.invoice_number}.
-
-Rechnungsdatum: {invoice.invoice_date.strftime('%d.%m.%Y')}
-Fällig bis: {invoice.due_date.strftime('%d.%m.%Y')}
-Betrag: {invoice.total:.2f} €
+    subject, body = render_invoice_mail(invoice)
 
-Bitte überweisen Sie den Betrag auf folgendes Konto:
-Bank: {tenant.bank_name or '-'}
-IBAN: {tenant.iban or '-'}
-BIC: {tenant.bic or '-'}
-Verwendungszweck: {invoice.invoice_number}
-
-Bei Fragen stehen wir Ihnen gerne zur Verfügung.
-
-Mit freundlichen Grüßen
-{tenant.name}
-
---
-{tenant.street}
-{tenant.zip_code} {tenant.city}
-Tel: {tenant.phone or '-'}
-E-Mail: {tenant.email or '-'}
-"""
-    
     email = EmailMessage(
         subject=subject,
         body=body,
@@ -70,18 +62,20 @@ E-Mail: {tenant.email or '-'}
         )
     else:
         xml_content = generate_xrechnung(invoice)
+        # Abgelehnte XRechnungen nicht versenden (Ergebnis meist aus dem Cache)
+        ensure_valid(invoice, xml_content)
         email.attach(
             f"{invoice.invoice_number}.xml",
             xml_content,
             'application/xml'
         )
-    
-    email.send(fail_silently=False)
-    return True
+
+    return email
+
 
 def send_reminder_email(invoice, level: int, recipient_email: str, fee: float = 0) -> bool:
     """
-    Versendet eine Zahlungserinnerung / Mahnung per E-Mail.
+    Versendet eine Zahlungserinnerung / Mahnung per E-Mail (synchron).
     
     Args:
         invoice: Invoice Objekt
@@ -92,71 +86,20 @@ def send_reminder_email(invoice, level: int, recipient_email: str, fee: float =
     Returns:
         bool: True wenn erfolgreich
     """
-    from django.core.mail import EmailMessage
-    
-    tenant = invoice.tenant
-    
-    level_texts = {
-        1: ("Zahlungserinnerung", "freundlich"),
-        2: ("2. Mahnung", "dringend"),
-        3: ("Letzte Mahnung", "umgehend"),
-    }
-    
-    title, urgency = level_texts.get(level, ("Mahnung", "zeitnah"))
-    subject = f"{title} - Rechnung {invoice.invoice_number}"
-    
-    total_with_fee = float(invoice.total) + float(fee)
-    
-    body = f"""Sehr geehrte Damen und Herren,
-
-{"wir möchten Sie freundlich daran erinnern" if level == 1 else "trotz unserer bisherigen Erinnerungen"}, dass die folgende Rechnung noch nicht beglichen wurde:
-
-Rechnungsnummer: {invoice.invoice_number}
-Rechnungsdatum: {invoice.invoice_date.strftime('%d.%m.%Y')}
-Ursprüngliches Fälligkeitsdatum: {invoice.due_date.strftime('%d.%m.%Y')}
-Offener Betrag: {invoice.total:.2f} €"""
-
-    if fee > 0:
-        body += f"""
-Mahngebühr: {fee:.2f} €
-Gesamtbetrag: {total_with_fee:.2f} €"""
-
-    body += f"""
-
-Wir bitten Sie {urgency}, den ausstehenden Betrag auf folgendes Konto zu überweisen:
-
-Bank: {tenant.bank_name or '-'}
-IBAN: {tenant.iban or '-'}
-BIC: {tenant.bic or '-'}
-Verwendungszweck: {invoice.invoice_number}
-
-"""
-
-    if level == 1:
-        body += "Sollte sich Ihre Zahlung mit diesem Schreiben gekreuzt haben, betrachten Sie diese Erinnerung bitte als gegenstandslos."
-    elif level == 2:
-        body += "Sollten Sie Fragen zur Rechnung haben oder eine Ratenzahlung vereinbaren wollen, kontaktieren Sie uns bitte umgehend."
-    else:
-        body += "Dies ist unsere letzte Mahnung. Bei ausbleibender Zahlung behalten wir uns weitere rechtliche Schritte vor."
+    build_reminder_email(invoice, level, recipient_email, fee).send(fail_silently=False)
+    return True
 
-    body += f"""
 
-Mit freundlichen Grüßen
-{tenant.name}
+def build_reminder_email(invoice, level: int, recipient_email: str, fee: float = 0) -> EmailMessage:
+    """Baut die Mahnungs-Mail (siehe send_reminder_email)."""
+    tenant = invoice.tenant
+    subject, body = render_reminder_mail(invoice, level, fee)
 
---
-{tenant.street}
-{tenant.zip_code} {tenant.city}
-Tel: {tenant.phone or '-'}
-E-Mail: {tenant.email or '-'}
-"""
-    
     email = EmailMessage(
         subject=subject,
         body=body,
         from_email=f"{tenant.name} <{tenant.email}>" if tenant.email else None,
         to=[recipient_email],
     )
-    
-    email.send(fail_silently=False)
-    return True
\ No newline at end of file
+
+    return email
\ No newline at end of file
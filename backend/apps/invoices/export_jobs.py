@@ -0,0 +1,342 @@
+"""
+Hintergrund-Exporte (Export-Jobs)
+- Registry der Exportarten (DATEV, EXTF, ...)
+- Zeiträume über mehrere Monate werden parallel je Monat erzeugt
+- Zeilenweises Schreiben in eine temporäre Datei, dann in den Media-Storage
+- Fortschritt und Durchsatz werden regelmäßig am Job gespeichert
+"""
+
+import json
+import logging
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, BinaryIO, Callable, Iterator
+
+from django.core.files import File
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .datev import (
+    EXCLUDED_STATUSES, extf_period_error, extf_settings_error, iter_datev_extf, iter_datev_simple,
+    load_datev_bookings, load_datev_invoices,
+)
+from .export_shards import month_shards, write_sharded
+
+if TYPE_CHECKING:
+    from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Fortschritt höchstens einmal pro Sekunde in die DB schreiben
+PROGRESS_INTERVAL = 1.0
+
+
+@dataclass
+class ExportSpec:
+    """
+    Beschreibung eines Exports: Zeilen-Generator plus Metadaten.
+
+    Binäre Exporte liefern statt rows einen writer(fileobj, progress), der
+    die Datei selbst schreibt und progress(anzahl) je Batch aufruft. Exporte,
+    deren Datei schon im Storage liegt (DATEV-Lauf), liefern store(progress)
+    und geben deren Namen zurück; der Job verweist dann auf diese Datei.
+    """
+    total_rows: int
+    filename: str
+    rows: Iterator[str] | None = None
+    writer: Callable[[BinaryIO, Callable[[int], None]], object] | None = None
+    store: Callable[[Callable[[int], None]], str] | None = None
+    encoding: str = 'utf-8'
+    header_rows: int = 1
+
+
+EXPORTERS: dict[str, Callable[['ExportJob'], ExportSpec]] = {}
+
+
+def register_exporter(kind: str):
+    """Registriert eine Exportart für ExportJob.kind."""
+    def decorator(func):
+        EXPORTERS[kind] = func
+        return func
+    return decorator
+
+
+def _datev_invoices(job):
+    """Rechnungen des Jobs und der Zeitraum (ohne Angabe: erste bis letzte Rechnung)."""
+    from .models import Invoice
+
+    invoices = Invoice.objects.filter(tenant=job.tenant).exclude(status__in=EXCLUDED_STATUSES)
+
+    date_from = parse_date(job.params.get('from') or '')
+    date_to = parse_date(job.params.get('to') or '')
+    if date_from:
+        invoices = invoices.filter(invoice_date__gte=date_from)
+    if date_to:
+        invoices = invoices.filter(invoice_date__lte=date_to)
+
+    if not date_from or not date_to:
+        bounds = invoices.aggregate(first=Min('invoice_date'), last=Max('invoice_date'))
+        date_from = date_from or bounds['first'] or timezone.localdate()
+        date_to = date_to or bounds['last'] or timezone.localdate()
+
+    return invoices, date_from, date_to
+
+
+def _sharded_text_spec(invoices, date_from, date_to, render, **spec) -> ExportSpec:
+    """
+    Textexport, der bei mehreren Monaten monatsweise parallel erzeugt wird.
+
+    render(invoices) liefert die Zeilen inkl. Kopfzeilen; die Kopfzeilen
+    werden nur aus dem ersten Monat übernommen.
+    """
+    spec = ExportSpec(**spec)
+    shards = month_shards(date_from, date_to)
+
+    if len(shards) < 2:
+        spec.rows = render(invoices)
+        return spec
+
+    def render_shard(index, shard, out, progress):
+        for line_no, row in enumerate(render(invoices.filter(invoice_date__range=shard))):
+            if line_no < spec.header_rows:
+                if index:
+                    continue
+            else:
+                progress(1)
+            out.write(row.encode(spec.encoding, errors='replace'))
+
+    spec.writer = lambda fileobj, progress: write_sharded(
+        fileobj, shards, render_shard, progress=progress)
+    return spec
+
+
+@register_exporter('datev')
+def _datev_export(job) -> ExportSpec:
+    invoices, date_from, date_to = _datev_invoices(job)
+
+    def render(shard_invoices):
+        return iter_datev_simple(
+            load_datev_invoices(shard_invoices.order_by('invoice_date', 'invoice_number', 'id'))
+            .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+
+    return _sharded_text_spec(
+        invoices, date_from, date_to, render,
+        total_rows=invoices.count(),
+        filename=f"datev_export_{timezone.localdate()}.csv",
+    )
+
+
+@register_exporter('datev_extf')
+def _datev_extf_export(job) -> ExportSpec:
+    error = extf_settings_error(job.tenant)
+    if error:
+        raise ValueError(error)
+
+    invoices, date_from, date_to = _datev_invoices(job)
+    error = extf_period_error(job.tenant, date_from, date_to)
+    if error:
+        raise ValueError(error)
+
+    # Ein Zeitstempel für alle Monate, der Kopfsatz stammt aus dem ersten
+    created_at = timezone.localtime().replace(tzinfo=None)
+
+    def render(shard_invoices):
+        return iter_datev_extf(
+            load_datev_bookings(shard_invoices).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            job.tenant, date_from, date_to, created_at=created_at,
+        )
+
+    return _sharded_text_spec(
+        invoices, date_from, date_to, render,
+        total_rows=load_datev_bookings(invoices).count(),
+        filename=f"EXTF_Buchungsstapel_{date_from:%Y%m%d}_{date_to:%Y%m%d}.csv",
+        encoding='cp1252',
+        header_rows=2,
+    )
+
+
+@register_exporter('datev_run')
+def _datev_run_export(job) -> ExportSpec:
+    """
+    Export-Lauf je Abnehmer (datev_runs.py); der Job verweist auf die Datei des Laufs.
+
+    Die ID des Laufs wird nach dem Export in job.params['run_id'] ergänzt,
+    die Anzahl (gebuchte Rechnungen und Generalumkehr) kommt aus dem Lauf.
+    """
+    from .datev_runs import run_datev_export
+    from .models import ExportJob
+
+    params = {
+        'consumer': job.params.get('consumer') or 'default',
+        'mode': job.params.get('mode') or 'incremental',
+        'date_from': parse_date(job.params.get('date_from') or ''),
+        'date_to': parse_date(job.params.get('date_to') or ''),
+    }
+    export_format = job.params.get('export_format') or 'simple'
+
+    def store(progress):
+        run = run_datev_export(job.tenant, export_format=export_format, user=job.created_by, **params)
+        job.total_rows = run.invoice_count + run.reversal_count
+        progress(job.total_rows)
+
+        job.params = {**job.params, 'run_id': run.pk}
+        ExportJob.objects.filter(pk=job.pk).update(params=job.params, total_rows=job.total_rows)
+        return run.file.name
+
+    return ExportSpec(
+        store=store,
+        total_rows=0,
+        filename=f"datev_{export_format}_{params['consumer']}_{timezone.localdate()}.csv",
+    )
+
+
+@register_exporter('analytics')
+def _analytics_export(job) -> ExportSpec:
+    from .analytics_export import analytics_querysets, write_analytics_zip
+
+    date_from = parse_date(job.params.get('from') or '')
+    date_to = parse_date(job.params.get('to') or '')
+    fmt = job.params.get('format', 'parquet')
+
+    invoices, items = analytics_querysets(job.tenant, date_from, date_to)
+
+    return ExportSpec(
+        writer=lambda fileobj, progress: write_analytics_zip(
+            job.tenant, fileobj, date_from, date_to, fmt=fmt, progress=progress),
+        total_rows=invoices.count() + items.count(),
+        filename=f"analytics_{fmt}_{timezone.localdate()}.zip",
+    )
+
+
+@register_exporter('validation')
+def _validation_report(job) -> ExportSpec:
+    from .validation_batch import select_invoices, validate_batch
+
+    invoices = select_invoices(job.tenant, job.params)
+
+    def write(fileobj, progress):
+        report = validate_batch(invoices, progress=progress)
+        fileobj.write(json.dumps(report.as_dict(), ensure_ascii=False, indent=2).encode('utf-8'))
+
+    return ExportSpec(
+        writer=write,
+        total_rows=invoices.count(),
+        filename=f"validation_report_{timezone.localdate()}.json",
+    )
+
+
+def _save_progress(job, processed: int, elapsed: float) -> None:
+    from .models import ExportJob
+
+    job.processed_rows = processed
+    job.rows_per_second = round(processed / elapsed, 1) if elapsed > 0 else 0
+    ExportJob.objects.filter(pk=job.pk).update(
+        processed_rows=job.processed_rows,
+        rows_per_second=job.rows_per_second,
+    )
+
+
+def run_export_job(job) -> None:
+    """
+    Führt einen Export-Job aus (im Celery-Worker).
+
+    Raises:
+        ValueError: unbekannte Exportart
+    """
+    exporter = EXPORTERS.get(job.kind)
+    if exporter is None:
+        raise ValueError(f"Unbekannte Exportart: {job.kind}")
+
+    job.status = 'running'
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+
+    spec = exporter(job)
+    job.total_rows = spec.total_rows
+    job.save(update_fields=['total_rows'])
+
+    started = time.monotonic()
+    last_report = started
+    processed = 0
+
+    def progress(rows: int) -> None:
+        nonlocal processed, last_report
+        processed += rows
+
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL:
+            _save_progress(job, processed, now - started)
+            last_report = now
+
+    if spec.store is not None:
+        job.file.name = spec.store(progress)
+    else:
+        with tempfile.TemporaryFile() as tmp:
+            if spec.writer is not None:
+                spec.writer(tmp, progress)
+            else:
+                for line_no, row in enumerate(spec.rows):
+                    tmp.write(row.encode(spec.encoding, errors='replace'))
+                    progress(1 if line_no >= spec.header_rows else 0)
+
+            tmp.seek(0)
+            job.file.save(spec.filename, File(tmp), save=False)
+
+    _save_progress(job, processed, time.monotonic() - started)
+    job.status = 'done'
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'finished_at', 'processed_rows', 'rows_per_second'])
+
+    notify_export_finished(job)
+
+
+def fail_export_job(job, error: str) -> None:
+    job.status = 'failed'
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'error', 'finished_at'])
+    notify_export_finished(job)
+
+
+def notify_export_finished(job) -> None:
+    """Benachrichtigt den Auftraggeber per E-Mail (Fehler werden nur geloggt)."""
+    user = job.created_by
+    if not user or not user.email:
+        return
+
+    if job.status == 'done':
+        subject = f"Export fertig: {job.kind}"
+        body = f"Ihr Export ({job.processed_rows} Zeilen) steht zum Download bereit."
+    else:
+        subject = f"Export fehlgeschlagen: {job.kind}"
+        body = f"Ihr Export konnte nicht erstellt werden:\n{job.error}"
+
+    try:
+        send_mail(subject, body, None, [user.email], fail_silently=False)
+    except Exception:
+        logger.warning("Export-Benachrichtigung an %s fehlgeschlagen", user.email, exc_info=True)
+
+
+def enqueue_export(tenant, kind: str, params: dict = None, user=None):
+    """Legt einen Export-Job an und übergibt ihn nach dem Commit an den Worker."""
+    from .models import ExportJob
+    from .tasks import run_export_job_task
+
+    if kind not in EXPORTERS:
+        raise ValueError(f"Unbekannte Exportart: {kind}")
+
+    job = ExportJob.objects.create(
+        tenant=tenant,
+        kind=kind,
+        params=params or {},
+        created_by=user,
+    )
+    transaction.on_commit(lambda: run_export_job_task.delay(job.pk))
+    return job
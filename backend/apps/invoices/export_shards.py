@@ -0,0 +1,107 @@
+"""
+Parallele Exporte über Monats-Partitionen
+- Zeitraum wird in Kalendermonate zerlegt
+- Monate laufen parallel in einem Thread-Pool, jeder Thread mit eigener DB-Verbindung
+- Ergebnisse werden in Monatsreihenfolge zusammengesetzt (deterministische Ausgabe)
+"""
+
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing
+from datetime import date, timedelta
+from typing import BinaryIO, Callable, Iterable, Iterator
+
+from django.conf import settings
+from django.db import connections
+
+
+def export_shard_workers() -> int:
+    return max(1, int(getattr(settings, 'EXPORT_SHARD_WORKERS', 4)))
+
+
+def month_shards(date_from: date, date_to: date) -> list[tuple[date, date]]:
+    """Zerlegt [date_from, date_to] in Kalendermonate (erster/letzter Monat ggf. angeschnitten)."""
+    shards = []
+    start = date_from
+
+    while start <= date_to:
+        next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+        end = min(next_month - timedelta(days=1), date_to)
+        shards.append((start, end))
+        start = next_month
+
+    return shards
+
+
+def _in_thread(func):
+    def run(shard):
+        try:
+            return func(shard)
+        finally:
+            # Verbindungen des Worker-Threads nicht offen liegen lassen
+            connections.close_all()
+    return run
+
+
+def map_shards(func: Callable, shards: Iterable, workers: int = None) -> Iterator:
+    """
+    Wendet func parallel auf alle Shards an, Ergebnisse in Shard-Reihenfolge.
+
+    Mit einem Worker (oder nur einem Shard) läuft alles im aufrufenden Thread.
+    Schlägt ein Shard fehl oder wird der Generator vorzeitig geschlossen,
+    starten noch wartende Shards nicht mehr; laufende werden abgewartet.
+    """
+    shards = list(shards)
+    workers = min(workers or export_shard_workers(), len(shards))
+
+    if workers <= 1:
+        yield from map(func, shards)
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-shard')
+    try:
+        futures = [pool.submit(_in_thread(func), shard) for shard in shards]
+        for future in futures:
+            yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def write_sharded(fileobj: BinaryIO, shards: Iterable,
+                  render: Callable[[int, object, BinaryIO, Callable[[int], None]], None],
+                  workers: int = None, progress: Callable[[int], None] = None) -> None:
+    """
+    Schreibt jeden Shard in eine eigene temporäre Datei und hängt sie der
+    Reihe nach an fileobj an.
+
+    Die temporären Dateien gehören write_sharded: bei einem Fehler werden
+    auch die schon fertigen Shards geschlossen und gelöscht.
+
+    Args:
+        render: render(index, shard, out, progress) schreibt einen Shard
+        progress: wird threadsicher mit der Anzahl verarbeiteter Zeilen aufgerufen
+    """
+    lock = threading.Lock()
+
+    def report(rows: int) -> None:
+        if progress:
+            with lock:
+                progress(rows)
+
+    with ExitStack() as temp_files:
+        def render_shard(indexed):
+            index, shard = indexed
+            out = tempfile.TemporaryFile()
+            with lock:
+                temp_files.enter_context(out)
+            render(index, shard, out, report)
+            out.seek(0)
+            return out
+
+        # Erst den Pool beenden (closing), dann die Dateien schließen
+        with closing(map_shards(render_shard, enumerate(shards), workers)) as outputs:
+            for out in outputs:
+                with out:
+                    shutil.copyfileobj(out, fileobj)
@@ -0,0 +1,255 @@
+"""
+E-Mail-Vorlagen für Rechnungen und Mahnungen
+- Standardvorlagen unter templates/invoices/email/, je Mandant überschreibbar (MailTemplate)
+- Vorlagen werden je Prozess einmal kompiliert (eigene Engine ohne HTML-Escaping)
+- Mandantenkonstante Bausteine (Signatur, Bankverbindung) werden je Mandant
+  einmal gerendert und bis zur nächsten Änderung am Mandanten wiederverwendet
+- Vorlagen sehen nur einfache Werte, keine Model-Instanzen (kein Zugriff auf
+  Relationen oder Methoden aus Mandanten-Vorlagen)
+- Mandanten-Vorlagen können nur E-Mail-Vorlagen einbinden (tenant_engine)
+
+Variablen aller Vorlagen:
+    invoice (INVOICE_FIELDS, customer_name, customer_number), tenant (TENANT_FIELDS),
+    invoice_date, due_date, total (formatiert), signature, bank_details
+Zusätzlich bei Mahnungen:
+    level, title, urgency, fee (leer ohne Gebühr), total_with_fee
+"""
+
+import os
+from datetime import date
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template import Context, Engine, Template, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.base import Origin
+
+TEMPLATE_DIR = 'invoices/email'
+
+# Mandanten-Vorlagen im geteilten Cache; Änderungen löschen den Eintrag (MailTemplate.save)
+TENANT_TEMPLATES_TIMEOUT = 300
+
+FRAGMENTS = ('signature', 'bank_details')
+
+# Name der Mandanten-Vorlagen in Fehlermeldungen und für relative Pfade
+TENANT_TEMPLATE_NAME = 'mandant.txt'
+
+REMINDER_LEVELS = {
+    1: ("Zahlungserinnerung", "freundlich"),
+    2: ("2. Mahnung", "dringend"),
+    3: ("Letzte Mahnung", "umgehend"),
+}
+
+INVOICE_FIELDS = ('invoice_number', 'buyer_reference', 'subtotal', 'tax_amount', 'total')
+
+TENANT_FIELDS = (
+    'name', 'company_name', 'street', 'zip_code', 'city', 'country',
+    'email', 'phone', 'bank_name', 'iban', 'bic', 'tax_id', 'vat_id',
+)
+
+# Werte für die Probe-Darstellung beim Speichern einer Vorlage
+SAMPLE_INVOICE = {
+    'invoice_number': 'RE-2025-0001', 'buyer_reference': 'PO-4711',
+    'subtotal': Decimal('100.00'), 'tax_amount': Decimal('19.00'), 'total': Decimal('119.00'),
+    'customer_name': 'Kunde GmbH', 'customer_number': 'K-001',
+}
+SAMPLE_TENANT = {field: '' for field in TENANT_FIELDS} | {'name': 'Muster GmbH'}
+
+
+class MailTemplateError(Exception):
+    """Vorlage lässt sich nicht darstellen (Syntaxfehler, fehlende Include-Vorlage)."""
+
+
+# Fehler beim Kompilieren oder Darstellen einer Vorlage
+TEMPLATE_ERRORS = (TemplateSyntaxError, TemplateDoesNotExist)
+
+
+@lru_cache(maxsize=None)
+def mail_engine() -> Engine:
+    """Template-Engine für Text-Mails: kein Escaping, Dateivorlagen gecacht."""
+    dirs = [path for config in settings.TEMPLATES for path in config.get('DIRS', [])]
+    return Engine(
+        dirs=dirs,
+        autoescape=False,
+        loaders=[(
+            'django.template.loaders.cached.Loader',
+            ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader'],
+        )],
+    )
+
+
+@lru_cache(maxsize=None)
+def tenant_engine() -> Engine:
+    """
+    Engine für Mandanten-Vorlagen: {% include %} und {% extends %} finden nur
+    Vorlagen aus invoices/email/ (z.B. "signature.txt"), keine anderen
+    Vorlagen der Anwendung.
+    """
+    app_dir = os.path.join(os.path.dirname(__file__), 'templates')
+    dirs = [path for config in settings.TEMPLATES for path in config.get('DIRS', [])] + [app_dir]
+    return Engine(
+        dirs=[os.path.join(path, TEMPLATE_DIR) for path in dirs],
+        autoescape=False,
+        loaders=[('django.template.loaders.cached.Loader', ['django.template.loaders.filesystem.Loader'])],
+    )
+
+
+@lru_cache(maxsize=512)
+def compile_template(source: str):
+    """Mandanten-Vorlage kompilieren (je Quelltext einmal, TemplateSyntaxError bei Fehlern)."""
+    # Mit Origin-Namen lösen relative Pfade ("./signature.txt") gegen invoices/email/ auf
+    return Template(source, origin=Origin(TENANT_TEMPLATE_NAME, TENANT_TEMPLATE_NAME), engine=tenant_engine())
+
+
+def default_template(kind: str, part: str):
+    return mail_engine().get_template(f"{TEMPLATE_DIR}/{kind}_{part}.txt")
+
+
+def default_source(kind: str, part: str) -> str:
+    return default_template(kind, part).source
+
+
+def _tenant_templates_key(tenant_id: int) -> str:
+    return f"mail-templates:{tenant_id}"
+
+
+def tenant_templates(tenant_id: int) -> dict:
+    """Vorlagen des Mandanten je Art: {"invoice": {"subject": ..., "body": ...}}."""
+    from .models import MailTemplate
+
+    key = _tenant_templates_key(tenant_id)
+    templates = cache.get(key)
+    if templates is None:
+        templates = {
+            kind: {'subject': subject, 'body': body}
+            for kind, subject, body in MailTemplate.objects.filter(tenant_id=tenant_id)
+            .values_list('kind', 'subject', 'body')
+        }
+        cache.set(key, templates, TENANT_TEMPLATES_TIMEOUT)
+    return templates
+
+
+def forget_tenant_templates(tenant_id: int) -> None:
+    cache.delete(_tenant_templates_key(tenant_id))
+
+
+def tenant_values(tenant) -> dict:
+    return {field: getattr(tenant, field) for field in TENANT_FIELDS}
+
+
+def invoice_values(invoice) -> dict:
+    values = {field: getattr(invoice, field) for field in INVOICE_FIELDS}
+    values['customer_name'] = invoice.customer.display_name
+    values['customer_number'] = invoice.customer.customer_number
+    return values
+
+
+@lru_cache(maxsize=1024)
+def _fragments(tenant_id: int, version, values: tuple) -> dict:
+    context = Context({'tenant': dict(values)}, autoescape=False)
+    return {
+        name: mail_engine().get_template(f"{TEMPLATE_DIR}/{name}.txt").render(context).rstrip('\n')
+        for name in FRAGMENTS
+    }
+
+
+def tenant_fragments(tenant) -> dict:
+    """
+    Signatur und Bankverbindung des Mandanten (neu gerendert nach Änderung, updated_at).
+
+    Der Cache hält nur ID, Zeitstempel und die einfachen Werte, keine Model-Instanzen.
+    """
+    return _fragments(tenant.pk, tenant.updated_at, tuple(tenant_values(tenant).items()))
+
+
+def _template(kind: str, part: str, overrides: dict):
+    source = overrides.get(kind, {}).get(part)
+    if source:
+        return compile_template(source)
+    return default_template(kind, part)
+
+
+def _context(invoice: dict, tenant: dict, invoice_date: date, due_date: date,
+             fragments: dict, **extra) -> Context:
+    return Context({
+        'invoice': invoice,
+        'tenant': tenant,
+        'invoice_date': invoice_date.strftime('%d.%m.%Y'),
+        'due_date': due_date.strftime('%d.%m.%Y'),
+        'total': f"{invoice['total']:.2f}",
+        **fragments,
+        **extra,
+    }, autoescape=False)
+
+
+def _reminder_extra(level: int, fee, total: Decimal) -> dict:
+    title, urgency = REMINDER_LEVELS.get(level, ("Mahnung", "zeitnah"))
+    fee = Decimal(str(fee or 0))
+    return {
+        'level': level,
+        'title': title,
+        'urgency': urgency,
+        'fee': f"{fee:.2f}" if fee > 0 else '',
+        'total_with_fee': f"{total + fee:.2f}",
+    }
+
+
+def render_mail(kind: str, invoice, **extra) -> tuple[str, str]:
+    """
+    Betreff und Text einer Mail rendern.
+
+    Returns:
+        tuple: (Betreff einzeilig, Text)
+
+    Raises:
+        MailTemplateError: Vorlage fehlerhaft (erneuter Versuch zwecklos)
+    """
+    tenant = invoice.tenant
+    context = _context(
+        invoice_values(invoice), tenant_values(tenant), invoice.invoice_date, invoice.due_date,
+        tenant_fragments(tenant), **extra)
+
+    overrides = tenant_templates(tenant.pk)
+    try:
+        subject = _template(kind, 'subject', overrides).render(context)
+        body = _template(kind, 'body', overrides).render(context)
+    except TEMPLATE_ERRORS as e:
+        raise MailTemplateError(f"Mail-Vorlage fehlerhaft: {e}") from e
+    return ' '.join(subject.split()), body
+
+
+def render_invoice_mail(invoice) -> tuple[str, str]:
+    return render_mail('invoice', invoice)
+
+
+def render_reminder_mail(invoice, level: int, fee=0) -> tuple[str, str]:
+    return render_mail('reminder', invoice, **_reminder_extra(level, fee, invoice.total))
+
+
+def check_template(kind: str, source: str) -> None:
+    """
+    Vorlage kompilieren und mit Beispielwerten darstellen (beim Speichern).
+
+    Mahnungs-Vorlagen werden für jede Stufe mit und ohne Gebühr dargestellt,
+    damit auch Fehler in selten genutzten Zweigen auffallen.
+
+    Raises:
+        MailTemplateError
+    """
+    today = date.today()
+    fragments = {name: '' for name in FRAGMENTS}
+    if kind == 'reminder':
+        variants = [
+            _reminder_extra(level, fee, SAMPLE_INVOICE['total'])
+            for level in REMINDER_LEVELS for fee in (0, Decimal('5.00'))
+        ]
+    else:
+        variants = [{}]
+
+    try:
+        template = compile_template(source)
+        for extra in variants:
+            template.render(_context(SAMPLE_INVOICE, SAMPLE_TENANT, today, today, fragments, **extra))
+    except TEMPLATE_ERRORS as e:
+        raise MailTemplateError(f"Ungültige Vorlage: {e}") from e
@@ -0,0 +1,84 @@
+"""
+Benchmark: Parsen großer Validator-Berichte (DOM vs. Pull-Parser)
+
+    python manage.py benchmark_validator_reports [--asserts 20000] [--repeat 5]
+"""
+
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+
+from django.core.management.base import BaseCommand
+
+from apps.invoices.validator import REPORT_CHUNK_SIZE, _parse_report_stream
+
+
+def synthetic_report(asserts: int) -> bytes:
+    """KoSIT-Bericht mit SVRL: je Befund eine gefeuerte Regel und ein failed-assert."""
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rep:report xmlns:rep="http://www.xoev.de/de/validator/varl/1" '
+        'xmlns:svrl="http://purl.oclc.org/dsdl/svrl" valid="false">'
+        '<rep:scenarioMatched><rep:validationStepResult valid="false">'
+        '<svrl:schematron-output>'
+    ]
+    for i in range(asserts):
+        parts.append(
+            f'<svrl:fired-rule context="/rsm:CrossIndustryInvoice/line[{i}]"/>'
+            f'<svrl:failed-assert id="BR-CO-{i % 30}" flag="fatal" location="/line[{i}]">'
+            f'<svrl:text>[BR-CO-{i % 30}] Befund {i}: Betrag stimmt nicht.</svrl:text>'
+            '</svrl:failed-assert>'
+        )
+    parts.append(
+        '</svrl:schematron-output>'
+        '<rep:message level="warning" code="XR-1">Hinweis</rep:message>'
+        '</rep:validationStepResult></rep:scenarioMatched></rep:report>'
+    )
+    return ''.join(parts).encode('utf-8')
+
+
+def _parse_dom(content: bytes) -> int:
+    """Bisheriges Verfahren zum Vergleich: ganzer Baum, Tags per Hand zerlegt."""
+    errors = 0
+    root = ET.fromstring(content)
+    for elem in root.iter():
+        tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
+        if tag_local == 'failed-assert':
+            for child in elem:
+                child_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
+                if child_local == 'text' and child.text:
+                    errors += 1
+    return errors
+
+
+def _parse_stream(content: bytes) -> int:
+    chunks = (content[i:i + REPORT_CHUNK_SIZE] for i in range(0, len(content), REPORT_CHUNK_SIZE))
+    return len(_parse_report_stream(chunks).errors)
+
+
+class Command(BaseCommand):
+    help = "Vergleicht Laufzeit und Speicherspitze beim Parsen großer Validator-Berichte."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--asserts', type=int, default=20000, help="Anzahl failed-asserts im Bericht")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        content = synthetic_report(options['asserts'])
+        self.stdout.write(f"Bericht: {len(content) / 1024 / 1024:.1f} MB, {options['asserts']} Befunde")
+
+        for name, parse in (('DOM (fromstring)', _parse_dom), ('Stream (pull)', _parse_stream)):
+            timings = []
+            for _ in range(max(1, options['repeat'])):
+                start = time.perf_counter()
+                errors = parse(content)
+                timings.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            parse(content)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{name:<18} {min(timings) * 1000:8.1f} ms  "
+                f"Speicherspitze {peak / 1024 / 1024:6.1f} MB  Fehler {errors}")
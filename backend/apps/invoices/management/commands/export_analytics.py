@@ -0,0 +1,53 @@
+"""
+Analyse-Export (Parquet / Arrow IPC) für BI-Tools
+
+    python manage.py export_analytics --tenant musterfirma --output /data/bi
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from apps.invoices.analytics_export import (
+    ANALYTICS_BATCH_SIZE, ANALYTICS_FORMATS, write_analytics_dataset,
+)
+from apps.users.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Exportiert Rechnungen und Positionen monatsweise partitioniert als Parquet/Arrow."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', required=True, help="Slug des Mandanten")
+        parser.add_argument('--output', required=True, help="Zielverzeichnis")
+        parser.add_argument('--from', dest='date_from', help="Rechnungsdatum ab (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='date_to', help="Rechnungsdatum bis (YYYY-MM-DD)")
+        parser.add_argument('--format', default='parquet', choices=sorted(ANALYTICS_FORMATS))
+        parser.add_argument('--batch-size', type=int, default=ANALYTICS_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, help="Parallel geschriebene Monate (Standard: EXPORT_SHARD_WORKERS)")
+
+    def handle(self, *args, **options):
+        try:
+            tenant = Tenant.objects.get(slug=options['tenant'])
+        except Tenant.DoesNotExist:
+            raise CommandError(f"Mandant {options['tenant']} existiert nicht.")
+
+        dates = {}
+        for key in ('date_from', 'date_to'):
+            if options[key]:
+                dates[key] = parse_date(options[key])
+                if dates[key] is None:
+                    raise CommandError(f"Ungültiges Datum: {options[key]}")
+
+        stats = write_analytics_dataset(
+            tenant,
+            options['output'],
+            fmt=options['format'],
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            **dates,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['invoices']} Rechnungen, {stats['invoice_items']} Positionen "
+            f"in {len(stats['months'])} Monaten nach {options['output']} exportiert."
+        ))
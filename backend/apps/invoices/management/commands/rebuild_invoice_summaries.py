@@ -0,0 +1,29 @@
+"""
+Vorverdichtete Umsätze aus den Rechnungsdaten neu aufbauen (Reparatur)
+
+    python manage.py rebuild_invoice_summaries [--tenant musterfirma]
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.invoices.summaries import rebuild_summaries
+from apps.users.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Baut die Umsatz-Zusammenfassungen (InvoiceSummary) neu auf."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenant', help="Slug des Mandanten (Standard: alle)")
+
+    def handle(self, *args, **options):
+        tenant = None
+        if options['tenant']:
+            try:
+                tenant = Tenant.objects.get(slug=options['tenant'])
+            except Tenant.DoesNotExist:
+                raise CommandError(f"Mandant {options['tenant']} existiert nicht.")
+
+        count = rebuild_summaries(tenant)
+
+        self.stdout.write(self.style.SUCCESS(f"{count} Summenzeilen neu aufgebaut."))
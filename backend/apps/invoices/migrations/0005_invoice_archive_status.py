@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0004_invoicearchive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="archive_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="archive_status",
+            field=models.CharField(
+                choices=[
+                    ("none", "Nicht archiviert"),
+                    ("pending", "Archivierung ausstehend"),
+                    ("archived", "Archiviert"),
+                    ("failed", "Archivierung fehlgeschlagen"),
+                ],
+                default="none",
+                max_length=20,
+            ),
+        ),
+    ]
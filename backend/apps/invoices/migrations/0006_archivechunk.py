@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:36
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0005_invoice_archive_status"),
+        ("users", "0002_tenant_logo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoicearchive",
+            name="storage_format",
+            field=models.CharField(
+                choices=[
+                    ("zip", "ZIP (verschlüsselt)"),
+                    ("chunked", "Dedupliziert (Chunks)"),
+                ],
+                default="zip",
+                max_length=10,
+            ),
+        ),
+        migrations.CreateModel(
+            name="ArchiveChunk",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("digest", models.CharField(max_length=64)),
+                ("encrypted_data", models.BinaryField()),
+                ("size", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archive_chunks",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archiv-Chunk",
+                "verbose_name_plural": "Archiv-Chunks",
+                "db_table": "invoice_archive_chunks",
+                "unique_together": {("tenant", "digest")},
+            },
+        ),
+    ]
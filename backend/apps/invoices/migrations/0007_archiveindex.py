@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:39
+
+import django.db.models.deletion
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def backfill_archive_index(apps, schema_editor):
+    """Index für bereits archivierte Rechnungen aus den Rechnungsdaten nachziehen."""
+    InvoiceArchive = apps.get_model("invoices", "InvoiceArchive")
+    ArchiveIndex = apps.get_model("invoices", "ArchiveIndex")
+
+    archives = InvoiceArchive.objects.only("id", "invoice").select_related("invoice")
+    for archive in archives.iterator():
+        invoice = archive.invoice
+        items = list(invoice.items.all())
+
+        breakdown = {}
+        for item in items:
+            entry = breakdown.setdefault(f"{item.vat_rate:.2f}", {"net": Decimal("0"), "tax": Decimal("0")})
+            entry["net"] += item.line_total
+            entry["tax"] += item.tax_amount
+
+        ArchiveIndex.objects.create(
+            archive_id=archive.id,
+            invoice_id=invoice.id,
+            tenant_id=invoice.tenant_id,
+            customer_id=invoice.customer_id,
+            invoice_number=invoice.invoice_number,
+            invoice_date=invoice.invoice_date,
+            due_date=invoice.due_date,
+            subtotal=invoice.subtotal,
+            tax_amount=invoice.tax_amount,
+            total=invoice.total,
+            vat_breakdown={
+                rate: {"net": f"{e['net']:.2f}", "tax": f"{e['tax']:.2f}"}
+                for rate, e in breakdown.items()
+            },
+            item_count=len(items),
+            archived_at=invoice.archived_at or archive.created_at,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_initial"),
+        ("invoices", "0006_archivechunk"),
+        ("users", "0002_tenant_logo"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchiveIndex",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("invoice_number", models.CharField(max_length=50)),
+                ("invoice_date", models.DateField()),
+                ("due_date", models.DateField()),
+                ("subtotal", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("tax_amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("total", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("vat_breakdown", models.JSONField(default=dict)),
+                ("item_count", models.PositiveIntegerField(default=0)),
+                ("archived_at", models.DateTimeField()),
+                (
+                    "archive",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="index",
+                        to="invoices.invoicearchive",
+                    ),
+                ),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archive_index",
+                        to="customers.customer",
+                    ),
+                ),
+                (
+                    "invoice",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archive_index",
+                        to="invoices.invoice",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="archive_index",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archiv-Index",
+                "verbose_name_plural": "Archiv-Index",
+                "db_table": "invoice_archive_index",
+                "ordering": ["-invoice_date", "-invoice_number"],
+                "indexes": [
+                    models.Index(
+                        fields=["tenant", "invoice_date"],
+                        name="archive_idx_tenant_date",
+                    ),
+                    models.Index(
+                        fields=["tenant", "invoice_number"],
+                        name="archive_idx_tenant_number",
+                    ),
+                    models.Index(
+                        fields=["tenant", "customer", "invoice_date"],
+                        name="archive_idx_tenant_customer",
+                    ),
+                    models.Index(
+                        fields=["tenant", "archived_at"],
+                        name="archive_idx_tenant_archived",
+                    ),
+                    models.Index(
+                        fields=["tenant", "total"], name="archive_idx_tenant_total"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_archive_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:42
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0007_archiveindex"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="archivechunk",
+            options={
+                "base_manager_name": "objects",
+                "verbose_name": "Archiv-Chunk",
+                "verbose_name_plural": "Archiv-Chunks",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="invoicearchive",
+            options={
+                "base_manager_name": "objects",
+                "verbose_name": "Rechnungsarchiv",
+                "verbose_name_plural": "Rechnungsarchive",
+            },
+        ),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_initial"),
+        ("invoices", "0008_archive_base_manager"),
+        ("users", "0003_tenant_datev_settings"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DatevExportRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("consumer", models.CharField(default="default", max_length=50)),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[
+                            ("full", "Vollständig"),
+                            ("incremental", "Inkrementell"),
+                        ],
+                        default="incremental",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "export_format",
+                    models.CharField(
+                        choices=[
+                            ("simple", "DATEV CSV (vereinfacht)"),
+                            ("extf", "DATEV EXTF Buchungsstapel"),
+                        ],
+                        default="simple",
+                        max_length=10,
+                    ),
+                ),
+                ("date_from", models.DateField(blank=True, null=True)),
+                ("date_to", models.DateField(blank=True, null=True)),
+                ("watermark_updated_at", models.DateTimeField(blank=True, null=True)),
+                ("watermark_id", models.BigIntegerField(blank=True, null=True)),
+                ("invoice_count", models.PositiveIntegerField(default=0)),
+                ("file", models.FileField(blank=True, upload_to="exports/datev/")),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "DATEV-Export",
+                "verbose_name_plural": "DATEV-Exporte",
+                "db_table": "datev_export_runs",
+                "ordering": ["-created_at", "-id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["tenant", "updated_at", "id"], name="invoice_tenant_updated_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="datevexportrun",
+            name="created_by",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="datev_export_runs",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddField(
+            model_name="datevexportrun",
+            name="tenant",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="datev_export_runs",
+                to="users.tenant",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="datevexportrun",
+            index=models.Index(
+                fields=["tenant", "consumer", "-created_at"],
+                name="datev_run_consumer_idx",
+            ),
+        ),
+    ]
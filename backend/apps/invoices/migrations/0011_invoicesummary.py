@@ -0,0 +1,109 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def backfill_invoice_summaries(apps, schema_editor):
+    """Summen für bestehende Rechnungen aus den Positionen aufbauen."""
+    Invoice = apps.get_model("invoices", "Invoice")
+    InvoiceSummary = apps.get_model("invoices", "InvoiceSummary")
+
+    totals = {}
+    for invoice in Invoice.objects.prefetch_related("items").iterator(chunk_size=1000):
+        month = invoice.invoice_date.replace(day=1)
+        rates = {}
+        for item in invoice.items.all():
+            entry = rates.setdefault(item.vat_rate.quantize(Decimal("0.01")), [0, Decimal("0"), Decimal("0")])
+            entry[0] += 1
+            entry[1] += item.line_total
+            entry[2] += item.tax_amount
+
+        dominant = max(rates, key=lambda rate: (rates[rate][1], rate)) if rates else Decimal("19.00")
+        rates.setdefault(dominant, [0, Decimal("0"), Decimal("0")])
+
+        for rate, (items, net, tax) in rates.items():
+            summary = totals.setdefault(
+                (invoice.tenant_id, month, invoice.status, rate),
+                {"invoice_count": 0, "item_count": 0, "net": Decimal("0"), "tax": Decimal("0")},
+            )
+            summary["invoice_count"] += 1 if rate == dominant else 0
+            summary["item_count"] += items
+            summary["net"] += net
+            summary["tax"] += tax
+
+    InvoiceSummary.objects.bulk_create([
+        InvoiceSummary(tenant_id=tenant_id, month=month, status=status, vat_rate=rate, **summary)
+        for (tenant_id, month, status, rate), summary in totals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0010_exportjob"),
+        ("users", "0003_tenant_datev_settings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InvoiceSummary",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("draft", "Entwurf"),
+                            ("final", "Finalisiert"),
+                            ("sent", "Versendet"),
+                            ("paid", "Bezahlt"),
+                            ("cancelled", "Storniert"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("vat_rate", models.DecimalField(decimal_places=2, max_digits=5)),
+                ("invoice_count", models.IntegerField(default=0)),
+                ("item_count", models.IntegerField(default=0)),
+                (
+                    "net",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "tax",
+                    models.DecimalField(
+                        decimal_places=2, default=Decimal("0.00"), max_digits=14
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="invoice_summaries",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Umsatz-Zusammenfassung",
+                "verbose_name_plural": "Umsatz-Zusammenfassungen",
+                "db_table": "invoice_summaries",
+                "ordering": ["month", "status", "-vat_rate"],
+                "unique_together": {("tenant", "month", "status", "vat_rate")},
+            },
+        ),
+        migrations.RunPython(backfill_invoice_summaries, migrations.RunPython.noop),
+    ]
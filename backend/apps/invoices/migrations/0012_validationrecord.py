@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0011_invoicesummary"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ValidationRecord",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("xml_hash", models.CharField(max_length=64)),
+                ("validator_version", models.CharField(max_length=100)),
+                ("is_valid", models.BooleanField()),
+                ("errors", models.JSONField(default=list)),
+                ("warnings", models.JSONField(default=list)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "verbose_name": "Validierungsergebnis",
+                "verbose_name_plural": "Validierungsergebnisse",
+                "db_table": "validation_records",
+                "unique_together": {("xml_hash", "validator_version")},
+            },
+        ),
+        migrations.AddField(
+            model_name="invoice",
+            name="validation",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="+",
+                to="invoices.validationrecord",
+            ),
+        ),
+    ]
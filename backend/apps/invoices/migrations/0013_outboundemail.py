@@ -0,0 +1,150 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:24
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0012_validationrecord"),
+        ("users", "0003_tenant_datev_settings"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="invoice",
+            name="email_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("queued", "Versand ausstehend"),
+                    ("sent", "Zugestellt"),
+                    ("failed", "Versand fehlgeschlagen"),
+                ],
+                max_length=20,
+            ),
+        ),
+        # Bisherige Mahnungen wurden synchron versendet: bestehende Zeilen = "sent"
+        migrations.AddField(
+            model_name="reminder",
+            name="delivery_status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Versand ausstehend"),
+                    ("sent", "Zugestellt"),
+                    ("failed", "Versand fehlgeschlagen"),
+                ],
+                default="sent",
+                max_length=20,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="reminder",
+            name="delivery_status",
+            field=models.CharField(
+                choices=[
+                    ("queued", "Versand ausstehend"),
+                    ("sent", "Zugestellt"),
+                    ("failed", "Versand fehlgeschlagen"),
+                ],
+                default="queued",
+                max_length=20,
+            ),
+        ),
+        migrations.CreateModel(
+            name="OutboundEmail",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("invoice", "Rechnung"), ("reminder", "Mahnung")],
+                        max_length=20,
+                    ),
+                ),
+                ("recipient", models.EmailField(max_length=254)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Wartend"),
+                            ("sending", "Wird versendet"),
+                            ("sent", "Versendet"),
+                            ("failed", "Fehlgeschlagen"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "created_by",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="outbound_emails",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "invoice",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbound_emails",
+                        to="invoices.invoice",
+                    ),
+                ),
+                (
+                    "reminder",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbound_emails",
+                        to="invoices.reminder",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="outbound_emails",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Ausgehende E-Mail",
+                "verbose_name_plural": "Ausgehende E-Mails",
+                "db_table": "outbound_emails",
+                "ordering": ["-created_at", "-id"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at"], name="outbox_due_idx"
+                    ),
+                    models.Index(
+                        fields=["tenant", "-created_at"], name="outbox_tenant_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
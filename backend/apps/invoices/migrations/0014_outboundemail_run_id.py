@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0013_outboundemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outboundemail",
+            name="run_id",
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
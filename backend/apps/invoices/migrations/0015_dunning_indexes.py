@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0014_outboundemail_run_id"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="invoice",
+            index=models.Index(
+                fields=["tenant", "status", "due_date"], name="invoice_dunning_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="reminder",
+            index=models.Index(
+                fields=["invoice", "level"], name="reminder_invoice_level_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:38
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0015_dunning_indexes"),
+        ("users", "0004_tenant_dunning_settings"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MailTemplate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("invoice", "Rechnung"), ("reminder", "Mahnung")],
+                        max_length=20,
+                    ),
+                ),
+                ("subject", models.CharField(blank=True, max_length=255)),
+                ("body", models.TextField(blank=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="mail_templates",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "E-Mail-Vorlage",
+                "verbose_name_plural": "E-Mail-Vorlagen",
+                "db_table": "mail_templates",
+                "unique_together": {("tenant", "kind")},
+            },
+        ),
+    ]
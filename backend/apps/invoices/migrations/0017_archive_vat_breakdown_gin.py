@@ -0,0 +1,30 @@
+from django.db import migrations
+
+INDEX_NAME = "archive_idx_vat_breakdown"
+
+
+def create_gin_index(apps, schema_editor):
+    # GIN (jsonb_ops) deckt den ?-Operator von vat_breakdown__has_key ab; nur PostgreSQL
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        f"CREATE INDEX IF NOT EXISTS {INDEX_NAME} "
+        "ON invoice_archive_index USING gin (vat_breakdown)"
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("invoices", "0016_mailtemplate"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("customers", "0002_initial"),
+        ("invoices", "0017_archive_vat_breakdown_gin"),
+        ("users", "0004_tenant_dunning_settings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="datevexportrun",
+            name="reversal_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name="DatevExportedInvoice",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("consumer", models.CharField(max_length=50)),
+                ("invoice_date", models.DateField()),
+                ("amount", models.DecimalField(decimal_places=2, max_digits=12)),
+                ("bookings", models.JSONField(default=list)),
+                ("reversed", models.BooleanField(default=False)),
+                ("exported_at", models.DateTimeField(auto_now=True)),
+                (
+                    "customer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.PROTECT,
+                        related_name="+",
+                        to="customers.customer",
+                    ),
+                ),
+                (
+                    "invoice",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="datev_exports",
+                        to="invoices.invoice",
+                    ),
+                ),
+                (
+                    "run",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="exported_invoices",
+                        to="invoices.datevexportrun",
+                    ),
+                ),
+                (
+                    "tenant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="datev_exported_invoices",
+                        to="users.tenant",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "DATEV-Buchungsstand",
+                "verbose_name_plural": "DATEV-Buchungsstände",
+                "db_table": "datev_exported_invoices",
+                "indexes": [
+                    models.Index(
+                        fields=["tenant", "consumer"],
+                        name="datev_exported_consumer_idx",
+                    )
+                ],
+                "unique_together": {("consumer", "invoice")},
+            },
+        ),
+    ]
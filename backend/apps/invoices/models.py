@@ -5,6 +5,7 @@ Invoice Models - Rechnungsverwaltung
 from decimal import Decimal
 
 from django.db import models
+from django.utils import timezone
 
 from apps.customers.models import Customer
 from apps.products.models import Product
@@ -29,6 +30,19 @@ class Invoice(models.Model):
         ("zugferd", "ZUGFeRD (PDF)"),
     ]
 
+    ARCHIVE_STATUS_CHOICES = [
+        ("none", "Nicht archiviert"),
+        ("pending", "Archivierung ausstehend"),
+        ("archived", "Archiviert"),
+        ("failed", "Archivierung fehlgeschlagen"),
+    ]
+
+    EMAIL_STATUS_CHOICES = [
+        ("queued", "Versand ausstehend"),
+        ("sent", "Zugestellt"),
+        ("failed", "Versand fehlgeschlagen"),
+    ]
+
     tenant = models.ForeignKey(
         Tenant,
         on_delete=models.CASCADE,
@@ -71,6 +85,20 @@ class Invoice(models.Model):
     # Archive (GoBD)
     archived_at = models.DateTimeField(null=True, blank=True)
     archive_hash = models.CharField(max_length=64, blank=True)  # SHA-256
+    archive_status = models.CharField(max_length=20, choices=ARCHIVE_STATUS_CHOICES, default="none")
+    archive_error = models.TextField(blank=True)
+
+    # E-Mail-Versand über die Outbox (leer = nie versendet)
+    email_status = models.CharField(max_length=20, choices=EMAIL_STATUS_CHOICES, blank=True)
+
+    # Letzte XRechnung-Validierung (Ergebnis aus dem Validierungs-Cache)
+    validation = models.ForeignKey(
+        "ValidationRecord",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
 
     # Audit trail
     created_by = models.ForeignKey(
@@ -88,6 +116,12 @@ class Invoice(models.Model):
         verbose_name_plural = "Invoices"
         unique_together = ("tenant", "invoice_number")
         ordering = ["-invoice_date", "-invoice_number"]
+        indexes = [
+            # Keyset-Scan für inkrementelle Exporte (updated_at, id) > Watermark
+            models.Index(fields=["tenant", "updated_at", "id"], name="invoice_tenant_updated_idx"),
+            # Mahnlauf: überfällige Rechnungen je Mandant und Status
+            models.Index(fields=["tenant", "status", "due_date"], name="invoice_dunning_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.invoice_number} - {self.customer}"
@@ -164,23 +198,61 @@ class Reminder(models.Model):
         related_name="reminders",
     )
 
+    DELIVERY_STATUS_CHOICES = Invoice.EMAIL_STATUS_CHOICES
+
     level = models.PositiveIntegerField(choices=LEVEL_CHOICES, default=1)
-    sent_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(auto_now_add=True)  # nach Zustellung: Zeitpunkt des Versands
     sent_to = models.EmailField()
     fee = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal("0.00"))
     notes = models.TextField(blank=True)
+    delivery_status = models.CharField(max_length=20, choices=DELIVERY_STATUS_CHOICES, default="queued")
 
     class Meta:
         db_table = "invoice_reminders"
         verbose_name = "Reminder"
         verbose_name_plural = "Reminders"
         ordering = ["-sent_at"]
+        indexes = [
+            # Aktuelle Mahnstufe je Rechnung (Max-Aggregat im Mahnlauf)
+            models.Index(fields=["invoice", "level"], name="reminder_invoice_level_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Mahnung {self.level} - {self.invoice.invoice_number}"
     
 
-class InvoiceArchive(models.Model):
+class EncryptedPayloadQuerySet(models.QuerySet):
+    """
+    QuerySet für Archivtabellen: encrypted_data wird standardmäßig nicht geladen.
+
+    Nur wer den Inhalt wirklich braucht, holt ihn explizit mit with_payload().
+    """
+
+    def with_payload(self):
+        return self.defer(None)
+
+
+class EncryptedPayloadManager(models.Manager.from_queryset(EncryptedPayloadQuerySet)):
+    def get_queryset(self):
+        return super().get_queryset().defer('encrypted_data')
+
+
+class EncryptedPayloadMixin:
+    """
+    Nachladen von encrypted_data über with_payload().
+
+    Der Base-Manager verzögert encrypted_data ebenfalls (damit auch
+    invoice.archive keine Blobs lädt); ohne diesen Hook würde only() das
+    verzögerte Feld beim Nachladen wieder herausfiltern.
+    """
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        if from_queryset is None and fields and 'encrypted_data' in fields:
+            from_queryset = type(self).objects.with_payload()
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+
+
+class InvoiceArchive(EncryptedPayloadMixin, models.Model):
     """
     GoBD-Archiv für Rechnungen.
     
@@ -189,11 +261,17 @@ class InvoiceArchive(models.Model):
     
     Felder:
     - invoice: Verknüpfung zur Original-Rechnung
-    - encrypted_data: Das verschlüsselte ZIP (enthält PDF, XML, Metadata)
-    - data_hash: SHA-256 Hash zur Integritätsprüfung
+    - storage_format: "zip" (verschlüsseltes ZIP) oder "chunked" (Manifest + ArchiveChunks)
+    - encrypted_data: Das verschlüsselte ZIP bzw. das verschlüsselte Manifest
+    - data_hash: SHA-256 Hash zur Integritätsprüfung (ZIP bzw. Manifest)
     - file_size: Größe der unverschlüsselten Daten in Bytes
     - created_at: Wann wurde archiviert
     """
+
+    STORAGE_FORMAT_CHOICES = [
+        ('zip', 'ZIP (verschlüsselt)'),
+        ('chunked', 'Dedupliziert (Chunks)'),
+    ]
     
     invoice = models.OneToOneField(
         Invoice,
@@ -201,6 +279,8 @@ class InvoiceArchive(models.Model):
         related_name='archive',
     )
     
+    storage_format = models.CharField(max_length=10, choices=STORAGE_FORMAT_CHOICES, default='zip')
+
     # Verschlüsselte Daten (kann sehr groß sein, daher BinaryField)
     encrypted_data = models.BinaryField()
     
@@ -213,10 +293,479 @@ class InvoiceArchive(models.Model):
     # Zeitstempel
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = EncryptedPayloadManager()
+
     class Meta:
         db_table = 'invoice_archives'
         verbose_name = 'Rechnungsarchiv'
         verbose_name_plural = 'Rechnungsarchive'
+        base_manager_name = 'objects'
     
     def __str__(self):
-        return f"Archiv: {self.invoice.invoice_number}"
\ No newline at end of file
+        return f"Archiv: {self.invoice.invoice_number}"
+
+
+class ArchiveChunk(EncryptedPayloadMixin, models.Model):
+    """
+    Inhaltsadressierter Baustein des deduplizierten GoBD-Archivs.
+
+    Wiederkehrende Teile (Logo-Streams im PDF, identische XML-Header) werden
+    pro Mandant nur einmal gespeichert und von den Archiv-Manifesten referenziert.
+    Chunks dürfen wie Archive NIEMALS gelöscht oder verändert werden.
+    """
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.PROTECT,
+        related_name='archive_chunks',
+    )
+
+    # SHA-256 des unverschlüsselten Chunks
+    digest = models.CharField(max_length=64)
+
+    # zlib-komprimiert und verschlüsselt
+    encrypted_data = models.BinaryField()
+
+    # Unkomprimierte Größe in Bytes
+    size = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = EncryptedPayloadManager()
+
+    class Meta:
+        db_table = 'invoice_archive_chunks'
+        base_manager_name = 'objects'
+        verbose_name = 'Archiv-Chunk'
+        verbose_name_plural = 'Archiv-Chunks'
+        unique_together = ('tenant', 'digest')
+
+    def __str__(self):
+        return f"Chunk {self.digest[:12]} ({self.size} B)"
+
+
+class ArchiveIndex(models.Model):
+    """
+    Durchsuchbarer Index über das GoBD-Archiv.
+
+    Wird bei der Archivierung befüllt und enthält nur unkritische Suchfelder
+    (Nummer, Daten, Summen, USt-Aufschlüsselung, Kunde, Positionsanzahl),
+    damit Prüfer filtern können, ohne encrypted_data anzufassen.
+    """
+
+    archive = models.OneToOneField(
+        InvoiceArchive,
+        on_delete=models.PROTECT,
+        related_name='index',
+    )
+    invoice = models.OneToOneField(
+        Invoice,
+        on_delete=models.PROTECT,
+        related_name='archive_index',
+    )
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.PROTECT,
+        related_name='archive_index',
+    )
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.PROTECT,
+        related_name='archive_index',
+    )
+
+    invoice_number = models.CharField(max_length=50)
+    invoice_date = models.DateField()
+    due_date = models.DateField()
+
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2)
+    tax_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+
+    # {"19.00": {"net": "200.00", "tax": "38.00"}, ...}
+    # Suche nach Steuersatz (has_key) über GIN-Index, nur PostgreSQL (Migration 0017)
+    vat_breakdown = models.JSONField(default=dict)
+    item_count = models.PositiveIntegerField(default=0)
+
+    archived_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'invoice_archive_index'
+        verbose_name = 'Archiv-Index'
+        verbose_name_plural = 'Archiv-Index'
+        ordering = ['-invoice_date', '-invoice_number']
+        indexes = [
+            models.Index(fields=['tenant', 'invoice_date'], name='archive_idx_tenant_date'),
+            models.Index(fields=['tenant', 'invoice_number'], name='archive_idx_tenant_number'),
+            models.Index(fields=['tenant', 'customer', 'invoice_date'], name='archive_idx_tenant_customer'),
+            models.Index(fields=['tenant', 'archived_at'], name='archive_idx_tenant_archived'),
+            models.Index(fields=['tenant', 'total'], name='archive_idx_tenant_total'),
+        ]
+
+    def __str__(self):
+        return f"Index: {self.invoice_number}"
+
+
+class DatevExportRun(models.Model):
+    """
+    Protokoll eines DATEV-Exports je Mandant und Abnehmer (z.B. Steuerbüro).
+
+    Merkt sich den High-Watermark (updated_at, id) der zuletzt exportierten
+    Rechnung. Inkrementelle Exporte prüfen nur Rechnungen, die seitdem
+    geändert wurden, und buchen davon nur neue oder buchungsrelevant
+    geänderte (siehe DatevExportedInvoice). Die erzeugte Datei bleibt
+    gespeichert und kann erneut heruntergeladen werden.
+    """
+
+    MODE_CHOICES = [
+        ("full", "Vollständig"),
+        ("incremental", "Inkrementell"),
+    ]
+
+    FORMAT_CHOICES = [
+        ("simple", "DATEV CSV (vereinfacht)"),
+        ("extf", "DATEV EXTF Buchungsstapel"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="datev_export_runs",
+    )
+    consumer = models.CharField(max_length=50, default="default")
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default="incremental")
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES, default="simple")
+
+    # Optionaler Rechnungsdatums-Filter
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+
+    # High-Watermark: letzte exportierte Rechnung (updated_at, id)
+    watermark_updated_at = models.DateTimeField(null=True, blank=True)
+    watermark_id = models.BigIntegerField(null=True, blank=True)
+
+    invoice_count = models.PositiveIntegerField(default=0)
+    reversal_count = models.PositiveIntegerField(default=0)  # Generalumkehr-Buchungen
+    file = models.FileField(upload_to="exports/datev/", blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="datev_export_runs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "datev_export_runs"
+        verbose_name = "DATEV-Export"
+        verbose_name_plural = "DATEV-Exporte"
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["tenant", "consumer", "-created_at"], name="datev_run_consumer_idx"),
+        ]
+
+    def __str__(self):
+        return f"DATEV {self.get_mode_display()} {self.consumer} ({self.created_at:%d.%m.%Y})"
+
+
+class DatevExportedInvoice(models.Model):
+    """
+    Zuletzt an einen Abnehmer exportierte Buchung einer Rechnung.
+
+    Inkrementelle Läufe buchen eine Rechnung erneut nur, wenn sich Betrag,
+    Rechnungsdatum oder Kunde geändert haben (vorher Generalumkehr der alten
+    Buchung). Wird eine exportierte Rechnung storniert, exportiert der nächste
+    Lauf die Generalumkehr und setzt reversed.
+    """
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="datev_exported_invoices",
+    )
+    consumer = models.CharField(max_length=50)
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name="datev_exports",
+    )
+    run = models.ForeignKey(
+        DatevExportRun,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="exported_invoices",
+    )
+
+    # Gebuchter Stand: Debitor, Belegdatum, Bruttobetrag und je MwSt-Satz
+    # [vat_rate, net, tax] als Strings (für die Generalumkehr)
+    customer = models.ForeignKey(
+        Customer,
+        on_delete=models.PROTECT,
+        related_name="+",
+    )
+    invoice_date = models.DateField()
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    bookings = models.JSONField(default=list)
+
+    reversed = models.BooleanField(default=False)
+    exported_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "datev_exported_invoices"
+        verbose_name = "DATEV-Buchungsstand"
+        verbose_name_plural = "DATEV-Buchungsstände"
+        unique_together = ("consumer", "invoice")
+        indexes = [
+            models.Index(fields=["tenant", "consumer"], name="datev_exported_consumer_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.invoice_id} -> {self.consumer}{' (storniert)' if self.reversed else ''}"
+
+
+class ExportJob(models.Model):
+    """
+    Hintergrund-Export (DATEV, Massenexporte).
+
+    Der Request legt nur den Job an; ein Celery-Worker schreibt die Datei
+    in den Media-Storage und meldet Fortschritt und Durchsatz hier zurück.
+    """
+
+    STATUS_CHOICES = [
+        ("queued", "Wartend"),
+        ("running", "Läuft"),
+        ("done", "Fertig"),
+        ("failed", "Fehlgeschlagen"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="export_jobs",
+    )
+    kind = models.CharField(max_length=30)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+
+    # Fortschritt
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    rows_per_second = models.FloatField(default=0)
+
+    file = models.FileField(upload_to="exports/jobs/", blank=True)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="export_jobs",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "export_jobs"
+        verbose_name = "Export-Job"
+        verbose_name_plural = "Export-Jobs"
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            models.Index(fields=["tenant", "-created_at"], name="export_job_tenant_idx"),
+        ]
+
+    def __str__(self):
+        return f"Export {self.kind} ({self.get_status_display()})"
+
+    @property
+    def progress_percent(self) -> float:
+        if self.status == "done":
+            return 100.0
+        if not self.total_rows:
+            return 0.0
+        return round(min(self.processed_rows / self.total_rows, 1) * 100, 1)
+
+
+class InvoiceSummary(models.Model):
+    """
+    Vorverdichtete Umsätze je Mandant, Monat, Status und USt-Satz.
+
+    Wird in denselben Transaktionen gepflegt, die Status oder Summen einer
+    Rechnung ändern (siehe summaries.py). Dashboard und Monatsauswertungen
+    lesen O(Monate) Zeilen statt aller Rechnungen.
+    Reparatur: manage.py rebuild_invoice_summaries
+    """
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="invoice_summaries",
+    )
+    month = models.DateField()  # erster Tag des Monats (Rechnungsdatum)
+    status = models.CharField(max_length=20, choices=Invoice.STATUS_CHOICES)
+    vat_rate = models.DecimalField(max_digits=5, decimal_places=2)
+
+    # Rechnungen zählen nur beim USt-Satz mit dem höchsten Nettoanteil
+    invoice_count = models.IntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    net = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+    tax = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal("0.00"))
+
+    class Meta:
+        db_table = "invoice_summaries"
+        verbose_name = "Umsatz-Zusammenfassung"
+        verbose_name_plural = "Umsatz-Zusammenfassungen"
+        ordering = ["month", "status", "-vat_rate"]
+        unique_together = ("tenant", "month", "status", "vat_rate")
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} {self.status} {self.vat_rate}%"
+
+    @property
+    def gross(self) -> Decimal:
+        return self.net + self.tax
+
+
+class ValidationRecord(models.Model):
+    """
+    Validierungsergebnis des KoSIT Validators je XML-Inhalt.
+
+    Für identisches XML und dieselbe Validator-Version ändert sich der
+    Bericht nicht; Schlüssel ist daher SHA-256(XML) + Validator-Version.
+    """
+
+    xml_hash = models.CharField(max_length=64)
+    validator_version = models.CharField(max_length=100)
+    is_valid = models.BooleanField()
+    errors = models.JSONField(default=list)
+    warnings = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = "validation_records"
+        verbose_name = "Validierungsergebnis"
+        verbose_name_plural = "Validierungsergebnisse"
+        unique_together = ("xml_hash", "validator_version")
+
+    def __str__(self):
+        return f"{self.xml_hash[:12]} ({'gültig' if self.is_valid else 'ungültig'})"
+
+
+class OutboundEmail(models.Model):
+    """
+    Ausgehende E-Mail (Outbox).
+
+    Der Request legt nur den Eintrag an und antwortet mit 202; ein
+    Celery-Worker baut und versendet die Mail und wiederholt Fehlschläge mit
+    Backoff (siehe outbox.py). Der Zustellstatus landet an Rechnung bzw. Mahnung.
+    """
+
+    KIND_CHOICES = [
+        ("invoice", "Rechnung"),
+        ("reminder", "Mahnung"),
+    ]
+
+    STATUS_CHOICES = [
+        ("queued", "Wartend"),
+        ("sending", "Wird versendet"),
+        ("sent", "Versendet"),
+        ("failed", "Fehlgeschlagen"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="outbound_emails",
+    )
+    invoice = models.ForeignKey(
+        Invoice,
+        on_delete=models.CASCADE,
+        related_name="outbound_emails",
+    )
+    reminder = models.ForeignKey(
+        Reminder,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="outbound_emails",
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    recipient = models.EmailField()
+    # Massenversand / Mahnlauf, zu dem die Mail gehört (Fortschritt je Lauf)
+    run_id = models.UUIDField(null=True, blank=True, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="queued")
+
+    # Zustellversuche; bei "sending" = Beginn des laufenden Versuchs
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        related_name="outbound_emails",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "outbound_emails"
+        verbose_name = "Ausgehende E-Mail"
+        verbose_name_plural = "Ausgehende E-Mails"
+        ordering = ["-created_at", "-id"]
+        indexes = [
+            # Worker: fällige Einträge je Status
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_due_idx"),
+            models.Index(fields=["tenant", "-created_at"], name="outbox_tenant_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.invoice_id} an {self.recipient} ({self.get_status_display()})"
+
+
+class MailTemplate(models.Model):
+    """
+    Mandantenspezifische Vorlage für Rechnungs- bzw. Mahnungs-Mails.
+
+    Django-Template-Syntax ohne HTML-Escaping; leere Felder = Standardvorlage
+    (templates/invoices/email/). Verfügbare Variablen siehe mail_templates.py.
+    """
+
+    KIND_CHOICES = [
+        ("invoice", "Rechnung"),
+        ("reminder", "Mahnung"),
+    ]
+
+    tenant = models.ForeignKey(
+        Tenant,
+        on_delete=models.CASCADE,
+        related_name="mail_templates",
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    subject = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = "mail_templates"
+        verbose_name = "E-Mail-Vorlage"
+        verbose_name_plural = "E-Mail-Vorlagen"
+        unique_together = ("tenant", "kind")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} ({self.tenant})"
+
+    def save(self, *args, **kwargs) -> None:
+        from .mail_templates import forget_tenant_templates
+
+        super().save(*args, **kwargs)
+        forget_tenant_templates(self.tenant_id)
+
+    def delete(self, *args, **kwargs):
+        from .mail_templates import forget_tenant_templates
+
+        result = super().delete(*args, **kwargs)
+        forget_tenant_templates(self.tenant_id)
+        return result
@@ -0,0 +1,282 @@
+"""
+E-Mail-Outbox
+- Versand-Endpunkte legen nur einen Eintrag an und antworten mit 202
+- Ein Celery-Worker baut die Mail (PDF/XML, Validierung) und versendet sie
+- SMTP-Fehler werden mit exponentiellem Backoff wiederholt
+- Versand über eine gepoolte SMTP-Verbindung mit Ratenbegrenzung (smtp_pool.py),
+  fällige Mails gehen gebündelt an Batch-Tasks
+- Zustellstatus an Rechnung (email_status) bzw. Mahnung (delivery_status)
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .mail_templates import MailTemplateError
+from .smtp_pool import acquire_send_slot, batch_size, send_message
+from .summaries import track_summaries
+from .validation import InvoiceNotValid
+
+logger = logging.getLogger(__name__)
+
+
+def max_attempts() -> int:
+    return getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+
+
+def retry_delay(attempts: int) -> int:
+    """Wartezeit in Sekunden nach dem n-ten Fehlversuch (60, 120, 240, ...)."""
+    return getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY', 60) * 2 ** max(attempts - 1, 0)
+
+
+def _schedule(email) -> None:
+    from .tasks import send_outbound_email_task
+
+    transaction.on_commit(lambda: send_outbound_email_task.delay(email.pk))
+
+
+def enqueue_invoice_email(invoice, recipient: str, user=None):
+    """Rechnungs-Mail in die Outbox stellen; der Worker versendet nach dem Commit."""
+    from .models import Invoice, OutboundEmail
+
+    email = OutboundEmail.objects.create(
+        tenant_id=invoice.tenant_id,
+        invoice=invoice,
+        kind='invoice',
+        recipient=recipient,
+        created_by=user,
+    )
+    Invoice.objects.filter(pk=invoice.pk).update(email_status='queued')
+    invoice.email_status = 'queued'
+    _schedule(email)
+    return email
+
+
+def enqueue_reminder_email(invoice, level: int, recipient: str, fee=0, user=None):
+    """Mahnung anlegen (delivery_status "queued") und ihre Mail in die Outbox stellen."""
+    from .models import OutboundEmail, Reminder
+
+    reminder = Reminder.objects.create(
+        invoice=invoice,
+        level=level,
+        sent_to=recipient,
+        fee=fee,
+        delivery_status='queued',
+    )
+    email = OutboundEmail.objects.create(
+        tenant_id=invoice.tenant_id,
+        invoice=invoice,
+        reminder=reminder,
+        kind='reminder',
+        recipient=recipient,
+        created_by=user,
+    )
+    _schedule(email)
+    return email
+
+
+def claim(email_id: int):
+    """
+    Eintrag für einen Zustellversuch übernehmen.
+
+    Das UPDATE auf status="queued" ist atomar: wird derselbe Eintrag doppelt
+    eingereiht (Task und Beat), versendet nur ein Worker.
+    """
+    from .models import OutboundEmail
+
+    now = timezone.now()
+    claimed = OutboundEmail.objects.filter(
+        pk=email_id, status='queued', next_attempt_at__lte=now,
+    ).update(status='sending', attempts=F('attempts') + 1, next_attempt_at=now)
+    if not claimed:
+        return None
+
+    return (
+        OutboundEmail.objects
+        .select_related('tenant', 'invoice__tenant', 'invoice__customer', 'reminder')
+        .get(pk=email_id)
+    )
+
+
+def release(email, delay: float) -> None:
+    """Übernommenen Eintrag ohne Versuch zurückgeben (Ratenbegrenzung)."""
+    from .models import OutboundEmail
+
+    email.status = 'queued'
+    email.attempts -= 1
+    email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+    OutboundEmail.objects.filter(pk=email.pk).update(
+        status='queued', attempts=F('attempts') - 1, next_attempt_at=email.next_attempt_at)
+
+
+def build_message(email):
+    from .email import build_invoice_email, build_reminder_email
+
+    if email.kind == 'reminder':
+        reminder = email.reminder
+        return build_reminder_email(email.invoice, reminder.level, email.recipient, reminder.fee)
+    return build_invoice_email(email.invoice, email.recipient)
+
+
+def _mark_sent(email) -> None:
+    from .models import Invoice, Reminder
+
+    now = timezone.now()
+    email.status = 'sent'
+    email.sent_at = now
+    email.last_error = ''
+    email.save(update_fields=['status', 'sent_at', 'last_error'])
+
+    if email.kind == 'reminder':
+        Reminder.objects.filter(pk=email.reminder_id).update(delivery_status='sent', sent_at=now)
+        return
+
+    # Bedingtes UPDATE statt save(): die Rechnung kann seit claim() bezahlt
+    # oder storniert worden sein, die geladene Kopie ist dann veraltet
+    with track_summaries(email.invoice):
+        promoted = Invoice.objects.filter(pk=email.invoice_id, status='final').update(
+            status='sent', email_status='sent', updated_at=now)
+        if not promoted:
+            Invoice.objects.filter(pk=email.invoice_id).update(email_status='sent')
+
+
+def _mark_failed(email, error: str) -> None:
+    from .models import Invoice, Reminder
+
+    email.status = 'failed'
+    email.last_error = error
+    email.save(update_fields=['status', 'last_error'])
+
+    if email.kind == 'reminder':
+        Reminder.objects.filter(pk=email.reminder_id).update(delivery_status='failed')
+    else:
+        Invoice.objects.filter(pk=email.invoice_id).update(email_status='failed')
+
+
+def deliver(email) -> str:
+    """
+    Zustellversuch für einen übernommenen Eintrag (siehe claim).
+
+    Versendet über die SMTP-Verbindung des Workers (smtp_pool).
+
+    Fachliche Fehler (abgelehnte XRechnung, fehlende Angaben, fehlerhafte
+    Mail-Vorlage) führen sofort zu "failed", technische Fehler werden bis
+    EMAIL_OUTBOX_MAX_ATTEMPTS mit Backoff wiederholt.
+
+    Returns:
+        str: neuer Status ("sent", "queued" = neuer Versuch geplant, "failed")
+    """
+    try:
+        send_message(build_message(email))
+    except InvoiceNotValid as e:
+        _mark_failed(email, f"{e}: {'; '.join(e.result.errors[:5])}")
+        return email.status
+    except (MailTemplateError, ValueError) as e:
+        _mark_failed(email, str(e))
+        return email.status
+    except Exception as exc:
+        if email.attempts >= max_attempts():
+            logger.exception("Versand von %s endgültig fehlgeschlagen", email)
+            _mark_failed(email, f"Versand fehlgeschlagen: {exc}")
+            return email.status
+
+        logger.warning("Versand von %s fehlgeschlagen, neuer Versuch: %s", email, exc)
+        email.status = 'queued'
+        email.last_error = str(exc)
+        email.next_attempt_at = timezone.now() + timedelta(seconds=retry_delay(email.attempts))
+        email.save(update_fields=['status', 'last_error', 'next_attempt_at'])
+        return email.status
+
+    _mark_sent(email)
+    return email.status
+
+
+def send_claimed(email) -> str:
+    """Ratenbegrenzung prüfen und zustellen; gesperrt = zurück in die Warteschlange."""
+    delay, _ = acquire_send_slot(email.tenant_id)
+    if delay:
+        release(email, delay)
+        return email.status
+    return deliver(email)
+
+
+def send_batch(email_ids) -> dict:
+    """
+    Viele Mails über eine Verbindung versenden (Batch-Task).
+
+    Erreicht ein Mandant sein Limit, bleiben seine übrigen Mails bis zum
+    nächsten Zeitfenster in der Warteschlange (flush_outbox_task). Beim
+    Provider-Limit endet der Batch: im laufenden Fenster kann keine Mail
+    mehr versendet werden, die übrigen bleiben ungeprüft in der Warteschlange.
+
+    Returns:
+        dict: Anzahl je Ergebnis (sent, queued, failed, skipped)
+    """
+    from .models import OutboundEmail
+
+    counts = dict.fromkeys(('sent', 'queued', 'failed', 'skipped'), 0)
+    tenants = dict(OutboundEmail.objects.filter(pk__in=email_ids).values_list('pk', 'tenant_id'))
+    limited = set()
+
+    for position, email_id in enumerate(email_ids):
+        if email_id not in tenants or tenants[email_id] in limited:
+            counts['skipped'] += 1
+            continue
+
+        email = claim(email_id)
+        if email is None:
+            counts['skipped'] += 1
+            continue
+
+        delay, limit = acquire_send_slot(email.tenant_id)
+        if delay:
+            release(email, delay)
+            counts['queued'] += 1
+            if limit == 'provider':
+                counts['skipped'] += len(email_ids) - position - 1
+                logger.info("Provider-Limit erreicht, Batch endet nach %s Mails", position + 1)
+                break
+            limited.add(email.tenant_id)
+            continue
+
+        counts[deliver(email)] += 1
+
+    return counts
+
+
+def dispatch(email_ids) -> int:
+    """Mails in Paketen zu EMAIL_BATCH_SIZE an Batch-Tasks übergeben."""
+    from .tasks import send_outbox_batch_task
+
+    email_ids = list(email_ids)
+    size = batch_size()
+    for start in range(0, len(email_ids), size):
+        send_outbox_batch_task.delay(email_ids[start:start + size])
+    return len(email_ids)
+
+
+def requeue_stale() -> int:
+    """Einträge, deren Worker während des Versands abgebrochen ist, neu einreihen."""
+    from .models import OutboundEmail
+
+    timeout = getattr(settings, 'EMAIL_OUTBOX_SENDING_TIMEOUT', 600)
+    return OutboundEmail.objects.filter(
+        status='sending',
+        next_attempt_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status='queued', next_attempt_at=timezone.now())
+
+
+def due_email_ids(limit: int = 5000) -> list:
+    """Fällige Einträge (Index outbox_due_idx), älteste zuerst."""
+    from .models import OutboundEmail
+
+    return list(
+        OutboundEmail.objects
+        .filter(status='queued', next_attempt_at__lte=timezone.now())
+        .order_by('next_attempt_at')
+        .values_list('pk', flat=True)[:limit]
+    )
@@ -0,0 +1,312 @@
+"""
+Schnelle Vorprüfung von XRechnungen (CII) im Prozess
+- Pflichtfelder (BT/BG), Summen- und USt-Aufschlüsselung, Codelisten
+- Regeln werden beim Import einmalig übersetzt (Pfade mit aufgelösten Namespaces)
+- Nur Dokumente ohne Befund gehen an den KoSIT Validator
+
+Geprüft wird nur eine Teilmenge der EN 16931/XRechnung-Regeln, die sich
+ohne Schematron sicher auswerten lässt. Meldungen folgen dem KoSIT-Format
+"[Regel-ID] Text", damit Berichte und Regelstatistik einheitlich bleiben.
+Im Zweifel (z.B. unlesbare Beträge) entscheidet der Validator.
+"""
+
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Callable
+
+from .validator import ValidationResult
+from .xrechnung import NAMESPACES
+
+_PREFIX = {f'{prefix}:': f'{{{uri}}}' for prefix, uri in NAMESPACES.items()}
+
+_SETTLEMENT = 'rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeSettlement'
+_AGREEMENT = 'rsm:SupplyChainTradeTransaction/ram:ApplicableHeaderTradeAgreement'
+_SELLER = f'{_AGREEMENT}/ram:SellerTradeParty'
+_BUYER = f'{_AGREEMENT}/ram:BuyerTradeParty'
+_TOTALS = f'{_SETTLEMENT}/ram:SpecifiedTradeSettlementHeaderMonetarySummation'
+_LINES = 'rsm:SupplyChainTradeTransaction/ram:IncludedSupplyChainTradeLineItem'
+
+# EN 16931 erlaubt bei der Steuerberechnung je Kategorie eine Abweichung von 1
+VAT_TOLERANCE = Decimal('1')
+
+
+def _path(path: str) -> str:
+    """'rsm:A/ram:B' -> '{urn...}A/{urn...}B' (einmalig beim Import)."""
+    for prefix, clark in _PREFIX.items():
+        path = path.replace(prefix, clark)
+    return path
+
+
+# --- Codelisten ---
+
+# UNTDID 1001, in XRechnung 3.0 zulässige Rechnungsarten (BR-DE-17)
+INVOICE_TYPE_CODES = frozenset({'326', '380', '381', '384', '389', '875', '876', '877'})
+
+# UNTDID 5305 (USt-Kategorien, BT-118/BT-151)
+VAT_CATEGORY_CODES = frozenset({'S', 'Z', 'E', 'AE', 'K', 'G', 'O', 'L', 'M'})
+
+# ISO 4217
+CURRENCY_CODES = frozenset("""
+AED AFN ALL AMD ANG AOA ARS AUD AWG AZN BAM BBD BDT BGN BHD BIF BMD BND BOB BOV
+BRL BSD BTN BWP BYN BZD CAD CDF CHE CHF CHW CLF CLP CNY COP COU CRC CUC CUP CVE
+CZK DJF DKK DOP DZD EGP ERN ETB EUR FJD FKP GBP GEL GHS GIP GMD GNF GTQ GYD HKD
+HNL HTG HUF IDR ILS INR IQD IRR ISK JMD JOD JPY KES KGS KHR KMF KPW KRW KWD KYD
+KZT LAK LBP LKR LRD LSL LYD MAD MDL MGA MKD MMK MNT MOP MRU MUR MVR MWK MXN MXV
+MYR MZN NAD NGN NIO NOK NPR NZD OMR PAB PEN PGK PHP PKR PLN PYG QAR RON RSD RUB
+RWF SAR SBD SCR SDG SEK SGD SHP SLE SLL SOS SRD SSP STN SVC SYP SZL THB TJS TMT
+TND TOP TRY TTD TWD TZS UAH UGX USD USN UYI UYU UYW UZS VED VES VND VUV WST XAF
+XAG XAU XBA XBB XBC XBD XCD XDR XOF XPD XPF XPT XSU XUA YER ZAR ZMW ZWL
+""".split())
+
+# ISO 3166-1 alpha-2 (plus 1A Kosovo, wie in der EN-16931-Codeliste)
+COUNTRY_CODES = frozenset("""
+AD AE AF AG AI AL AM AO AQ AR AS AT AU AW AX AZ BA BB BD BE BF BG BH BI BJ BL BM
+BN BO BQ BR BS BT BV BW BY BZ CA CC CD CF CG CH CI CK CL CM CN CO CR CU CV CW CX
+CY CZ DE DJ DK DM DO DZ EC EE EG EH ER ES ET FI FJ FK FM FO FR GA GB GD GE GF GG
+GH GI GL GM GN GP GQ GR GS GT GU GW GY HK HM HN HR HT HU ID IE IL IM IN IO IQ IR
+IS IT JE JM JO JP KE KG KH KI KM KN KP KR KW KY KZ LA LB LC LI LK LR LS LT LU LV
+LY MA MC MD ME MF MG MH MK ML MM MN MO MP MQ MR MS MT MU MV MW MX MY MZ NA NC NE
+NF NG NI NL NO NP NR NU NZ OM PA PE PF PG PH PK PL PM PN PR PS PT PW PY QA RE RO
+RS RU RW SA SB SC SD SE SG SH SI SJ SK SL SM SN SO SR SS ST SV SX SY SZ TC TD TF
+TG TH TJ TK TL TM TN TO TR TT TV TW TZ UA UG UM US UY UZ VA VC VE VG VI VN VU WF
+WS XI YE YT ZA ZM ZW 1A
+""".split())
+
+
+@dataclass(frozen=True)
+class Rule:
+    id: str
+    message: str
+    check: Callable[[ET.Element], bool]
+
+    def error(self) -> str:
+        return f"[{self.id}] {self.message}"
+
+
+def _required(path: str) -> Callable[[ET.Element], bool]:
+    compiled = _path(path)
+
+    def check(root):
+        elem = root.find(compiled)
+        return elem is not None and bool((elem.text or '').strip())
+    return check
+
+
+def _required_group(path: str) -> Callable[[ET.Element], bool]:
+    compiled = _path(path)
+    return lambda root: root.find(compiled) is not None
+
+
+def _code_list(path: str, codes: frozenset) -> Callable[[ET.Element], bool]:
+    compiled = _path(path)
+
+    def check(root):
+        # Fehlende oder leere Elemente meldet die Pflichtfeld-Regel
+        values = ((elem.text or '').strip() for elem in root.iterfind(compiled))
+        return all(value in codes for value in values if value)
+    return check
+
+
+def _code_attribute(path: str, attribute: str, codes: frozenset) -> Callable[[ET.Element], bool]:
+    compiled = _path(path)
+    return lambda root: all(
+        elem.get(attribute) in codes for elem in root.iterfind(compiled) if elem.get(attribute))
+
+
+RULES = [
+    # Pflichtfelder
+    Rule('BR-01', 'Die Spezifikationskennung (BT-24) muss übermittelt werden.',
+         _required('rsm:ExchangedDocumentContext/ram:GuidelineSpecifiedDocumentContextParameter/ram:ID')),
+    Rule('BR-02', 'Die Rechnungsnummer (BT-1) muss übermittelt werden.',
+         _required('rsm:ExchangedDocument/ram:ID')),
+    Rule('BR-03', 'Das Rechnungsdatum (BT-2) muss übermittelt werden.',
+         _required('rsm:ExchangedDocument/ram:IssueDateTime/udt:DateTimeString')),
+    Rule('BR-04', 'Der Rechnungstyp (BT-3) muss übermittelt werden.',
+         _required('rsm:ExchangedDocument/ram:TypeCode')),
+    Rule('BR-05', 'Die Rechnungswährung (BT-5) muss übermittelt werden.',
+         _required(f'{_SETTLEMENT}/ram:InvoiceCurrencyCode')),
+    Rule('BR-06', 'Der Name des Verkäufers (BT-27) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:Name')),
+    Rule('BR-07', 'Der Name des Käufers (BT-44) muss übermittelt werden.',
+         _required(f'{_BUYER}/ram:Name')),
+    Rule('BR-08', 'Die Postanschrift des Verkäufers (BG-5) muss übermittelt werden.',
+         _required_group(f'{_SELLER}/ram:PostalTradeAddress')),
+    Rule('BR-09', 'Der Ländercode des Verkäufers (BT-40) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:PostalTradeAddress/ram:CountryID')),
+    Rule('BR-10', 'Die Postanschrift des Käufers (BG-8) muss übermittelt werden.',
+         _required_group(f'{_BUYER}/ram:PostalTradeAddress')),
+    Rule('BR-11', 'Der Ländercode des Käufers (BT-55) muss übermittelt werden.',
+         _required(f'{_BUYER}/ram:PostalTradeAddress/ram:CountryID')),
+    Rule('BR-16', 'Die Rechnung muss mindestens eine Position (BG-25) enthalten.',
+         _required_group(_LINES)),
+    Rule('BR-DE-1', 'Zahlungsanweisungen (BG-16) müssen übermittelt werden.',
+         _required_group(f'{_SETTLEMENT}/ram:SpecifiedTradeSettlementPaymentMeans')),
+    Rule('BR-DE-2', 'Der Verkäuferkontakt (BG-6) muss übermittelt werden.',
+         _required_group(f'{_SELLER}/ram:DefinedTradeContact')),
+    Rule('BR-DE-3', 'Der Ort des Verkäufers (BT-37) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:PostalTradeAddress/ram:CityName')),
+    Rule('BR-DE-4', 'Die Postleitzahl des Verkäufers (BT-38) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:PostalTradeAddress/ram:PostcodeCode')),
+    Rule('BR-DE-5', 'Der Kontaktname des Verkäufers (BT-41) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:DefinedTradeContact/ram:PersonName')),
+    Rule('BR-DE-6', 'Die Telefonnummer des Verkäufers (BT-42) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:DefinedTradeContact/ram:TelephoneUniversalCommunication/ram:CompleteNumber')),
+    Rule('BR-DE-7', 'Die E-Mail-Adresse des Verkäufers (BT-43) muss übermittelt werden.',
+         _required(f'{_SELLER}/ram:DefinedTradeContact/ram:EmailURIUniversalCommunication/ram:URIID')),
+    Rule('BR-DE-8', 'Der Ort des Käufers (BT-52) muss übermittelt werden.',
+         _required(f'{_BUYER}/ram:PostalTradeAddress/ram:CityName')),
+    Rule('BR-DE-9', 'Die Postleitzahl des Käufers (BT-53) muss übermittelt werden.',
+         _required(f'{_BUYER}/ram:PostalTradeAddress/ram:PostcodeCode')),
+    Rule('BR-DE-15', 'Die Käuferreferenz bzw. Leitweg-ID (BT-10) muss übermittelt werden.',
+         _required(f'{_AGREEMENT}/ram:BuyerReference')),
+
+    # Codelisten
+    Rule('BR-CL-01', 'Der Rechnungstyp (BT-3) ist nicht zulässig.',
+         _code_list('rsm:ExchangedDocument/ram:TypeCode', INVOICE_TYPE_CODES)),
+    Rule('BR-CL-04', 'Die Rechnungswährung (BT-5) ist kein ISO-4217-Code.',
+         _code_list(f'{_SETTLEMENT}/ram:InvoiceCurrencyCode', CURRENCY_CODES)),
+    Rule('BR-CL-05', 'Die Währung der Steuersumme (BT-110) ist kein ISO-4217-Code.',
+         _code_attribute(f'{_TOTALS}/ram:TaxTotalAmount', 'currencyID', CURRENCY_CODES)),
+    Rule('BR-CL-14', 'Ein Ländercode ist kein ISO-3166-1-Code.',
+         _code_list(f'{_AGREEMENT}/*/ram:PostalTradeAddress/ram:CountryID', COUNTRY_CODES)),
+    Rule('BR-CL-17', 'Eine USt-Kategorie (BT-118) ist nicht in UNTDID 5305 enthalten.',
+         _code_list(f'{_SETTLEMENT}/ram:ApplicableTradeTax/ram:CategoryCode', VAT_CATEGORY_CODES)),
+    Rule('BR-CL-18', 'Eine USt-Kategorie einer Position (BT-151) ist nicht in UNTDID 5305 enthalten.',
+         _code_list(f'{_LINES}/ram:SpecifiedLineTradeSettlement/ram:ApplicableTradeTax/ram:CategoryCode',
+                    VAT_CATEGORY_CODES)),
+]
+
+
+# --- Rechenregeln ---
+
+_LINE_NET = _path('ram:SpecifiedLineTradeSettlement/ram:SpecifiedTradeSettlementLineMonetarySummation/ram:LineTotalAmount')
+_LINE_CATEGORY = _path('ram:SpecifiedLineTradeSettlement/ram:ApplicableTradeTax/ram:CategoryCode')
+_LINE_RATE = _path('ram:SpecifiedLineTradeSettlement/ram:ApplicableTradeTax/ram:RateApplicablePercent')
+_LINES_PATH = _path(_LINES)
+_BREAKDOWN = _path(f'{_SETTLEMENT}/ram:ApplicableTradeTax')
+_BASIS = _path('ram:BasisAmount')
+_CALCULATED = _path('ram:CalculatedAmount')
+_CATEGORY = _path('ram:CategoryCode')
+_RATE = _path('ram:RateApplicablePercent')
+_TOTALS_PATH = _path(_TOTALS)
+_TOTAL = {
+    name: _path(f'ram:{name}')
+    for name in ('LineTotalAmount', 'TaxBasisTotalAmount', 'TaxTotalAmount',
+                 'GrandTotalAmount', 'TotalPrepaidAmount', 'DuePayableAmount')
+}
+
+
+class _Unreadable(Exception):
+    """Betrag fehlt oder ist keine Zahl - Entscheidung dem Validator überlassen."""
+
+
+def _decimal(elem, path: str = None, default: Decimal = None) -> Decimal:
+    if path is not None:
+        elem = elem.find(path) if elem is not None else None
+    if elem is None or not (elem.text or '').strip():
+        if default is not None:
+            return default
+        raise _Unreadable()
+    try:
+        return Decimal(elem.text.strip())
+    except InvalidOperation:
+        raise _Unreadable() from None
+
+
+def _check_arithmetic(root: ET.Element) -> list[str]:
+    totals = root.find(_TOTALS_PATH)
+    if totals is None:
+        return ["[BR-12] Die Summe der Positionsnettobeträge (BT-106) muss übermittelt werden."]
+
+    errors = []
+    try:
+        lines = defaultdict(Decimal)
+        for line in root.iterfind(_LINES_PATH):
+            category = (line.findtext(_LINE_CATEGORY) or '').strip()
+            rate = _decimal(line, _LINE_RATE, Decimal('0'))
+            lines[(category, rate)] += _decimal(line, _LINE_NET)
+
+        line_total = _decimal(totals, _TOTAL['LineTotalAmount'])
+        tax_basis = _decimal(totals, _TOTAL['TaxBasisTotalAmount'])
+        tax_total = _decimal(totals, _TOTAL['TaxTotalAmount'], Decimal('0'))
+        grand_total = _decimal(totals, _TOTAL['GrandTotalAmount'])
+        prepaid = _decimal(totals, _TOTAL['TotalPrepaidAmount'], Decimal('0'))
+        due = _decimal(totals, _TOTAL['DuePayableAmount'])
+
+        breakdown = {}
+        calculated = Decimal('0')
+        for tax in root.iterfind(_BREAKDOWN):
+            category = (tax.findtext(_CATEGORY) or '').strip()
+            rate = _decimal(tax, _RATE, Decimal('0'))
+            basis = _decimal(tax, _BASIS)
+            amount = _decimal(tax, _CALCULATED)
+            breakdown[(category, rate)] = basis
+            calculated += amount
+
+            if category == 'S':
+                expected = (basis * rate / 100).quantize(Decimal('0.01'))
+                if abs(amount - expected) > VAT_TOLERANCE:
+                    errors.append(
+                        f"[BR-S-09] Steuerbetrag {amount} passt nicht zu {basis} x {rate} %.")
+            elif category in ('Z', 'E', 'AE', 'K', 'G', 'O') and amount != 0:
+                errors.append(f"[BR-{category}-09] Der Steuerbetrag der Kategorie {category} muss 0 sein.")
+    except _Unreadable:
+        return errors
+
+    if sum(lines.values(), Decimal('0')) != line_total:
+        errors.append(
+            f"[BR-CO-10] Summe der Positionen ({sum(lines.values())}) weicht vom "
+            f"Gesamtnettobetrag (BT-106: {line_total}) ab.")
+    if tax_basis != line_total:
+        # Ohne Zu-/Abschläge auf Belegebene
+        errors.append(
+            f"[BR-CO-13] Steuerbasis (BT-109: {tax_basis}) weicht vom Gesamtnettobetrag ({line_total}) ab.")
+    if calculated != tax_total:
+        errors.append(
+            f"[BR-CO-14] Steuersumme (BT-110: {tax_total}) weicht von der Aufschlüsselung ({calculated}) ab.")
+    if grand_total != tax_basis + tax_total:
+        errors.append(
+            f"[BR-CO-15] Bruttobetrag (BT-112: {grand_total}) ist nicht Steuerbasis + Steuersumme.")
+    if due != grand_total - prepaid:
+        errors.append(
+            f"[BR-CO-16] Zahlbetrag (BT-115: {due}) ist nicht Bruttobetrag - Vorauszahlung.")
+
+    # USt-Aufschlüsselung je Kategorie und Satz (BR-S-08, BR-Z-08, ...)
+    for key in sorted(set(lines) | set(breakdown)):
+        category, rate = key
+        if key not in breakdown:
+            errors.append(
+                f"[BR-CO-18] Für Kategorie {category} / {rate} % fehlt die USt-Aufschlüsselung (BG-23).")
+        elif breakdown[key] != lines.get(key, Decimal('0')):
+            errors.append(
+                f"[BR-{category}-08] Steuerbasis {breakdown[key]} für {category} / {rate} % "
+                f"entspricht nicht der Summe der Positionen ({lines.get(key, Decimal('0'))}).")
+
+    return errors
+
+
+def prevalidate(xml_content: str | bytes) -> ValidationResult:
+    """
+    Prüft die XRechnung ohne Netzwerkaufruf.
+
+    Returns:
+        is_valid=False mit Befunden, sonst is_valid=True (nicht abschließend,
+        der KoSIT Validator muss noch prüfen). Nie cachebar: gespeicherte
+        Ergebnisse gelten je KoSIT-Version, die Vorprüfung ist billig und
+        ihre Regeln ändern sich unabhängig davon.
+    """
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+
+    try:
+        root = ET.fromstring(xml_content)
+    except ET.ParseError as e:
+        return ValidationResult(
+            is_valid=False, errors=[f"XML ist nicht wohlgeformt: {e}"], warnings=[])
+
+    errors = [rule.error() for rule in RULES if not rule.check(root)]
+    errors.extend(_check_arithmetic(root))
+
+    return ValidationResult(is_valid=not errors, errors=errors, warnings=[])
@@ -1,6 +1,12 @@
+from datetime import date
+
 from rest_framework import serializers
 from decimal import Decimal, ROUND_HALF_UP
-from .models import Invoice, InvoiceItem, Reminder
+from .analytics_export import ANALYTICS_FORMATS
+from .bulk_send import MAX_REMINDER_LEVEL
+from .models import (
+    ArchiveIndex, DatevExportRun, ExportJob, Invoice, InvoiceItem, MailTemplate, OutboundEmail, Reminder, ValidationRecord,
+)
 
 
 class InvoiceItemSerializer(serializers.ModelSerializer):
@@ -25,12 +31,24 @@ class InvoiceItemSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'line_total', 'tax_amount']
 
 
+class ValidationRecordSerializer(serializers.ModelSerializer):
+    validated_at = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = ValidationRecord
+        fields = ['is_valid', 'errors', 'warnings', 'validator_version', 'validated_at']
+        read_only_fields = fields
+
+
 class InvoiceSerializer(serializers.ModelSerializer):
     items = InvoiceItemSerializer(many=True, read_only=True)
+    validation = ValidationRecordSerializer(read_only=True)
     customer_name = serializers.CharField(source='customer.display_name', read_only=True)
     created_by_name = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     format_display = serializers.CharField(source='get_format_display', read_only=True)
+    archive_status_display = serializers.CharField(source='get_archive_status_display', read_only=True)
+    email_status_display = serializers.CharField(source='get_email_status_display', read_only=True)
     has_pdf = serializers.SerializerMethodField()
     has_xml = serializers.SerializerMethodField()
     is_archived = serializers.SerializerMethodField()
@@ -62,13 +80,20 @@ class InvoiceSerializer(serializers.ModelSerializer):
             'updated_at',
             'archived_at',
             'archive_hash',
+            'archive_status',
+            'archive_status_display',
+            'archive_error',
+            'email_status',
+            'email_status_display',
+            'validation',
             'has_pdf',
             'has_xml',
             'is_archived',
         ]
         read_only_fields = [
             'id', 'invoice_number', 'subtotal', 'tax_amount', 'total',
-            'created_by', 'created_at', 'updated_at'
+            'created_by', 'created_at', 'updated_at',
+            'archive_status', 'archive_error', 'email_status',
         ]
 
     def get_created_by_name(self, obj) -> str:
@@ -162,6 +187,7 @@ class InvoiceItemCreateSerializer(serializers.ModelSerializer):
 class ReminderSerializer(serializers.ModelSerializer):
     invoice_number = serializers.CharField(source='invoice.invoice_number', read_only=True)
     level_display = serializers.CharField(source='get_level_display', read_only=True)
+    delivery_status_display = serializers.CharField(source='get_delivery_status_display', read_only=True)
 
     class Meta:
         model = Reminder
@@ -175,5 +201,252 @@ class ReminderSerializer(serializers.ModelSerializer):
             'sent_to',
             'fee',
             'notes',
+            'delivery_status',
+            'delivery_status_display',
+        ]
+        read_only_fields = ['id', 'sent_at', 'delivery_status']
+
+
+class ArchiveIndexSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchiveIndex
+        fields = [
+            'id',
+            'invoice',
+            'invoice_number',
+            'invoice_date',
+            'due_date',
+            'customer',
+            'subtotal',
+            'tax_amount',
+            'total',
+            'vat_breakdown',
+            'item_count',
+            'archived_at',
+        ]
+        read_only_fields = fields
+
+
+class DatevExportRunSerializer(serializers.ModelSerializer):
+    # Abnehmer ist Teil des Dateinamens: nur Buchstaben, Ziffern, - und _
+    consumer = serializers.SlugField(max_length=50, required=False, default='default')
+    mode_display = serializers.CharField(source='get_mode_display', read_only=True)
+    export_format_display = serializers.CharField(source='get_export_format_display', read_only=True)
+
+    class Meta:
+        model = DatevExportRun
+        fields = [
+            'id',
+            'consumer',
+            'mode',
+            'mode_display',
+            'export_format',
+            'export_format_display',
+            'date_from',
+            'date_to',
+            'watermark_updated_at',
+            'watermark_id',
+            'invoice_count',
+            'reversal_count',
+            'created_by',
+            'created_at',
+        ]
+        read_only_fields = [
+            'id', 'watermark_updated_at', 'watermark_id', 'invoice_count', 'reversal_count',
+            'created_by', 'created_at',
+        ]
+
+
+class ExportJobSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    progress_percent = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = ExportJob
+        fields = [
+            'id',
+            'kind',
+            'params',
+            'status',
+            'status_display',
+            'total_rows',
+            'processed_rows',
+            'progress_percent',
+            'rows_per_second',
+            'error',
+            'created_by',
+            'created_at',
+            'started_at',
+            'finished_at',
+        ]
+        read_only_fields = [
+            'id', 'status', 'total_rows', 'processed_rows', 'rows_per_second',
+            'error', 'created_by', 'created_at', 'started_at', 'finished_at',
+        ]
+
+    def validate_kind(self, value):
+        from .export_jobs import EXPORTERS
+
+        if value not in EXPORTERS:
+            raise serializers.ValidationError(
+                f"Unbekannte Exportart. Erlaubt: {', '.join(sorted(EXPORTERS))}"
+            )
+        return value
+
+    def validate(self, attrs):
+        """Parameter je Exportart prüfen und bereinigt speichern (EXPORT_JOB_PARAMS)."""
+        from .datev import extf_period_error, extf_settings_error
+
+        params_class = EXPORT_JOB_PARAMS.get(attrs.get('kind'))
+        if params_class is None:
+            return attrs
+
+        params = params_class(data=attrs.get('params') or {})
+        if not params.is_valid():
+            raise serializers.ValidationError({'params': params.errors})
+        attrs['params'] = job_params(params.validated_data)
+
+        request = self.context.get('request')
+        if request and (attrs['kind'] == 'datev_extf' or attrs['params'].get('export_format') == 'extf'):
+            tenant = request.user.tenant
+            error = extf_settings_error(tenant)
+
+            period = params.validated_data
+            date_from = period.get('from') or period.get('date_from')
+            date_to = period.get('to') or period.get('date_to')
+            if not error and date_from and date_to:
+                error = extf_period_error(tenant, date_from, date_to)
+
+            if error:
+                raise serializers.ValidationError({'params': [error]})
+        return attrs
+
+
+def job_params(validated_data: dict) -> dict:
+    """Geprüfte Parameter als JSON für ExportJob.params (Datum ISO, ohne leere Werte)."""
+    return {
+        key: value.isoformat() if isinstance(value, date) else value
+        for key, value in validated_data.items() if value is not None
+    }
+
+
+class DateRangeSerializer(serializers.Serializer):
+    """Rechnungszeitraum from/to (Export-Jobs datev, datev_extf)."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+    def validate(self, attrs):
+        if attrs.get('from') and attrs.get('to') and attrs['from'] > attrs['to']:
+            raise serializers.ValidationError({'to': "Das Enddatum liegt vor dem Startdatum."})
+        return attrs
+
+
+class AnalyticsExportSerializer(DateRangeSerializer):
+    """Parameter des Analyse-Exports: Zeitraum und Dateiformat."""
+    format = serializers.ChoiceField(choices=list(ANALYTICS_FORMATS), default='parquet')
+
+
+class ValidationBatchSerializer(serializers.Serializer):
+    """Auswahl für die Massenvalidierung: ids oder Filter from/to/status."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    status = serializers.ChoiceField(choices=Invoice.STATUS_CHOICES, required=False)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+
+# Parameter-Serializer je Exportart (ExportJobSerializer.validate)
+EXPORT_JOB_PARAMS = {
+    'datev': DateRangeSerializer,
+    'datev_extf': DateRangeSerializer,
+    'datev_run': DatevExportRunSerializer,
+    'analytics': AnalyticsExportSerializer,
+    'validation': ValidationBatchSerializer,
+}
+
+
+class OutboundEmailSerializer(serializers.ModelSerializer):
+    invoice_number = serializers.CharField(source='invoice.invoice_number', read_only=True)
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+
+    class Meta:
+        model = OutboundEmail
+        fields = [
+            'id',
+            'kind',
+            'kind_display',
+            'invoice',
+            'invoice_number',
+            'reminder',
+            'recipient',
+            'run_id',
+            'status',
+            'status_display',
+            'attempts',
+            'next_attempt_at',
+            'last_error',
+            'created_by',
+            'created_at',
+            'sent_at',
         ]
-        read_only_fields = ['id', 'sent_at']
\ No newline at end of file
+        read_only_fields = fields
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """Auswahl für Massenversand und Mahnlauf: ids oder Filter customer/from/to."""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False)
+    customer = serializers.IntegerField(min_value=1, required=False)
+    dry_run = serializers.BooleanField(default=False)
+
+    def get_fields(self):
+        # "from" ist ein Schlüsselwort und kann nicht als Attribut deklariert werden
+        fields = super().get_fields()
+        fields['from'] = serializers.DateField(required=False)
+        fields['to'] = serializers.DateField(required=False)
+        return fields
+
+
+class DunningRunSerializer(BulkSelectionSerializer):
+    level = serializers.IntegerField(min_value=1, max_value=MAX_REMINDER_LEVEL, required=False)
+    fee = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, default=Decimal('0'))
+
+
+class MailTemplateSerializer(serializers.ModelSerializer):
+    kind_display = serializers.CharField(source='get_kind_display', read_only=True)
+
+    class Meta:
+        model = MailTemplate
+        fields = ['id', 'kind', 'kind_display', 'subject', 'body', 'updated_at']
+        read_only_fields = ['id', 'updated_at']
+
+    def validate(self, attrs):
+        from .mail_templates import MailTemplateError, check_template
+
+        kind = attrs.get('kind') or self.instance.kind
+        errors = {}
+        for part in ('subject', 'body'):
+            if attrs.get(part):
+                try:
+                    check_template(kind, attrs[part])
+                except MailTemplateError as e:
+                    errors[part] = str(e)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return attrs
+
+    def validate_kind(self, value):
+        tenant = self.context['request'].user.tenant
+        existing = MailTemplate.objects.filter(tenant=tenant, kind=value)
+        if self.instance is not None:
+            existing = existing.exclude(pk=self.instance.pk)
+        if existing.exists():
+            raise serializers.ValidationError("Für diese Art gibt es bereits eine Vorlage.")
+        return value
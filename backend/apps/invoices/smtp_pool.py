@@ -0,0 +1,154 @@
+"""
+SMTP-Verbindungen und Ratenbegrenzung für den Versand aus der Outbox
+- Eine authentifizierte Verbindung je Worker (Thread), über Mails und Tasks hinweg
+- Neuaufbau nach EMAIL_BATCH_SIZE Mails, nach Leerlauf und bei Verbindungsabbruch
+- Ratenbegrenzung je Mandant und je Provider (SMTP-Server), Zähler im geteilten Cache
+
+Ohne Pool kostet jede Mail Verbindungsaufbau, STARTTLS und Login; bei
+Monatsabschlüssen mit tausenden Rechnungen ist das der größte Teil der Zeit.
+"""
+
+import logging
+import smtplib
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Fehler, nach denen die Verbindung unbrauchbar ist (Server hat getrennt, Timeout)
+CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+_local = threading.local()
+
+
+def batch_size() -> int:
+    """Mails je Verbindung (viele Provider trennen nach ~100 Mails) und je Batch-Task."""
+    return max(1, getattr(settings, 'EMAIL_BATCH_SIZE', 100))
+
+
+class PooledConnection:
+    """Offene Verbindung mit Zähler und Zeitpunkt der letzten Nutzung."""
+
+    def __init__(self):
+        self.connection = get_connection(fail_silently=False)
+        self.connection.open()
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+    @property
+    def exhausted(self) -> bool:
+        max_idle = getattr(settings, 'EMAIL_CONNECTION_MAX_IDLE', 60)
+        return self.sent >= batch_size() or time.monotonic() - self.last_used > max_idle
+
+    def send(self, message) -> int:
+        message.connection = self.connection
+        sent = message.send(fail_silently=False)
+        self.sent += 1
+        self.last_used = time.monotonic()
+        return sent
+
+    def close(self) -> None:
+        try:
+            self.connection.close()
+        except Exception:
+            logger.debug("SMTP-Verbindung ließ sich nicht sauber schließen", exc_info=True)
+
+
+def _pooled() -> PooledConnection:
+    pooled = getattr(_local, 'connection', None)
+    if pooled is not None and pooled.exhausted:
+        close_connection()
+        pooled = None
+    if pooled is None:
+        pooled = _local.connection = PooledConnection()
+    return pooled
+
+
+def close_connection() -> None:
+    """Verbindung des aktuellen Workers schließen (nächste Mail baut neu auf)."""
+    pooled = getattr(_local, 'connection', None)
+    _local.connection = None
+    if pooled is not None:
+        pooled.close()
+
+
+def send_message(message) -> int:
+    """
+    Mail über die Verbindung des Workers versenden.
+
+    Hat der Server die Verbindung getrennt, wird einmal neu verbunden und
+    erneut gesendet; andere Fehler gehen an den Aufrufer (Retry der Outbox).
+    """
+    try:
+        return _pooled().send(message)
+    except CONNECTION_ERRORS as exc:
+        logger.info("SMTP-Verbindung getrennt (%s), baue neu auf", exc)
+        close_connection()
+    except Exception:
+        close_connection()
+        raise
+
+    try:
+        return _pooled().send(message)
+    except Exception:
+        close_connection()
+        raise
+
+
+# --- Ratenbegrenzung ---
+
+def provider_key() -> str:
+    """Provider = SMTP-Server, über den versendet wird."""
+    return f"{getattr(settings, 'EMAIL_HOST', '')}:{getattr(settings, 'EMAIL_PORT', '')}"
+
+
+def _window() -> int:
+    return max(1, getattr(settings, 'EMAIL_RATE_LIMIT_WINDOW', 60))
+
+
+def _take(key: str, limit: int, window: int, slot: int) -> bool:
+    if not limit:
+        return True
+    key = f"mail-rate:{key}:{slot}"
+    cache.add(key, 0, timeout=window * 2)
+    try:
+        count = cache.incr(key)
+    except ValueError:  # zwischen add und incr verfallen
+        cache.set(key, 1, timeout=window * 2)
+        count = 1
+    return count <= limit
+
+
+def _give_back(key: str, slot: int) -> None:
+    try:
+        cache.decr(f"mail-rate:{key}:{slot}")
+    except ValueError:
+        pass
+
+
+def acquire_send_slot(tenant_id: int) -> tuple[float, str]:
+    """
+    Versandplatz im aktuellen Zeitfenster belegen (fixes Fenster, EMAIL_RATE_LIMIT_WINDOW).
+
+    Returns:
+        tuple: (0, '') wenn versendet werden darf, sonst Sekunden bis zum
+        nächsten Fenster und das erreichte Limit ("tenant" oder "provider")
+    """
+    window = _window()
+    now = time.time()
+    slot = int(now // window)
+    wait = (slot + 1) * window - now
+
+    tenant_key = f"tenant:{tenant_id}"
+    if not _take(tenant_key, getattr(settings, 'EMAIL_RATE_LIMIT_PER_TENANT', 0), window, slot):
+        return wait, 'tenant'
+    if not _take(f"provider:{provider_key()}", getattr(settings, 'EMAIL_RATE_LIMIT_PER_PROVIDER', 0),
+                 window, slot):
+        if getattr(settings, 'EMAIL_RATE_LIMIT_PER_TENANT', 0):
+            _give_back(tenant_key, slot)
+        return wait, 'provider'
+    return 0, ''
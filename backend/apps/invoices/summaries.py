@@ -0,0 +1,168 @@
+"""
+Vorverdichtete Umsätze (InvoiceSummary)
+- Beitrag einer Rechnung: je (Monat, Status, USt-Satz) Netto, Steuer, Positionen
+- Änderungen werden als Differenz vorher/nachher in derselben Transaktion gebucht
+- API und Admin buchen über track_summaries; queryset.update() und Shell nicht,
+  daher gleicht der Beat-Task rebuild_invoice_summaries_task nächtlich ab
+- rebuild_summaries() baut alles aus den Rechnungsdaten neu auf (Reparatur)
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+# Rechnungen ohne Positionen (Entwürfe) zählen beim Regelsteuersatz
+DEFAULT_SUMMARY_VAT_RATE = Decimal('19.00')
+
+SUMMARY_FIELDS = ('invoice_count', 'item_count', 'net', 'tax')
+
+_CENT = Decimal('0.01')
+
+
+def _empty():
+    return {'invoice_count': 0, 'item_count': 0, 'net': Decimal('0'), 'tax': Decimal('0')}
+
+
+def invoice_contributions(invoice_ids) -> dict:
+    """
+    Beitrag der Rechnungen zu den Summen, Schlüssel (tenant_id, month, status, vat_rate).
+
+    Zwei Queries unabhängig von der Anzahl Rechnungen.
+    """
+    from .models import Invoice, InvoiceItem
+
+    invoice_ids = list(invoice_ids)
+    contributions = defaultdict(_empty)
+    if not invoice_ids:
+        return contributions
+
+    rates = defaultdict(list)
+    rows = (
+        InvoiceItem.objects
+        .filter(invoice_id__in=invoice_ids)
+        .values('invoice_id', 'vat_rate')
+        .annotate(net=Sum('line_total'), tax=Sum('tax_amount'), items=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        rates[row['invoice_id']].append(row)
+
+    invoices = Invoice.objects.filter(pk__in=invoice_ids).values_list(
+        'pk', 'tenant_id', 'invoice_date', 'status')
+
+    for pk, tenant_id, invoice_date, status in invoices:
+        month = invoice_date.replace(day=1)
+        dominant = DEFAULT_SUMMARY_VAT_RATE
+        best = None
+
+        for row in rates[pk]:
+            rate = Decimal(row['vat_rate']).quantize(_CENT)
+            entry = contributions[(tenant_id, month, status, rate)]
+            entry['item_count'] += row['items']
+            entry['net'] += row['net'] or 0
+            entry['tax'] += row['tax'] or 0
+
+            if best is None or (row['net'] or 0, rate) > best:
+                best = (row['net'] or 0, rate)
+                dominant = rate
+
+        contributions[(tenant_id, month, status, dominant)]['invoice_count'] += 1
+
+    return contributions
+
+
+def apply_summary_delta(before: dict, after: dict) -> None:
+    """Bucht after - before per F()-Update (keine verlorenen Updates bei Parallelität)."""
+    from .models import InvoiceSummary
+
+    for key in set(before) | set(after):
+        old = before.get(key) or _empty()
+        new = after.get(key) or _empty()
+        delta = {field: new[field] - old[field] for field in SUMMARY_FIELDS}
+        if not any(delta.values()):
+            continue
+
+        tenant_id, month, status, vat_rate = key
+        summary, _ = InvoiceSummary.objects.get_or_create(
+            tenant_id=tenant_id, month=month, status=status, vat_rate=vat_rate)
+        InvoiceSummary.objects.filter(pk=summary.pk).update(
+            **{field: F(field) + value for field, value in delta.items()})
+
+
+class SummaryTracker:
+    def __init__(self, invoice_ids):
+        self.invoice_ids = set(invoice_ids)
+
+    def add(self, invoice) -> None:
+        """Neu angelegte Rechnung nachträglich erfassen."""
+        self.invoice_ids.add(invoice.pk)
+
+
+@contextmanager
+def track_summaries(*invoices):
+    """
+    Hält die Summen der Rechnungen aktuell.
+
+    Der Beitrag wird vor und nach dem Block aus der DB gelesen, die Differenz
+    in derselben Transaktion gebucht:
+
+        with track_summaries(invoice):
+            invoice.status = 'paid'
+            invoice.save()
+    """
+    from .models import Invoice
+
+    with transaction.atomic():
+        ids = {invoice.pk for invoice in invoices if invoice is not None and invoice.pk}
+        if ids:
+            # Sperrt die Rechnungen, damit parallele Änderungen nacheinander bilanziert werden
+            list(Invoice.objects.select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+
+        before = invoice_contributions(ids)
+        tracker = SummaryTracker(ids)
+        yield tracker
+        apply_summary_delta(before, invoice_contributions(tracker.invoice_ids))
+
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def rebuild_summaries(tenant=None) -> int:
+    """
+    Baut die Summen aus den Rechnungsdaten neu auf.
+
+    Returns:
+        Anzahl geschriebener Summenzeilen
+    """
+    from .models import Invoice, InvoiceSummary
+
+    invoices = Invoice.objects.order_by('pk')
+    summaries = InvoiceSummary.objects.all()
+    if tenant is not None:
+        invoices = invoices.filter(tenant=tenant)
+        summaries = summaries.filter(tenant=tenant)
+
+    totals = defaultdict(_empty)
+    last_pk = 0
+
+    while True:
+        batch = list(invoices.filter(pk__gt=last_pk).values_list('pk', flat=True)[:REBUILD_BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1]
+
+        for key, entry in invoice_contributions(batch).items():
+            for field in SUMMARY_FIELDS:
+                totals[key][field] += entry[field]
+
+    with transaction.atomic():
+        summaries.delete()
+        InvoiceSummary.objects.bulk_create([
+            InvoiceSummary(tenant_id=tenant_id, month=month, status=status, vat_rate=vat_rate, **entry)
+            for (tenant_id, month, status, vat_rate), entry in totals.items()
+        ])
+
+    return len(totals)
@@ -0,0 +1,203 @@
+"""
+Celery Tasks für Rechnungen
+"""
+
+import logging
+
+from celery import shared_task
+
+from .archive import archive_invoice
+from .export_jobs import fail_export_job, run_export_job
+from .validation import validate_invoice
+from .validator_status import probe_validator_health
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_MAX_RETRIES = 5
+ARCHIVE_RETRY_BASE_DELAY = 30  # Sekunden, verdoppelt sich je Versuch
+
+
+def _mark_archive_failed(invoice, error: str) -> None:
+    invoice.archive_status = 'failed'
+    invoice.archive_error = error
+    invoice.save(update_fields=['archive_status', 'archive_error'])
+
+
+@shared_task(bind=True, max_retries=ARCHIVE_MAX_RETRIES)
+def archive_invoice_task(self, invoice_id: int) -> dict | None:
+    """
+    GoBD-Archivierung einer finalisierten Rechnung im Hintergrund.
+
+    Rendert XML und PDF, packt, hasht und verschlüsselt sie und schreibt das
+    Archiv. Technische Fehler werden mit exponentiellem Backoff wiederholt,
+    fachliche Fehler (ValueError) führen sofort zum Status "failed".
+    """
+    from .models import Invoice
+
+    try:
+        invoice = Invoice.objects.select_related('tenant', 'customer').get(pk=invoice_id)
+    except Invoice.DoesNotExist:
+        logger.warning("Archivierung: Rechnung %s existiert nicht", invoice_id)
+        return None
+
+    if invoice.archived_at:
+        return None
+
+    try:
+        result = archive_invoice(invoice)
+    except ValueError as e:
+        _mark_archive_failed(invoice, str(e))
+        return None
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            logger.exception("Archivierung von %s endgültig fehlgeschlagen", invoice.invoice_number)
+            _mark_archive_failed(invoice, f"Archivierung fehlgeschlagen: {exc}")
+            raise
+        logger.warning("Archivierung von %s fehlgeschlagen, neuer Versuch: %s",
+                       invoice.invoice_number, exc)
+        raise self.retry(exc=exc, countdown=ARCHIVE_RETRY_BASE_DELAY * 2 ** self.request.retries)
+
+    # Archiviertes XML validieren (Cache für Versand und Archivprüfung)
+    try:
+        validate_invoice(invoice)
+    except Exception:
+        logger.warning("Validierung nach Archivierung von %s fehlgeschlagen",
+                       invoice.invoice_number, exc_info=True)
+
+    return result
+
+
+@shared_task
+def run_export_job_task(job_id: int) -> None:
+    """
+    Export-Job im Hintergrund ausführen.
+
+    Exporte werden nicht wiederholt: ein abgebrochener Export landet mit
+    Fehlermeldung im Status "failed" und kann neu angestoßen werden.
+    """
+    from .models import ExportJob
+
+    try:
+        job = ExportJob.objects.select_related('tenant', 'created_by').get(pk=job_id)
+    except ExportJob.DoesNotExist:
+        logger.warning("Export: Job %s existiert nicht", job_id)
+        return
+
+    if job.status != 'queued':
+        return
+
+    try:
+        run_export_job(job)
+    except Exception as exc:
+        logger.exception("Export-Job %s fehlgeschlagen", job_id)
+        fail_export_job(job, str(exc))
+
+
+@shared_task
+def probe_validator_health_task() -> dict:
+    """Health-Monitor des Validators (Celery Beat, alle VALIDATOR_HEALTH_INTERVAL Sekunden)."""
+    return probe_validator_health()
+
+
+@shared_task
+def send_outbound_email_task(email_id: int) -> str | None:
+    """
+    Zustellversuch für eine Mail aus der Outbox.
+
+    Bei technischen Fehlern plant sich der Task mit Backoff neu ein; geht
+    der Task verloren, greift flush_outbox_task.
+    """
+    from django.utils import timezone
+
+    from .outbox import claim, send_claimed
+
+    email = claim(email_id)
+    if email is None:
+        return None
+
+    result = send_claimed(email)
+    if result == 'queued':
+        countdown = max(0, (email.next_attempt_at - timezone.now()).total_seconds())
+        send_outbound_email_task.apply_async(args=[email.pk], countdown=countdown)
+    return result
+
+
+@shared_task
+def send_outbox_batch_task(email_ids: list) -> dict:
+    """Paket von Outbox-Mails über eine gepoolte SMTP-Verbindung versenden."""
+    from .outbox import send_batch
+
+    return send_batch(email_ids)
+
+
+@shared_task
+def flush_outbox_task() -> int:
+    """Fällige und hängengebliebene Outbox-Einträge einreihen (Celery Beat, jede Minute)."""
+    from .outbox import dispatch, due_email_ids, requeue_stale
+
+    stale = requeue_stale()
+    if stale:
+        logger.warning("Outbox: %s hängengebliebene Mails neu eingereiht", stale)
+
+    return dispatch(due_email_ids())
+
+
+@shared_task
+def run_dunning_task() -> int:
+    """Täglicher Mahnlauf (Celery Beat): ein Task je Mandant mit aktivem Mahnwesen."""
+    from apps.users.models import Tenant
+
+    tenant_ids = list(
+        Tenant.objects.filter(is_active=True, dunning_enabled=True).values_list('pk', flat=True)
+    )
+    for tenant_id in tenant_ids:
+        run_tenant_dunning_task.delay(tenant_id)
+    return len(tenant_ids)
+
+
+@shared_task
+def run_tenant_dunning_task(tenant_id: int) -> dict | None:
+    """Mahnlauf eines Mandanten (siehe dunning.run_dunning)."""
+    from apps.users.models import Tenant
+
+    from .dunning import run_dunning
+
+    try:
+        tenant = Tenant.objects.get(pk=tenant_id)
+    except Tenant.DoesNotExist:
+        logger.warning("Mahnlauf: Mandant %s existiert nicht", tenant_id)
+        return None
+
+    return run_dunning(tenant)
+
+
+@shared_task
+def rebuild_invoice_summaries_task() -> int:
+    """
+    Nächtlicher Abgleich der Umsatz-Zusammenfassungen (Celery Beat).
+
+    Fängt Änderungen ab, die an track_summaries vorbeigehen (queryset.update(),
+    Shell, direkte SQL-Korrekturen). Ein Task je Mandant.
+    """
+    from apps.users.models import Tenant
+
+    tenant_ids = list(Tenant.objects.values_list('pk', flat=True))
+    for tenant_id in tenant_ids:
+        rebuild_tenant_summaries_task.delay(tenant_id)
+    return len(tenant_ids)
+
+
+@shared_task
+def rebuild_tenant_summaries_task(tenant_id: int) -> int | None:
+    """Umsatz-Zusammenfassungen eines Mandanten neu aufbauen (siehe summaries.rebuild_summaries)."""
+    from apps.users.models import Tenant
+
+    from .summaries import rebuild_summaries
+
+    try:
+        tenant = Tenant.objects.get(pk=tenant_id)
+    except Tenant.DoesNotExist:
+        logger.warning("Summen-Abgleich: Mandant %s existiert nicht", tenant_id)
+        return None
+
+    return rebuild_summaries(tenant)
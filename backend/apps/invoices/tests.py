@@ -11,6 +11,11 @@ def tenant(db):
     return Tenant.objects.create(
         name="Test GmbH",
         slug="test-gmbh",
+        street="Teststr. 1",
+        zip_code="10115",
+        city="Berlin",
+        email="rechnung@test-gmbh.de",
+        phone="+49 30 123456",
     )
 
 
@@ -48,6 +53,7 @@ def invoice(db, tenant, customer, user):
         due_date=timezone.now().date(),
         status="draft",
         format="xrechnung",
+        buyer_reference="PO-4711",
         created_by=user,
     )
 
@@ -107,6 +113,216 @@ class TestInvoiceArchive:
         with pytest.raises(ValueError, match="bereits archiviert"):
             archive_invoice(invoice)
             
+class TestArchivePipeline:
+    def test_finalize_schedules_archive(self, api_client, invoice_with_items, django_capture_on_commit_callbacks):
+        from unittest import mock
+
+        with mock.patch("apps.invoices.tasks.archive_invoice_task.delay") as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(f"/api/invoices/{invoice_with_items.id}/finalize/")
+
+        assert response.status_code == 200
+        assert response.data["archive_status"] == "pending"
+        delay.assert_called_once_with(invoice_with_items.id)
+
+    def test_archive_task_includes_rendered_artifacts(self, finalized_invoice):
+        import zipfile
+        from io import BytesIO
+        from apps.invoices.archive import download_archive
+        from apps.invoices.tasks import archive_invoice_task
+
+        archive_invoice_task.apply(args=[finalized_invoice.id])
+        finalized_invoice.refresh_from_db()
+
+        assert finalized_invoice.archive_status == "archived"
+        names = zipfile.ZipFile(BytesIO(download_archive(finalized_invoice))).namelist()
+        assert {"metadata.json", "invoice.xml", "invoice.pdf"} <= set(names)
+
+    def test_archive_task_marks_failed(self, invoice):
+        from apps.invoices.tasks import archive_invoice_task
+
+        archive_invoice_task.apply(args=[invoice.id])
+        invoice.refresh_from_db()
+
+        assert invoice.archive_status == "failed"
+        assert "Entwürfe" in invoice.archive_error
+
+
+class TestDeduplicatedArchive:
+    def _archive_copy(self, invoice, number):
+        from apps.invoices.archive import archive_invoice
+
+        items = list(invoice.items.all())
+        invoice.pk = None
+        invoice.invoice_number = number
+        invoice.archived_at = None
+        invoice.save()
+        for item in items:
+            item.pk = None
+            item.invoice = invoice
+            item.save()
+        archive_invoice(invoice)
+        return invoice
+
+    def test_chunks_shared_between_archives(self, finalized_invoice):
+        import json
+        from apps.invoices.archive import decrypt_data
+        from apps.invoices.models import ArchiveChunk, InvoiceArchive
+
+        self._archive_copy(finalized_invoice, "RE-2025-0002")
+        self._archive_copy(finalized_invoice, "RE-2025-0003")
+
+        referenced = 0
+        for archive in InvoiceArchive.objects.all():
+            assert archive.storage_format == "chunked"
+            manifest = json.loads(decrypt_data(archive.encrypted_data))
+            referenced += sum(len(m["chunks"]) for m in manifest["members"])
+
+        assert ArchiveChunk.objects.count() < referenced
+
+    def test_members_reconstructed_byte_identical(self, finalized_invoice):
+        import zipfile
+        from io import BytesIO
+        from unittest import mock
+        from apps.invoices.archive import (
+            archive_invoice, create_archive_members, download_archive, verify_archive,
+        )
+
+        artifacts = {"invoice.xml": b"<xml/>" * 500, "invoice.pdf": bytes(range(256)) * 100}
+        members = create_archive_members(finalized_invoice, artifacts)
+
+        with mock.patch("apps.invoices.archive.create_archive_members", return_value=members):
+            archive_invoice(finalized_invoice)
+
+        assert verify_archive(finalized_invoice)["valid"] is True
+        zf = zipfile.ZipFile(BytesIO(download_archive(finalized_invoice)))
+        for name, content in members.items():
+            assert zf.read(name) == content
+
+    def test_split_chunks_roundtrip(self):
+        import os
+        from apps.invoices.archive_store import CHUNK_MAX_SIZE, split_chunks
+
+        data = os.urandom(100_000)
+        chunks = split_chunks(data)
+
+        assert b"".join(chunks) == data
+        assert all(len(chunk) <= CHUNK_MAX_SIZE for chunk in chunks)
+
+
+class TestArchiveMembers:
+    def test_list_members(self, api_client, finalized_invoice):
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+        response = api_client.get(f"/api/invoices/{finalized_invoice.id}/archive/members/")
+
+        assert response.status_code == 200
+        names = [m["name"] for m in response.data["members"]]
+        assert names == ["metadata.json", "invoice.xml", "invoice.pdf"]
+
+    def test_read_single_member(self, api_client, finalized_invoice):
+        import json
+        from unittest import mock
+        from apps.invoices import archive_store
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+
+        with mock.patch.object(archive_store, "load_chunks", wraps=archive_store.load_chunks) as load_chunks:
+            response = api_client.get(
+                f"/api/invoices/{finalized_invoice.id}/archive/members/metadata.json/")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/json"
+        assert json.loads(response.content)["invoice_number"] == finalized_invoice.invoice_number
+        # Nur die Chunks von metadata.json, nicht die des PDFs
+        assert load_chunks.call_count == 1
+
+    def test_unknown_member(self, api_client, finalized_invoice):
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+        response = api_client.get(
+            f"/api/invoices/{finalized_invoice.id}/archive/members/secret.txt/")
+
+        assert response.status_code == 404
+
+    def test_unreadable_archive(self, api_client, finalized_invoice):
+        from unittest import mock
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+        with mock.patch("apps.invoices.archive._load_manifest", side_effect=ValueError("defekt")):
+            response = api_client.get(f"/api/invoices/{finalized_invoice.id}/archive/members/")
+
+        assert response.status_code == 500
+        assert response.data["success"] is False
+        assert "defekt" in response.data["error"]
+
+
+class TestArchiveIndex:
+    def test_index_created_on_archive(self, finalized_invoice):
+        from apps.invoices.archive import archive_invoice
+        from apps.invoices.models import ArchiveIndex
+
+        archive_invoice(finalized_invoice)
+        index = ArchiveIndex.objects.get(invoice=finalized_invoice)
+
+        assert index.total == finalized_invoice.total
+        assert index.item_count == 1
+        assert index.vat_breakdown == {"19.00": {"net": "200.00", "tax": "38.00"}}
+
+    def test_filter_archive_index(self, api_client, finalized_invoice):
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+        day = finalized_invoice.invoice_date.isoformat()
+
+        response = api_client.get(f"/api/invoices/archive-index/?invoice_date__gte={day}&vat_rate=19")
+        assert response.status_code == 200
+        assert response.data["count"] == 1
+        assert response.data["results"][0]["invoice_number"] == finalized_invoice.invoice_number
+
+        response = api_client.get("/api/invoices/archive-index/?vat_rate=7")
+        assert response.data["count"] == 0
+
+
+class TestArchivePayloadDeferral:
+    def test_encrypted_data_deferred_by_default(self, finalized_invoice):
+        from apps.invoices.archive import archive_invoice
+        from apps.invoices.models import Invoice, InvoiceArchive
+
+        archive_invoice(finalized_invoice)
+        invoice = Invoice.objects.get(pk=finalized_invoice.pk)
+
+        assert "encrypted_data" in InvoiceArchive.objects.get().get_deferred_fields()
+        assert "encrypted_data" in invoice.archive.get_deferred_fields()
+        assert "encrypted_data" not in InvoiceArchive.objects.with_payload().get().get_deferred_fields()
+
+    def test_deferred_payload_loads_on_access(self, finalized_invoice):
+        from apps.invoices.archive import archive_invoice, decrypt_data
+        from apps.invoices.models import InvoiceArchive
+
+        archive_invoice(finalized_invoice)
+        archive = InvoiceArchive.objects.get()
+
+        assert decrypt_data(bytes(archive.encrypted_data))
+
+    def test_admin_changelist_without_payload(self, finalized_invoice, admin_client):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from apps.invoices.archive import archive_invoice
+
+        archive_invoice(finalized_invoice)
+        with CaptureQueriesContext(connection) as ctx:
+            response = admin_client.get("/admin/invoices/invoicearchive/")
+
+        assert response.status_code == 200
+        assert finalized_invoice.archive_hash.encode() in response.content
+        assert not any("encrypted_data" in q["sql"] for q in ctx.captured_queries)
+
+
 class TestInvoiceAPI:
     def test_list_invoices(self, api_client, invoice):
         response = api_client.get("/api/invoices/")
@@ -225,4 +441,1578 @@ class TestDATEVExport:
         csv_content = generate_datev_simple([finalized_invoice])
         
         # Rechnungsnummer sollte enthalten sein
-        assert finalized_invoice.invoice_number in csv_content
\ No newline at end of file
+        assert finalized_invoice.invoice_number in csv_content
+
+    def test_export_datev_runs_as_job(self, api_client, finalized_invoice, settings, tmp_path):
+        from apps.invoices.tasks import run_export_job_task
+
+        settings.MEDIA_ROOT = tmp_path
+        assert api_client.get("/api/invoices/export_datev/").status_code == 405
+        response = api_client.post("/api/invoices/export_datev/")
+
+        assert response.status_code == 202
+        run_export_job_task.apply(args=[response.data["id"]])
+        download = api_client.get(f"/api/invoices/export-jobs/{response.data['id']}/download/")
+        content = b"".join(download.streaming_content).decode("utf-8")
+        assert content.startswith("Rechnungsnummer;")
+        assert finalized_invoice.invoice_number in content
+
+    def test_datev_query_count_constant(self, finalized_invoice, django_assert_num_queries):
+        from apps.invoices.datev import generate_datev_export, generate_datev_simple, load_datev_invoices
+
+        def export():
+            invoices = list(load_datev_invoices(Invoice.objects.exclude(status="draft")))
+            generate_datev_simple(invoices)
+            generate_datev_export(invoices)
+
+        with django_assert_num_queries(1):
+            export()
+
+        for number in range(2, 7):
+            copy = Invoice.objects.get(pk=finalized_invoice.pk)
+            copy.pk = None
+            copy.invoice_number = f"RE-2025-{number:04d}"
+            copy.save()
+            InvoiceItem.objects.create(
+                invoice=copy, description="Position", quantity=Decimal("1"),
+                unit_price=Decimal("10.00"), vat_rate=Decimal("7.00"),
+            )
+
+        with django_assert_num_queries(1):
+            export()
+
+    def test_datev_dominant_vat_rate(self, finalized_invoice):
+        from apps.invoices.datev import _get_erlos_konto, load_datev_invoices
+
+        InvoiceItem.objects.create(
+            invoice=finalized_invoice, description="Buch", quantity=Decimal("1"),
+            unit_price=Decimal("500.00"), vat_rate=Decimal("7.00"),
+        )
+
+        annotated = load_datev_invoices(Invoice.objects.filter(pk=finalized_invoice.pk)).get()
+
+        assert annotated.datev_vat_rate == Decimal("7.00")
+        assert _get_erlos_konto(annotated) == 8300
+        assert _get_erlos_konto(finalized_invoice) == 8300
+
+    def test_export_datev_extf_splits_vat_rates(self, api_client, tenant, finalized_invoice):
+        tenant.datev_consultant_number = "1234567"
+        tenant.datev_client_number = "10001"
+        tenant.save()
+        InvoiceItem.objects.create(
+            invoice=finalized_invoice, description="Buch", quantity=Decimal("1"),
+            unit_price=Decimal("50.00"), vat_rate=Decimal("7.00"),
+        )
+
+        response = api_client.get("/api/invoices/export_datev_extf/")
+
+        assert response.status_code == 200
+        lines = b"".join(response.streaming_content).decode("cp1252").splitlines()
+        header = lines[0].split(";")
+        assert header[:4] == ["EXTF", "700", "21", "Buchungsstapel"]
+        assert header[10:12] == ["1234567", "10001"]
+
+        bookings = [line.split(";") for line in lines[2:]]
+        assert [(b[0], b[7]) for b in bookings] == [("238,00", "8400"), ("53,50", "8300")]
+        assert all(len(b) == len(lines[1].split(";")) for b in bookings)
+
+    def test_export_datev_extf_skips_cancelled(self, api_client, tenant, finalized_invoice):
+        tenant.datev_consultant_number = "1234567"
+        tenant.datev_client_number = "10001"
+        tenant.save()
+        Invoice.objects.filter(pk=finalized_invoice.pk).update(status="cancelled")
+
+        response = api_client.get("/api/invoices/export_datev_extf/")
+
+        assert response.status_code == 200
+        lines = b"".join(response.streaming_content).decode("cp1252").splitlines()
+        assert lines[2:] == []
+
+    def test_extf_header_uses_fiscal_year_start(self, tenant):
+        from datetime import date
+        from apps.invoices.datev import iter_datev_extf
+
+        tenant.datev_fiscal_year_start = 7
+        header = next(iter_datev_extf([], tenant, date(2026, 3, 1), date(2026, 3, 31))).split(";")
+        assert header[12] == "20250701"
+
+        tenant.datev_fiscal_year_start = 1
+        header = next(iter_datev_extf([], tenant, date(2026, 3, 1), date(2026, 3, 31))).split(";")
+        assert header[12] == "20260101"
+
+    @pytest.mark.parametrize("fiscal_year_start,status_code", [(1, 400), (7, 200)])
+    def test_export_datev_extf_single_fiscal_year(self, api_client, tenant, finalized_invoice,
+                                                   fiscal_year_start, status_code):
+        tenant.datev_consultant_number = "1234567"
+        tenant.datev_client_number = "10001"
+        tenant.datev_fiscal_year_start = fiscal_year_start
+        tenant.save()
+
+        response = api_client.get("/api/invoices/export_datev_extf/?from=2025-12-01&to=2026-01-31")
+
+        assert response.status_code == status_code
+        if status_code == 400:
+            assert "Wirtschaftsjahre" in response.data["error"]
+
+    def test_extf_job_rejects_cross_year_range(self, api_client, tenant):
+        tenant.datev_consultant_number = "1234567"
+        tenant.datev_client_number = "10001"
+        tenant.save()
+
+        response = api_client.post("/api/invoices/export-jobs/", {
+            "kind": "datev_extf", "params": {"from": "2025-12-01", "to": "2026-01-31"},
+        }, format="json")
+
+        assert response.status_code == 400
+        assert "Wirtschaftsjahre" in str(response.data["params"])
+
+    def test_export_datev_extf_requires_datev_numbers(self, api_client, finalized_invoice):
+        response = api_client.get("/api/invoices/export_datev_extf/")
+
+        assert response.status_code == 400
+        assert "Mandantennummer" in response.data["error"]
+
+
+class TestIncrementalDatevExport:
+    @pytest.fixture(autouse=True)
+    def export_settings(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.DATEV_EXPORT_WATERMARK_LAG_SECONDS = 0
+
+    def _run(self, api_client, data):
+        """Lauf anlegen, Export-Job ausführen und den fertigen Lauf abrufen."""
+        from apps.invoices.tasks import run_export_job_task
+
+        response = api_client.post("/api/invoices/datev-exports/", data)
+        assert response.status_code == 202
+        assert response.data["kind"] == "datev_run"
+
+        run_export_job_task.apply(args=[response.data["id"]])
+        job = api_client.get(f"/api/invoices/export-jobs/{response.data['id']}/").data
+        assert job["status"] == "done"
+        return api_client.get(f"/api/invoices/datev-exports/{job['params']['run_id']}/")
+
+    def test_incremental_exports_only_changes(self, api_client, finalized_invoice):
+        first = self._run(api_client, {"consumer": "stb", "mode": "incremental"})
+        assert first.data["invoice_count"] == 1
+
+        second = self._run(api_client, {"consumer": "stb", "mode": "incremental"})
+        assert second.data["invoice_count"] == 0
+        assert second.data["watermark_id"] == first.data["watermark_id"]
+
+        # Reiner Statuswechsel ist keine neue Buchung
+        api_client.post(f"/api/invoices/{finalized_invoice.id}/mark_paid/")
+        third = self._run(api_client, {"consumer": "stb", "mode": "incremental"})
+        assert third.data["invoice_count"] == 0
+        assert third.data["reversal_count"] == 0
+
+        # Anderer Abnehmer hat eigenen Watermark
+        other = self._run(api_client, {"consumer": "bi", "mode": "incremental"})
+        assert other.data["invoice_count"] == 1
+
+    def _content(self, api_client, run):
+        response = api_client.get(f"/api/invoices/datev-exports/{run['id']}/download/")
+        return b"".join(response.streaming_content)
+
+    def test_cancelled_invoice_is_reversed_once(self, api_client, tenant, finalized_invoice):
+        tenant.datev_consultant_number = "1234567"
+        tenant.datev_client_number = "10001"
+        tenant.save()
+        self._run(api_client, {"consumer": "stb", "export_format": "extf"})
+
+        api_client.post(f"/api/invoices/{finalized_invoice.id}/cancel/")
+        storno = self._run(api_client, {"consumer": "stb", "export_format": "extf"}).data
+
+        assert (storno["invoice_count"], storno["reversal_count"]) == (0, 1)
+        lines = self._content(api_client, storno).decode("cp1252").splitlines()
+        columns = lines[1].split(";")
+        bookings = [dict(zip(columns, line.split(";"))) for line in lines[2:]]
+        assert [(b["Umsatz (ohne Soll/Haben-Kz)"], b["Generalumkehr (GU)"]) for b in bookings] == [("238,00", "1")]
+        assert bookings[0]["Belegfeld 1"] == finalized_invoice.invoice_number
+
+        again = self._run(api_client, {"consumer": "stb", "export_format": "extf"}).data
+        assert (again["invoice_count"], again["reversal_count"]) == (0, 0)
+
+    def test_changed_amount_is_reversed_and_rebooked(self, api_client, finalized_invoice):
+        from django.utils import timezone
+
+        self._run(api_client, {"consumer": "stb"})
+        Invoice.objects.filter(pk=finalized_invoice.pk).update(
+            total=Decimal("300.00"), updated_at=timezone.now())
+
+        run = self._run(api_client, {"consumer": "stb"}).data
+
+        assert (run["invoice_count"], run["reversal_count"]) == (1, 1)
+        rows = [line.split(";") for line in self._content(api_client, run).decode("utf-8").splitlines()[1:]]
+        assert [(row[0], row[8], row[10]) for row in rows] == [
+            (finalized_invoice.invoice_number, "-238,00", "Storno"),
+            (finalized_invoice.invoice_number, "300,00", "Finalisiert"),
+        ]
+
+    def test_filtered_run_does_not_move_watermark(self, api_client, finalized_invoice, customer, user):
+        from datetime import timedelta
+
+        older = Invoice.objects.create(
+            tenant=finalized_invoice.tenant,
+            invoice_number="RE-2025-0002",
+            customer=customer,
+            invoice_date=finalized_invoice.invoice_date - timedelta(days=60),
+            due_date=finalized_invoice.due_date - timedelta(days=60),
+            status="final",
+            created_by=user,
+        )
+        day = finalized_invoice.invoice_date.isoformat()
+
+        filtered = self._run(api_client, {"consumer": "stb", "mode": "incremental", "date_from": day, "date_to": day})
+        assert filtered.data["invoice_count"] == 1
+        assert filtered.data["watermark_id"] is None
+
+        full = self._run(api_client, {"consumer": "stb", "mode": "full"})
+        assert full.data["watermark_id"] is None
+
+        # Ungefilterter Lauf enthält die Rechnung außerhalb des Filters, die
+        # bereits gebuchte nicht erneut
+        unfiltered = self._run(api_client, {"consumer": "stb", "mode": "incremental"})
+        assert unfiltered.data["invoice_count"] == 1
+        assert unfiltered.data["watermark_id"] in (older.id, finalized_invoice.id)
+
+    @pytest.mark.parametrize("consumer", ["../x", "a/b", "stb 1"])
+    def test_consumer_must_be_slug(self, api_client, finalized_invoice, consumer):
+        response = api_client.post("/api/invoices/datev-exports/", {"consumer": consumer})
+
+        assert response.status_code == 400
+        assert "consumer" in response.data
+
+    def test_extf_run_requires_datev_numbers(self, api_client, finalized_invoice):
+        response = api_client.post("/api/invoices/datev-exports/", {"export_format": "extf"})
+
+        assert response.status_code == 400
+        assert "export_format" in response.data
+
+    def test_job_points_at_run_file(self, api_client, finalized_invoice):
+        from apps.invoices.models import DatevExportRun, ExportJob
+
+        run = DatevExportRun.objects.get(pk=self._run(api_client, {"consumer": "stb"}).data["id"])
+        job = ExportJob.objects.get(kind="datev_run")
+
+        assert job.file.name == run.file.name
+        assert job.total_rows == job.processed_rows == run.invoice_count == 1
+
+    def test_download_previous_run(self, api_client, finalized_invoice):
+        run = self._run(api_client, {"consumer": "stb"}).data
+
+        response = api_client.get(f"/api/invoices/datev-exports/{run['id']}/download/")
+
+        assert response.status_code == 200
+        content = b"".join(response.streaming_content).decode("utf-8")
+        assert finalized_invoice.invoice_number in content
+
+
+@pytest.mark.django_db
+class TestExportJobs:
+    @pytest.fixture(autouse=True)
+    def export_settings(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+
+    def test_job_runs_in_background(self, api_client, finalized_invoice,
+                                    django_capture_on_commit_callbacks):
+        from unittest import mock
+        from apps.invoices.tasks import run_export_job_task
+
+        with mock.patch.object(run_export_job_task, "delay") as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(
+                    "/api/invoices/export-jobs/", {"kind": "datev"}, format="json")
+
+        assert response.status_code == 202
+        assert response.data["status"] == "queued"
+        delay.assert_called_once_with(response.data["id"])
+
+        url = f"/api/invoices/export-jobs/{response.data['id']}/"
+        assert api_client.get(url + "download/").status_code == 409
+
+        run_export_job_task.apply(args=[response.data["id"]])
+
+        job = api_client.get(url).data
+        assert job["status"] == "done"
+        assert job["total_rows"] == job["processed_rows"] == 1
+        assert job["progress_percent"] == 100.0
+
+        download = api_client.get(url + "download/")
+        content = b"".join(download.streaming_content).decode("utf-8")
+        assert finalized_invoice.invoice_number in content
+
+    def test_unknown_kind_rejected(self, api_client):
+        response = api_client.post("/api/invoices/export-jobs/", {"kind": "pdf"}, format="json")
+
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("kind,params", [
+        ("datev", {"from": "2026-13-01"}),
+        ("datev", {"from": "2026-02-01", "to": "2026-01-01"}),
+        ("datev_extf", {}),
+        ("datev_run", {"consumer": "../x"}),
+        ("datev_run", {"mode": "delta"}),
+        ("analytics", {"format": "csv"}),
+    ])
+    def test_invalid_params_rejected(self, api_client, kind, params):
+        response = api_client.post(
+            "/api/invoices/export-jobs/", {"kind": kind, "params": params}, format="json")
+
+        assert response.status_code == 400
+        assert "params" in response.data
+
+    def test_params_stored_cleaned(self, api_client):
+        response = api_client.post(
+            "/api/invoices/export-jobs/",
+            {"kind": "datev_run", "params": {"mode": "full", "date_from": "2026-01-01", "extra": 1}},
+            format="json")
+
+        assert response.status_code == 202
+        assert response.data["params"] == {"consumer": "default", "mode": "full", "date_from": "2026-01-01"}
+
+
+@pytest.mark.django_db
+class TestAnalyticsExport:
+    @pytest.fixture(autouse=True)
+    def export_settings(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path / "media"
+
+    def test_command_writes_monthly_partitions(self, tenant, finalized_invoice, tmp_path):
+        pq = pytest.importorskip("pyarrow.parquet")
+        from django.core.management import call_command
+        from apps.customers.models import Customer
+
+        # Privatkunde ohne Firma: Name aus Vor- und Nachname
+        Customer.objects.filter(pk=finalized_invoice.customer_id).update(
+            company_name="", first_name="Erika", last_name="Mustermann")
+
+        call_command("export_analytics", tenant=tenant.slug, output=str(tmp_path / "bi"))
+
+        month = finalized_invoice.invoice_date.strftime("%Y-%m")
+        invoices = pq.read_table(tmp_path / "bi" / "invoices" / f"month={month}" / "part-0.parquet")
+        items = pq.read_table(tmp_path / "bi" / "invoice_items" / f"month={month}" / "part-0.parquet")
+
+        assert invoices.column("invoice_number").to_pylist() == [finalized_invoice.invoice_number]
+        assert invoices.column("customer_name").to_pylist() == ["Erika Mustermann"]
+        assert str(invoices.schema.field("total").type) == "decimal128(12, 2)"
+        assert invoices.column("total").to_pylist() == [finalized_invoice.total]
+        assert items.num_rows == finalized_invoice.items.count()
+
+    def test_async_job_produces_zip(self, api_client, finalized_invoice):
+        pytest.importorskip("pyarrow")
+        import zipfile
+        from apps.invoices.models import ExportJob
+        from apps.invoices.tasks import run_export_job_task
+
+        response = api_client.post(
+            "/api/invoices/export-jobs/", {"kind": "analytics"}, format="json")
+        run_export_job_task.apply(args=[response.data["id"]])
+
+        job = ExportJob.objects.get(pk=response.data["id"])
+        assert job.status == "done"
+        assert job.processed_rows == job.total_rows == 1 + finalized_invoice.items.count()
+
+        with zipfile.ZipFile(job.file.open("rb")) as zf:
+            names = zf.namelist()
+        assert any(name.startswith("invoices/month=") for name in names)
+        assert any(name.startswith("invoice_items/month=") for name in names)
+
+
+class TestShardedExports:
+    @pytest.fixture(autouse=True)
+    def export_settings(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+
+    @pytest.fixture
+    def invoices_over_months(self, tenant, customer, user):
+        from datetime import date
+
+        invoices = []
+        for number, invoice_date in enumerate([date(2024, 11, 20), date(2024, 12, 5), date(2025, 1, 10)]):
+            invoice = Invoice.objects.create(
+                tenant=tenant,
+                invoice_number=f"RE-{number:04d}",
+                customer=customer,
+                invoice_date=invoice_date,
+                due_date=invoice_date,
+                status="final",
+                created_by=user,
+            )
+            InvoiceItem.objects.create(
+                invoice=invoice, description="Leistung",
+                quantity=Decimal("1"), unit_price=Decimal("100.00"),
+            )
+            invoices.append(invoice)
+        return invoices
+
+    def test_month_shards(self):
+        from datetime import date
+        from apps.invoices.export_shards import month_shards
+
+        assert month_shards(date(2024, 11, 15), date(2025, 2, 3)) == [
+            (date(2024, 11, 15), date(2024, 11, 30)),
+            (date(2024, 12, 1), date(2024, 12, 31)),
+            (date(2025, 1, 1), date(2025, 1, 31)),
+            (date(2025, 2, 1), date(2025, 2, 3)),
+        ]
+
+    def test_failed_shard_cleans_up(self):
+        import io
+        import tempfile
+        import time
+        from unittest import mock
+        from apps.invoices.export_shards import write_sharded
+
+        created, rendered = [], []
+        make_temp = tempfile.TemporaryFile
+
+        def temporary_file():
+            created.append(make_temp())
+            return created[-1]
+
+        def render(index, shard, out, progress):
+            rendered.append(index)
+            if index == 0:
+                raise RuntimeError("Shard fehlgeschlagen")
+            time.sleep(0.1)
+            out.write(b"x")
+
+        with mock.patch("apps.invoices.export_shards.tempfile.TemporaryFile", temporary_file):
+            with pytest.raises(RuntimeError):
+                write_sharded(io.BytesIO(), range(8), render, workers=2)
+
+        assert len(rendered) < 8  # wartende Shards wurden abgebrochen
+        assert created and all(f.closed for f in created)
+
+    @pytest.mark.django_db(transaction=True)
+    def test_parallel_output_is_deterministic(self, settings, tenant, invoices_over_months):
+        from apps.invoices.datev import iter_datev_simple, load_datev_invoices
+        from apps.invoices.export_jobs import run_export_job
+        from apps.invoices.models import ExportJob
+
+        expected = "".join(iter_datev_simple(load_datev_invoices(
+            Invoice.objects.filter(tenant=tenant).order_by("invoice_date", "invoice_number", "id")
+        )))
+
+        for workers in (1, 3):
+            settings.EXPORT_SHARD_WORKERS = workers
+            job = ExportJob.objects.create(
+                tenant=tenant, kind="datev", params={"from": "2024-11-01", "to": "2025-01-31"})
+
+            run_export_job(job)
+
+            assert job.processed_rows == 3
+            with job.file.open("rb") as f:
+                assert f.read().decode("utf-8") == expected
+
+
+class TestInvoiceSummaries:
+    def _summaries(self, tenant):
+        from apps.invoices.models import InvoiceSummary
+
+        return {
+            (s.month, s.status, s.vat_rate): (s.invoice_count, s.item_count, s.net, s.tax)
+            for s in InvoiceSummary.objects.filter(tenant=tenant)
+            if s.invoice_count or s.item_count
+        }
+
+    def test_tracked_changes_match_rebuild(self, api_client, tenant, invoice_with_items):
+        from apps.invoices.summaries import rebuild_summaries
+
+        rebuild_summaries(tenant)
+
+        item = api_client.post("/api/invoices/items/", {
+            "invoice": invoice_with_items.id,
+            "description": "Buch",
+            "quantity": "1",
+            "unit_price": "50.00",
+            "vat_rate": "7.00",
+        }).data
+        api_client.patch(f"/api/invoices/items/{item['id']}/", {"quantity": "3"})
+        api_client.post(f"/api/invoices/{invoice_with_items.id}/finalize/")
+        api_client.post(f"/api/invoices/{invoice_with_items.id}/mark_paid/")
+        copy = api_client.post(f"/api/invoices/{invoice_with_items.id}/duplicate/").data
+        api_client.post(f"/api/invoices/{copy['id']}/cancel/")
+
+        tracked = self._summaries(tenant)
+        rebuild_summaries(tenant)
+        assert tracked == self._summaries(tenant)
+
+        month = invoice_with_items.invoice_date.replace(day=1)
+        assert tracked[(month, "paid", Decimal("19.00"))] == (1, 1, Decimal("200.00"), Decimal("38.00"))
+        assert tracked[(month, "paid", Decimal("7.00"))] == (0, 1, Decimal("150.00"), Decimal("10.50"))
+
+    def test_dashboard_reads_summaries(self, api_client, tenant, finalized_invoice):
+        from apps.invoices.summaries import rebuild_summaries
+
+        rebuild_summaries(tenant)
+        api_client.post(f"/api/invoices/{finalized_invoice.id}/mark_paid/")
+
+        response = api_client.get("/api/invoices/dashboard_stats/")
+
+        assert response.data["total_invoices"] == 1
+        assert response.data["by_status"]["paid"] == 1
+        assert response.data["total_revenue"] == "238.00"
+        assert response.data["monthly_revenue"][0]["total"] == "238.00"
+
+        summary = api_client.get("/api/invoices/revenue_summary/?status=paid").data
+        assert [row["gross"] for row in summary] == ["238.00"]
+
+    def test_admin_edit_matches_rebuild(self, admin_client, tenant, invoice_with_items):
+        from django.forms import FileField
+
+        from apps.invoices.summaries import rebuild_summaries
+
+        rebuild_summaries(tenant)
+        url = f"/admin/invoices/invoice/{invoice_with_items.id}/change/"
+
+        # Formular wie im Browser absenden: Ausgangswerte plus Änderungen
+        response = admin_client.get(url)
+        forms = [response.context["adminform"].form]
+        for inline in response.context["inline_admin_formsets"]:
+            forms += [inline.formset.management_form, *inline.formset.forms]
+        data = {
+            field.html_name: field.value()
+            for form in forms for field in form
+            if field.value() not in (None, False) and not isinstance(field.field, FileField)
+        }
+        data["status"] = "paid"
+        data["items-0-quantity"] = "3"
+
+        response = admin_client.post(url, data)
+        assert response.status_code == 302
+
+        tracked = self._summaries(tenant)
+        rebuild_summaries(tenant)
+        assert tracked == self._summaries(tenant)
+
+        month = invoice_with_items.invoice_date.replace(day=1)
+        assert tracked[(month, "paid", Decimal("19.00"))] == (1, 1, Decimal("300.00"), Decimal("57.00"))
+
+    def test_periodic_rebuild_repairs_untracked_updates(self, tenant, finalized_invoice):
+        from unittest import mock
+
+        from apps.invoices.summaries import rebuild_summaries
+        from apps.invoices.tasks import rebuild_invoice_summaries_task, rebuild_tenant_summaries_task
+
+        rebuild_summaries(tenant)
+        Invoice.objects.filter(pk=finalized_invoice.pk).update(status="paid")
+
+        with mock.patch("apps.invoices.tasks.rebuild_tenant_summaries_task.delay") as delay:
+            assert rebuild_invoice_summaries_task.apply().get() == 1
+        delay.assert_called_once_with(tenant.id)
+        rebuild_tenant_summaries_task.apply(args=[tenant.id])
+
+        month = finalized_invoice.invoice_date.replace(day=1)
+        assert self._summaries(tenant) == {
+            (month, "paid", Decimal("19.00")): (1, 1, Decimal("200.00"), Decimal("38.00")),
+        }
+
+
+class TestValidatorClient:
+    @pytest.fixture(autouse=True)
+    def without_prevalidation(self, settings):
+        # Transport-Tests schicken Minimal-XML, das die Vorprüfung ablehnen würde
+        settings.XRECHNUNG_PREVALIDATION = False
+
+    def test_reuses_pooled_connection(self, fake_validator):
+        from apps.invoices.validator import validate_xrechnung
+
+        results = [validate_xrechnung("<Invoice/>") for _ in range(3)]
+
+        assert all(result.is_valid for result in results)
+        assert len(fake_validator.requests) == 3
+        assert len(fake_validator.clients) == 1
+
+    def test_parses_failed_asserts(self, fake_validator):
+        from conftest import INVALID_REPORT
+        from apps.invoices.validator import validate_xrechnung
+
+        fake_validator.default = (406, INVALID_REPORT)
+
+        result = validate_xrechnung("<Invoice/>")
+
+        assert result.is_valid is False
+        assert result.errors[0].startswith("[BR-DE-15]")
+
+    def test_retries_transient_errors(self, fake_validator):
+        from apps.invoices.validator import validate_xrechnung
+
+        fake_validator.responses = [(503, b"busy")]
+
+        assert validate_xrechnung("<Invoice/>").is_valid
+        assert len(fake_validator.requests) == 2
+
+    def test_circuit_breaker_skips_dead_validator(self, settings, fake_validator):
+        from apps.invoices.validator import validate_xrechnung
+
+        settings.VALIDATOR_RETRIES = 0
+        settings.VALIDATOR_CIRCUIT_FAILURES = 2
+        fake_validator.default = (503, b"down")
+
+        validate_xrechnung("<Invoice/>")
+        validate_xrechnung("<Invoice/>")
+        result = validate_xrechnung("<Invoice/>")
+
+        assert len(fake_validator.requests) == 2
+        assert result.warnings == ["Validator nicht erreichbar - Validierung übersprungen"]
+
+    def test_stream_holds_slot_and_counts_read_errors(self, settings, fake_validator):
+        import requests
+        from unittest import mock
+        from apps.invoices.validator import get_validator_client, validate_xrechnung
+
+        settings.VALIDATOR_MAX_CONNECTIONS = 2
+        client = get_validator_client()
+        free_slots = []
+
+        def broken_read(response, *args, **kwargs):
+            free_slots.append(client._slots._value)
+            raise requests.exceptions.ChunkedEncodingError("Verbindung abgebrochen")
+
+        with mock.patch.object(requests.Response, "iter_content", broken_read):
+            result = validate_xrechnung("<Invoice/>", client=client)
+
+        assert free_slots == [1]  # Slot während des Lesens belegt
+        assert client._slots._value == 2
+        assert client.breaker.failures == 1
+        assert result.warnings == ["Validator nicht erreichbar - Validierung übersprungen"]
+
+    def test_half_open_breaker_admits_single_probe(self):
+        from unittest import mock
+        from apps.invoices.validator import CircuitBreaker
+
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+        with mock.patch("apps.invoices.validator.time.monotonic", return_value=100.0):
+            breaker.record_failure()
+        assert breaker.opened_at == 100.0
+
+        with mock.patch("apps.invoices.validator.time.monotonic", return_value=140.0):
+            assert breaker.allow() is True
+            assert breaker.allow() is False  # Probeaufruf unterwegs
+            assert breaker.is_open is True
+
+            breaker.record_failure()  # Probe fehlgeschlagen: wieder offen
+            assert breaker.allow() is False
+
+        with mock.patch("apps.invoices.validator.time.monotonic", return_value=175.0):
+            assert breaker.allow() is True
+            breaker.record_success()
+            assert breaker.allow() is True
+            assert breaker.allow() is True
+            assert breaker.is_open is False
+
+    def test_health(self, fake_validator):
+        from apps.invoices.validator import check_validator_health
+
+        assert check_validator_health() is True
+
+    def test_stream_parser_handles_split_chunks(self):
+        from conftest import INVALID_REPORT
+        from apps.invoices.validator import _parse_report_stream
+
+        chunks = [INVALID_REPORT[i:i + 7] for i in range(0, len(INVALID_REPORT), 7)]
+        result = _parse_report_stream(chunks)
+
+        assert result.is_valid is False
+        assert result.cacheable is True
+        assert result.errors == ['[BR-DE-15] Das Element "Buyer reference" (BT-10) muss übermittelt werden.']
+
+    def test_stream_parser_large_report(self):
+        from apps.invoices.management.commands.benchmark_validator_reports import synthetic_report
+        from apps.invoices.validator import _parse_report_stream
+
+        result = _parse_report_stream([synthetic_report(500)])
+
+        assert len(result.errors) == 500
+        assert result.errors[-1].startswith("[BR-CO-19] Befund 499")
+        assert result.warnings == ["Hinweis"]
+
+    def test_truncated_report_is_not_cacheable(self):
+        from conftest import INVALID_REPORT
+        from apps.invoices.validator import _parse_report_stream
+
+        result = _parse_report_stream([INVALID_REPORT[:-20]])
+
+        assert result.is_valid is False
+        assert result.cacheable is False
+
+    def test_report_benchmark_command(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        out = StringIO()
+        call_command("benchmark_validator_reports", asserts=50, repeat=1, stdout=out)
+
+        assert "Stream (pull)" in out.getvalue()
+
+
+class TestValidationCache:
+    def test_repeated_validation_uses_cache(self, api_client, finalized_invoice, fake_validator):
+        first = api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+        second = api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        assert first.data == second.data
+        assert len(fake_validator.requests) == 1
+
+        invoice = api_client.get(f"/api/invoices/{finalized_invoice.id}/").data
+        assert invoice["validation"]["is_valid"] is True
+
+    def test_unavailable_validator_is_not_cached(self, settings, api_client, finalized_invoice, fake_validator):
+        from apps.invoices.models import ValidationRecord
+
+        settings.VALIDATOR_RETRIES = 0
+        fake_validator.default = (503, b"down")
+
+        api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        assert not ValidationRecord.objects.exists()
+
+    def test_new_validator_version_invalidates_cache(self, settings, api_client, finalized_invoice, fake_validator):
+        from django.core.cache import cache
+
+        from apps.invoices.models import ValidationRecord
+        from apps.invoices.validator_status import STATUS_CACHE_KEY, probe_validator_health
+
+        status = probe_validator_health()
+        api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        record = ValidationRecord.objects.get()
+        assert record.validator_version == f"{settings.VALIDATOR_VERSION}@1.5.0"
+
+        # Neues Validator-Image beim Deploy, VALIDATOR_VERSION unverändert
+        cache.set(STATUS_CACHE_KEY, {**status, "version": "1.6.0"})
+        api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        assert len(fake_validator.requests) == 2
+        assert ValidationRecord.objects.count() == 2
+
+    def test_rejected_xrechnung_is_not_sent(self, api_client, finalized_invoice, fake_validator, mailoutbox):
+        from conftest import INVALID_REPORT
+
+        fake_validator.default = (406, INVALID_REPORT)
+
+        response = api_client.post(f"/api/invoices/{finalized_invoice.id}/send_email/")
+
+        assert response.status_code == 400
+        assert response.data["errors"][0].startswith("[BR-DE-15]")
+        assert mailoutbox == []
+
+    def test_archive_check_reports_validation(self, api_client, finalized_invoice, fake_validator):
+        from apps.invoices.tasks import archive_invoice_task
+
+        archive_invoice_task.apply(args=[finalized_invoice.id])
+
+        response = api_client.get(f"/api/invoices/{finalized_invoice.id}/verify/")
+
+        assert response.data["details"]["xrechnung"]["is_valid"] is True
+        assert len(fake_validator.requests) == 1
+
+
+@pytest.mark.django_db
+class TestBatchValidation:
+    @pytest.fixture
+    def final_invoices(self, tenant, customer, user):
+        invoices = []
+        for number in range(3):
+            invoice = Invoice.objects.create(
+                tenant=tenant,
+                invoice_number=f"RE-B-{number:04d}",
+                customer=customer,
+                invoice_date=timezone.now().date(),
+                due_date=timezone.now().date(),
+                status="final",
+                format="xrechnung",
+                buyer_reference="PO-4711",
+                created_by=user,
+            )
+            InvoiceItem.objects.create(
+                invoice=invoice, description="Leistung",
+                quantity=Decimal("1"), unit_price=Decimal("100.00"),
+            )
+            invoice.calculate_totals()
+            invoice.save()
+            invoices.append(invoice)
+        return invoices
+
+    def test_report_counts_rules(self, api_client, final_invoices, fake_validator):
+        from conftest import INVALID_REPORT
+
+        fake_validator.default = (406, INVALID_REPORT)
+
+        response = api_client.post("/api/invoices/validate_batch/", {}, format="json")
+
+        assert response.status_code == 200
+        assert response.data["total"] == 3
+        assert response.data["invalid"] == 3
+        assert response.data["rules"] == [{"rule": "BR-DE-15", "count": 3}]
+        assert len(fake_validator.requests) == 3
+
+    def test_second_run_uses_stored_results(self, api_client, final_invoices, fake_validator):
+        ids = [invoice.id for invoice in final_invoices[:2]]
+
+        api_client.post("/api/invoices/validate_batch/", {"ids": ids}, format="json")
+        response = api_client.post("/api/invoices/validate_batch/", {"ids": ids}, format="json")
+
+        assert response.data["total"] == response.data["cached"] == 2
+        assert response.data["valid"] == 2
+        assert len(fake_validator.requests) == 2
+
+        invoice = api_client.get(f"/api/invoices/{ids[0]}/").data
+        assert invoice["validation"]["is_valid"] is True
+
+    @pytest.mark.parametrize("params", [{"ids": ["abc"]}, {"ids": "1"}, {"from": "gestern"}, {"status": "foo"}])
+    def test_invalid_selection_rejected(self, api_client, final_invoices, params):
+        response = api_client.post("/api/invoices/validate_batch/", params, format="json")
+        assert response.status_code == 400
+        assert set(params) <= set(response.data)
+
+        job = api_client.post("/api/invoices/export-jobs/", {"kind": "validation", "params": params}, format="json")
+        assert job.status_code == 400
+        assert "params" in job.data
+
+    def test_large_batch_runs_as_job(self, settings, api_client, final_invoices, fake_validator, tmp_path):
+        import json
+        from apps.invoices.tasks import run_export_job_task
+
+        settings.MEDIA_ROOT = tmp_path
+        settings.VALIDATION_BATCH_SYNC_LIMIT = 2
+
+        response = api_client.post("/api/invoices/validate_batch/", {}, format="json")
+
+        assert response.status_code == 202
+        assert response.data["kind"] == "validation"
+
+        run_export_job_task.apply(args=[response.data["id"]])
+
+        url = f"/api/invoices/export-jobs/{response.data['id']}/"
+        job = api_client.get(url).data
+        assert job["status"] == "done"
+        assert job["processed_rows"] == 3
+
+        download = api_client.get(url + "download/")
+        assert download["Content-Type"] == "application/json"
+        report = json.loads(b"".join(download.streaming_content))
+        assert report["valid"] == 3
+
+
+@pytest.mark.django_db
+class TestPrevalidation:
+    def _xml(self, invoice):
+        from apps.invoices.xrechnung import generate_xrechnung
+
+        return generate_xrechnung(invoice)
+
+    def test_complete_invoice_passes(self, finalized_invoice):
+        from apps.invoices.prevalidation import prevalidate
+
+        result = prevalidate(self._xml(finalized_invoice))
+
+        assert result.is_valid, result.errors
+
+    def test_missing_buyer_reference_skips_validator(self, api_client, finalized_invoice, fake_validator):
+        Invoice.objects.filter(pk=finalized_invoice.pk).update(buyer_reference="")
+
+        response = api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        assert response.data["is_valid"] is False
+        assert response.data["errors"][0].startswith("[BR-DE-15]")
+        assert fake_validator.requests == []
+
+    def test_rejection_is_not_stored(self, api_client, finalized_invoice, fake_validator):
+        from apps.invoices.models import ValidationRecord
+
+        Invoice.objects.filter(pk=finalized_invoice.pk).update(buyer_reference="")
+
+        api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+        response = api_client.post("/api/invoices/validate_batch/", {}, format="json")
+
+        # Gespeicherte Ergebnisse gelten je KoSIT-Version, nicht für die Vorprüfung
+        assert not ValidationRecord.objects.exists()
+        assert response.data["invalid"] == 1
+        assert fake_validator.requests == []
+
+    def test_inconsistent_totals(self, finalized_invoice):
+        from apps.invoices.prevalidation import prevalidate
+
+        finalized_invoice.total = Decimal("999.00")
+        errors = prevalidate(self._xml(finalized_invoice)).errors
+
+        assert any(error.startswith("[BR-CO-15]") for error in errors)
+
+    def test_vat_breakdown_and_code_lists(self, finalized_invoice):
+        from apps.invoices.prevalidation import prevalidate
+
+        xml = (self._xml(finalized_invoice)
+               .replace("<ram:BasisAmount>200.00", "<ram:BasisAmount>150.00")
+               .replace(">EUR<", ">XYZ<"))
+        rules = {error.split("]")[0][1:] for error in prevalidate(xml).errors}
+
+        assert {"BR-S-08", "BR-S-09", "BR-CL-04"} <= rules
+
+
+@pytest.mark.django_db
+class TestAsyncValidation:
+    def _get(self, url, user=None):
+        from asgiref.sync import async_to_sync
+        from django.test import AsyncClient
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"} if user else {}
+        return async_to_sync(AsyncClient().get)(url, headers=headers)
+
+    def test_validate_uses_cache(self, user, finalized_invoice, fake_validator):
+        url = f"/api/invoices/async/{finalized_invoice.id}/validate/"
+
+        first = self._get(url, user)
+        second = self._get(url, user)
+
+        assert first.status_code == 200
+        assert first.json() == second.json() == {"is_valid": True, "errors": [], "warnings": []}
+        assert len(fake_validator.requests) == 1
+
+        finalized_invoice.refresh_from_db()
+        assert finalized_invoice.validation.is_valid is True
+
+    def test_requires_authentication(self, finalized_invoice):
+        response = self._get(f"/api/invoices/async/{finalized_invoice.id}/validate/")
+
+        assert response.status_code == 401
+
+    def test_other_tenant_not_found(self, finalized_invoice, fake_validator):
+        other_tenant = Tenant.objects.create(name="Andere GmbH", slug="andere")
+        other = User.objects.create_user(username="other", password="x", tenant=other_tenant)
+
+        response = self._get(f"/api/invoices/async/{finalized_invoice.id}/validate/", other)
+
+        assert response.status_code == 404
+
+    def test_validator_status(self, user, fake_validator):
+        response = self._get("/api/invoices/async/validator-status/", user)
+
+        assert response.json()["validator_available"] is True
+        assert response.json()["version"] == "1.5.0"
+
+    def test_clients_closed_per_request_under_wsgi(self, user, finalized_invoice, fake_validator):
+        from unittest import mock
+        from django.test import Client
+        from rest_framework_simplejwt.tokens import AccessToken
+        from apps.invoices.validator import AsyncValidatorClient
+
+        headers = {"Authorization": f"Bearer {AccessToken.for_user(user)}"}
+        with mock.patch.object(AsyncValidatorClient, "aclose", autospec=True) as aclose:
+            response = Client().get(f"/api/invoices/async/{finalized_invoice.id}/validate/", headers=headers)
+
+        assert response.status_code == 200
+        assert aclose.call_count == 1
+
+    def test_clients_pooled_under_asgi(self, user, finalized_invoice, fake_validator):
+        from unittest import mock
+        from apps.invoices.validator import AsyncValidatorClient
+
+        with mock.patch.object(AsyncValidatorClient, "aclose", autospec=True) as aclose:
+            response = self._get(f"/api/invoices/async/{finalized_invoice.id}/validate/", user)
+
+        assert response.status_code == 200
+        aclose.assert_not_called()
+
+    def test_async_clients_rebuilt_when_settings_change(self, settings):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from apps.invoices.validator import get_async_validator_client
+
+        settings.VALIDATOR_URLS = ["http://validator-a:8080"]
+
+        async def switch():
+            old = get_async_validator_client()
+            assert get_async_validator_client() is old
+
+            settings.VALIDATOR_URLS = ["http://validator-b:8080"]
+            new = get_async_validator_client()
+            await asyncio.sleep(0)  # Schließen läuft als Task auf der Loop
+            return old, new
+
+        old, new = async_to_sync(switch)()
+
+        assert new.base_url == "http://validator-b:8080"
+        assert old.http.is_closed
+        assert not new.http.is_closed
+
+    def test_concurrent_validations_share_one_loop(self, settings, fake_validator):
+        import asyncio
+        from asgiref.sync import async_to_sync
+        from conftest import INVALID_REPORT
+        from apps.invoices.validator import avalidate_xrechnung
+
+        settings.XRECHNUNG_PREVALIDATION = False
+        fake_validator.default = (406, INVALID_REPORT)
+
+        async def validate_many():
+            return await asyncio.gather(*(avalidate_xrechnung(f"<Invoice n='{i}'/>") for i in range(20)))
+
+        results = async_to_sync(validate_many)()
+
+        assert len(fake_validator.requests) == 20
+        assert all(result.errors[0].startswith("[BR-DE-15]") for result in results)
+
+
+@pytest.mark.django_db
+class TestValidatorHealthMonitor:
+    def test_probe_stores_status(self, fake_validator):
+        from apps.invoices.tasks import probe_validator_health_task
+        from apps.invoices.validator_status import validator_status
+
+        probe_validator_health_task.apply()
+
+        status = validator_status()
+        assert status["available"] is True
+        assert status["version"] == "1.5.0"
+        assert status["latency_ms"] >= 0
+        assert status["instances"][0]["url"] == fake_validator.url
+
+    def test_endpoint_reads_cached_status(self, api_client, fake_validator):
+        from unittest import mock
+        from apps.invoices import validator_status as monitor
+
+        monitor.probe_validator_health()
+
+        with mock.patch.object(monitor, "probe_validator_health") as probe, \
+                mock.patch("apps.invoices.views.probe_validator_health", probe):
+            response = api_client.get("/api/invoices/validator_status/")
+
+        probe.assert_not_called()
+        assert response.data["validator_available"] is True
+        assert response.data["version"] == "1.5.0"
+
+    def test_endpoint_probes_without_monitor(self, api_client, fake_validator):
+        response = api_client.get("/api/invoices/validator_status/")
+
+        assert response.data["validator_available"] is True
+        assert response.data["checked_at"]
+
+    def test_known_down_skips_validation(self, settings, api_client, finalized_invoice, fake_validator):
+        from apps.invoices.models import ValidationRecord
+        from apps.invoices.validator_status import probe_validator_health
+
+        settings.VALIDATOR_URL = "http://127.0.0.1:9"  # nichts erreichbar
+        probe_validator_health()
+        settings.VALIDATOR_URL = fake_validator.url
+
+        response = api_client.get(f"/api/invoices/{finalized_invoice.id}/validate/")
+
+        assert response.data["is_valid"] is True
+        assert response.data["warnings"] == ["Validator nicht erreichbar - Validierung übersprungen"]
+        assert fake_validator.requests == []
+        assert not ValidationRecord.objects.exists()
+
+
+class TestEmailOutbox:
+    def test_send_email_is_queued(self, api_client, finalized_invoice, fake_validator,
+                                  mailoutbox, django_capture_on_commit_callbacks):
+        from unittest import mock
+
+        with mock.patch("apps.invoices.tasks.send_outbound_email_task.delay") as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(f"/api/invoices/{finalized_invoice.id}/send_email/")
+
+        assert response.status_code == 202
+        assert response.data["invoice"]["email_status"] == "queued"
+        assert response.data["invoice"]["status"] == "final"
+        delay.assert_called_once_with(response.data["outbound_email"]["id"])
+        assert mailoutbox == []
+
+    def test_task_delivers_and_marks_sent(self, api_client, finalized_invoice, fake_validator, mailoutbox):
+        from apps.invoices.outbox import enqueue_invoice_email
+        from apps.invoices.tasks import send_outbound_email_task
+
+        email = enqueue_invoice_email(finalized_invoice, "kunde@example.com")
+        send_outbound_email_task.apply(args=[email.id])
+
+        email.refresh_from_db()
+        finalized_invoice.refresh_from_db()
+        assert email.status == "sent"
+        assert email.attempts == 1
+        assert finalized_invoice.status == "sent"
+        assert finalized_invoice.email_status == "sent"
+        assert len(mailoutbox) == 1
+        assert mailoutbox[0].attachments[0][0].endswith(".xml")
+
+        outbox = api_client.get("/api/invoices/outbox/", {"invoice": finalized_invoice.id}).data
+        assert [item["status"] for item in outbox["results"]] == ["sent"]
+
+    def test_smtp_failure_is_retried(self, settings, finalized_invoice, fake_validator):
+        from unittest import mock
+        from apps.invoices.outbox import claim, deliver, enqueue_invoice_email
+
+        settings.EMAIL_OUTBOX_MAX_ATTEMPTS = 2
+        email = enqueue_invoice_email(finalized_invoice, "kunde@example.com")
+
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=OSError("SMTP down")):
+            assert deliver(claim(email.id)) == "queued"
+            # Backoff: noch nicht wieder fällig
+            assert claim(email.id) is None
+
+            email.refresh_from_db()
+            email.next_attempt_at = email.created_at
+            email.save()
+            assert deliver(claim(email.id)) == "failed"
+
+        email.refresh_from_db()
+        finalized_invoice.refresh_from_db()
+        assert email.attempts == 2
+        assert "SMTP down" in email.last_error
+        assert finalized_invoice.status == "final"
+        assert finalized_invoice.email_status == "failed"
+
+    def test_payment_during_delivery_is_kept(self, api_client, finalized_invoice, fake_validator):
+        from apps.invoices.models import InvoiceSummary
+        from apps.invoices.outbox import claim, deliver, enqueue_invoice_email
+
+        email = claim(enqueue_invoice_email(finalized_invoice, "kunde@example.com").id)
+        api_client.post(f"/api/invoices/{finalized_invoice.id}/mark_paid/")
+
+        assert deliver(email) == "sent"
+
+        finalized_invoice.refresh_from_db()
+        assert finalized_invoice.status == "paid"
+        assert finalized_invoice.email_status == "sent"
+        assert set(InvoiceSummary.objects.filter(invoice_count__gt=0).values_list("status", flat=True)) == {"paid"}
+
+    def test_claim_is_exclusive(self, finalized_invoice):
+        from apps.invoices.outbox import claim, enqueue_invoice_email
+
+        email = enqueue_invoice_email(finalized_invoice, "kunde@example.com")
+
+        assert claim(email.id) is not None
+        assert claim(email.id) is None
+
+    def test_reminder_is_queued_then_sent(self, api_client, finalized_invoice, mailoutbox,
+                                          django_capture_on_commit_callbacks):
+        from unittest import mock
+        from apps.invoices.tasks import send_outbound_email_task
+
+        with mock.patch("apps.invoices.tasks.send_outbound_email_task.delay"):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post(f"/api/invoices/{finalized_invoice.id}/reminders/", {"fee": "5.00"})
+
+        assert response.status_code == 202
+        assert response.data["reminder"]["delivery_status"] == "queued"
+
+        send_outbound_email_task.apply(args=[response.data["outbound_email"]["id"]])
+
+        reminders = api_client.get(f"/api/invoices/{finalized_invoice.id}/reminders/").data
+        assert [(r["level"], r["delivery_status"]) for r in reminders] == [(1, "sent")]
+        assert mailoutbox[0].subject.endswith(f"Rechnung {finalized_invoice.invoice_number}")
+
+    def test_failed_reminder_does_not_raise_level(self, api_client, finalized_invoice):
+        from apps.invoices.models import Reminder
+
+        Reminder.objects.create(invoice=finalized_invoice, level=1, sent_to="kunde@example.com",
+                                delivery_status="failed")
+
+        response = api_client.post(f"/api/invoices/{finalized_invoice.id}/reminders/")
+
+        assert response.data["reminder"]["level"] == 1
+
+
+class TestBulkEmailSending:
+    @pytest.fixture
+    def queued_emails(self, finalized_invoice, fake_validator):
+        from apps.invoices.outbox import enqueue_invoice_email
+
+        return [enqueue_invoice_email(finalized_invoice, f"kunde{i}@example.com") for i in range(3)]
+
+    def test_batch_reuses_one_connection(self, queued_emails, mailoutbox):
+        from unittest import mock
+        from django.core.mail import get_connection
+        from apps.invoices.outbox import send_batch
+
+        with mock.patch("apps.invoices.smtp_pool.get_connection", wraps=get_connection) as connect:
+            counts = send_batch([email.id for email in queued_emails])
+
+        assert counts["sent"] == 3
+        assert connect.call_count == 1
+        assert len(mailoutbox) == 3
+
+    def test_reconnects_after_disconnect(self, queued_emails):
+        import smtplib
+        from unittest import mock
+        from django.core.mail import get_connection
+        from apps.invoices.outbox import send_batch
+
+        with mock.patch("apps.invoices.smtp_pool.get_connection", wraps=get_connection) as connect, \
+                mock.patch("django.core.mail.backends.locmem.EmailBackend.send_messages",
+                           side_effect=[smtplib.SMTPServerDisconnected("bye"), 1, 1, 1]):
+            counts = send_batch([email.id for email in queued_emails])
+
+        assert counts["sent"] == 3
+        assert connect.call_count == 2
+
+    def test_tenant_rate_limit_defers(self, settings, queued_emails, mailoutbox):
+        from apps.invoices.models import OutboundEmail
+        from apps.invoices.outbox import send_batch
+
+        settings.EMAIL_RATE_LIMIT_PER_TENANT = 2
+        counts = send_batch([email.id for email in queued_emails])
+
+        assert counts == {"sent": 2, "queued": 1, "failed": 0, "skipped": 0}
+        deferred = OutboundEmail.objects.get(status="queued")
+        assert deferred.attempts == 0
+        assert len(mailoutbox) == 2
+
+    def test_provider_rate_limit_applies_across_tenants(self, settings):
+        from apps.invoices.smtp_pool import acquire_send_slot
+
+        settings.EMAIL_RATE_LIMIT_PER_TENANT = 0
+        settings.EMAIL_RATE_LIMIT_PER_PROVIDER = 2
+
+        assert acquire_send_slot(1) == (0, "")
+        assert acquire_send_slot(2) == (0, "")
+        delay, limit = acquire_send_slot(3)
+        assert delay > 0
+        assert limit == "provider"
+
+    def test_provider_limit_ends_batch(self, settings, queued_emails):
+        from unittest import mock
+        from apps.invoices import outbox
+        from apps.invoices.models import OutboundEmail
+
+        settings.EMAIL_RATE_LIMIT_PER_TENANT = 0
+        settings.EMAIL_RATE_LIMIT_PER_PROVIDER = 1
+
+        with mock.patch.object(outbox, "claim", wraps=outbox.claim) as claim:
+            counts = outbox.send_batch([email.id for email in queued_emails])
+
+        assert counts == {"sent": 1, "queued": 1, "failed": 0, "skipped": 1}
+        assert claim.call_count == 2
+        assert OutboundEmail.objects.filter(status="queued", attempts=0).count() == 2
+
+    def test_flush_dispatches_batches(self, settings, queued_emails):
+        from unittest import mock
+        from apps.invoices.tasks import flush_outbox_task
+
+        settings.EMAIL_BATCH_SIZE = 2
+        with mock.patch("apps.invoices.tasks.send_outbox_batch_task.delay") as delay:
+            assert flush_outbox_task.apply().get() == 3
+
+        assert [len(call.args[0]) for call in delay.call_args_list] == [2, 1]
+
+
+class TestBulkSendAndDunning:
+    @pytest.fixture
+    def overdue_invoices(self, tenant, customer, user):
+        from datetime import date
+
+        return [
+            Invoice.objects.create(
+                tenant=tenant,
+                invoice_number=f"RE-2024-{i:04d}",
+                customer=customer,
+                invoice_date=date(2024, 1, i),
+                due_date=date(2024, 1, 14 + i),
+                status="sent",
+                format="zugferd",
+                created_by=user,
+            )
+            for i in range(1, 4)
+        ]
+
+    def test_send_bulk_queues_final_invoices(self, api_client, finalized_invoice, invoice,
+                                             django_capture_on_commit_callbacks):
+        from unittest import mock
+
+        with mock.patch("apps.invoices.tasks.send_outbox_batch_task.delay") as delay:
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post("/api/invoices/send_bulk/", {}, format="json")
+
+        assert response.status_code == 202
+        assert response.data["count"] == 1
+        delay.assert_called_once()
+
+        finalized_invoice.refresh_from_db()
+        assert finalized_invoice.email_status == "queued"
+
+        # Bereits eingereiht: kein zweiter Versand
+        again = api_client.post("/api/invoices/send_bulk/", {"dry_run": True}, format="json")
+        assert again.data["count"] == 0
+
+    def test_concurrent_selection_queues_once(self, tenant, finalized_invoice):
+        from apps.invoices.bulk_send import enqueue_invoice_emails, select_for_sending
+        from apps.invoices.models import OutboundEmail
+
+        # Beide Läufe haben ihre Auswahl vor dem ersten Einreihen gebildet
+        first, second = select_for_sending(tenant, {}), select_for_sending(tenant, {})
+
+        assert enqueue_invoice_emails(first)[1] == 1
+        assert enqueue_invoice_emails(second)[1] == 0
+        assert OutboundEmail.objects.filter(invoice=finalized_invoice).count() == 1
+
+    @pytest.mark.parametrize("url,data", [
+        ("/api/invoices/send_bulk/", {"ids": ["abc"]}),
+        ("/api/invoices/send_bulk/", {"ids": "1,2"}),
+        ("/api/invoices/send_bulk/", {"customer": "x"}),
+        ("/api/invoices/send_bulk/", {"from": "gestern"}),
+        ("/api/invoices/dunning_run/", {"level": "zwei"}),
+        ("/api/invoices/dunning_run/", {"level": 4}),
+        ("/api/invoices/dunning_run/", {"fee": "-5"}),
+    ])
+    def test_invalid_selection_rejected(self, api_client, finalized_invoice, url, data):
+        response = api_client.post(url, data, format="json")
+
+        assert response.status_code == 400
+        assert set(data) <= set(response.data)
+
+    def test_dunning_run_uses_next_level(self, api_client, overdue_invoices):
+        from apps.invoices.models import Reminder
+
+        first, second, third = overdue_invoices
+        Reminder.objects.create(invoice=second, level=1, sent_to="kunde@example.com", delivery_status="sent")
+        Reminder.objects.create(invoice=third, level=3, sent_to="kunde@example.com", delivery_status="sent")
+
+        response = api_client.post("/api/invoices/dunning_run/", {"dry_run": True}, format="json")
+
+        levels = {row["invoice_number"]: row["next_level"] for row in response.data["invoices"]}
+        assert levels == {first.invoice_number: 1, second.invoice_number: 2}
+
+    def test_dunning_run_sends_and_reports_progress(self, api_client, overdue_invoices, mailoutbox,
+                                                    django_capture_on_commit_callbacks):
+        from unittest import mock
+        from apps.invoices.models import Reminder
+        from apps.invoices.tasks import send_outbox_batch_task
+
+        with mock.patch("apps.invoices.tasks.send_outbox_batch_task.delay",
+                        side_effect=lambda ids: send_outbox_batch_task.apply(args=[ids])):
+            with django_capture_on_commit_callbacks(execute=True):
+                response = api_client.post("/api/invoices/dunning_run/", {"fee": "5.00", "level": 1},
+                                           format="json")
+
+        assert response.status_code == 202
+        assert response.data["count"] == 3
+        assert len(mailoutbox) == 3
+        assert set(Reminder.objects.values_list("level", "delivery_status", "fee")) == {(1, "sent", Decimal("5.00"))}
+
+        progress = api_client.get("/api/invoices/outbox/progress/", {"run_id": response.data["run_id"]}).data
+        assert progress["total"] == 3
+        assert progress["sent"] == 3
+        assert progress["progress_percent"] == 100.0
+
+        # Wartende bzw. versendete Stufe 1 ist erledigt, nächster Lauf bietet Stufe 2 an
+        again = api_client.post("/api/invoices/dunning_run/", {"dry_run": True, "level": 1}, format="json")
+        assert again.data["count"] == 0
+
+    def test_dunning_selection_is_one_query(self, tenant, overdue_invoices, django_assert_num_queries):
+        from apps.invoices.bulk_send import select_for_dunning
+
+        with django_assert_num_queries(1):
+            rows = list(select_for_dunning(tenant, {}).values_list("id", "reminder_level"))
+
+        assert len(rows) == 3
+
+
+class TestDunningScheduler:
+    @pytest.fixture
+    def overdue_invoice(self, tenant, customer, user):
+        from datetime import timedelta
+
+        today = timezone.localdate()
+        return Invoice.objects.create(
+            tenant=tenant,
+            invoice_number="RE-2025-0100",
+            customer=customer,
+            invoice_date=today - timedelta(days=40),
+            due_date=today - timedelta(days=10),
+            status="sent",
+            format="zugferd",
+            created_by=user,
+        )
+
+    def test_waiting_period_and_tenant_overrides(self, settings, tenant, overdue_invoice):
+        from apps.invoices.dunning import dunning_fees, select_due
+
+        settings.DUNNING_WAITING_DAYS = {1: 14, 2: 14, 3: 14}
+        assert not select_due(tenant).exists()
+
+        tenant.dunning_waiting_days = {"1": 7}
+        tenant.dunning_fees = {"1": "2.50"}
+        assert list(select_due(tenant).values_list("id", flat=True)) == [overdue_invoice.id]
+        assert dunning_fees(tenant)[1] == Decimal("2.50")
+
+    def test_next_level_waits_for_previous_reminder(self, settings, tenant, overdue_invoice):
+        from datetime import timedelta
+        from apps.invoices.dunning import select_due
+        from apps.invoices.models import Reminder
+
+        settings.DUNNING_WAITING_DAYS = {1: 7, 2: 14, 3: 14}
+        reminder = Reminder.objects.create(invoice=overdue_invoice, level=1, sent_to="kunde@example.com",
+                                           delivery_status="sent")
+        assert not select_due(tenant).exists()
+
+        Reminder.objects.filter(pk=reminder.pk).update(sent_at=timezone.now() - timedelta(days=15))
+        assert list(select_due(tenant).values_list("reminder_level", flat=True)) == [1]
+
+    def test_run_enqueues_in_batches(self, settings, tenant, customer, user, overdue_invoice,
+                                     django_capture_on_commit_callbacks):
+        from unittest import mock
+        from apps.invoices.dunning import run_dunning
+        from apps.invoices.models import Reminder
+
+        settings.DUNNING_WAITING_DAYS = {1: 7, 2: 14, 3: 14}
+        settings.DUNNING_FEES = {1: "0.00", 2: "5.00"}
+        settings.DUNNING_BATCH_SIZE = 2
+        for i in range(2):
+            Invoice.objects.create(
+                tenant=tenant, invoice_number=f"RE-2025-02{i:02d}", customer=customer,
+                invoice_date=overdue_invoice.invoice_date, due_date=overdue_invoice.due_date,
+                status="final", created_by=user,
+            )
+
+        with mock.patch("apps.invoices.bulk_send.dispatch") as dispatch:
+            with django_capture_on_commit_callbacks(execute=True):
+                result = run_dunning(tenant)
+
+        assert result["count"] == 3
+        assert [len(call.args[0]) for call in dispatch.call_args_list] == [2, 1]
+        assert set(Reminder.objects.values_list("level", "fee", "delivery_status")) == {
+            (1, Decimal("0.00"), "queued")}
+
+        # Wartende Mahnungen: kein zweiter Lauf für dieselbe Stufe
+        assert run_dunning(tenant)["count"] == 0
+
+    def test_beat_task_only_for_enabled_tenants(self, tenant):
+        from unittest import mock
+        from apps.invoices.tasks import run_dunning_task
+
+        with mock.patch("apps.invoices.tasks.run_tenant_dunning_task.delay") as delay:
+            assert run_dunning_task.apply().get() == 0
+            tenant.dunning_enabled = True
+            tenant.save()
+            assert run_dunning_task.apply().get() == 1
+
+        delay.assert_called_once_with(tenant.id)
+
+
+class TestMailTemplates:
+    def test_default_template_renders_tenant_fragments(self, finalized_invoice):
+        from apps.invoices.mail_templates import render_invoice_mail
+
+        subject, body = render_invoice_mail(finalized_invoice)
+
+        assert subject == f"Rechnung {finalized_invoice.invoice_number} von Test GmbH"
+        assert f"Betrag: {finalized_invoice.total:.2f} €" in body
+        assert body.rstrip().endswith("E-Mail: rechnung@test-gmbh.de")
+
+    def test_reminder_fee_and_level_texts(self, finalized_invoice):
+        from apps.invoices.mail_templates import render_reminder_mail
+
+        subject, body = render_reminder_mail(finalized_invoice, 2, Decimal("5.00"))
+
+        assert subject.startswith("2. Mahnung")
+        assert "Mahngebühr: 5.00 €" in body
+        assert "Ratenzahlung" in body
+        assert "Mahngebühr" not in render_reminder_mail(finalized_invoice, 1)[1]
+
+    def test_tenant_override_via_api(self, api_client, finalized_invoice):
+        from apps.invoices.mail_templates import render_invoice_mail
+
+        response = api_client.post("/api/invoices/mail-templates/", {
+            "kind": "invoice",
+            "subject": "Ihre Rechnung {{ invoice.invoice_number }}",
+            "body": "Hallo & danke!\n\n{{ bank_details }}\n\n{{ signature }}",
+        }, format="json")
+        assert response.status_code == 201
+
+        subject, body = render_invoice_mail(finalized_invoice)
+        assert subject == f"Ihre Rechnung {finalized_invoice.invoice_number}"
+        assert body.startswith("Hallo & danke!")  # kein HTML-Escaping
+        assert "IBAN: -" in body
+
+        api_client.delete(f"/api/invoices/mail-templates/{response.data['id']}/")
+        assert render_invoice_mail(finalized_invoice)[1].startswith("Sehr geehrte Damen und Herren")
+
+    def test_invalid_template_is_rejected(self, api_client):
+        response = api_client.post("/api/invoices/mail-templates/", {
+            "kind": "reminder", "body": "{% if level %}offen",
+        }, format="json")
+
+        assert response.status_code == 400
+        assert "body" in response.data
+
+    def test_render_errors_rejected_on_save(self, api_client):
+        response = api_client.post("/api/invoices/mail-templates/", {
+            "kind": "reminder",
+            "body": '{% if level == 3 %}{% include "fehlt.txt" %}{% endif %}',
+        }, format="json")
+
+        assert response.status_code == 400
+        assert "fehlt.txt" in str(response.data["body"])
+
+    @pytest.mark.parametrize("tag", [
+        '{% include "admin/base.html" %}',
+        '{% extends "invoices/email/invoice_body.txt" %}',
+        '{% include "../../../../users/models.py" %}',
+    ])
+    def test_only_email_templates_can_be_included(self, api_client, tag):
+        response = api_client.post("/api/invoices/mail-templates/", {
+            "kind": "invoice", "body": tag,
+        }, format="json")
+
+        assert response.status_code == 400
+        assert "body" in response.data
+
+    def test_tenant_template_includes_email_fragment(self, api_client, finalized_invoice):
+        from apps.invoices.mail_templates import render_invoice_mail
+
+        response = api_client.post("/api/invoices/mail-templates/", {
+            "kind": "invoice", "body": 'Hallo\n{% include "signature.txt" %}',
+        }, format="json")
+
+        assert response.status_code == 201
+        assert "Test GmbH" in render_invoice_mail(finalized_invoice)[1]
+
+    def test_templates_see_plain_values_only(self, api_client, finalized_invoice):
+        from apps.invoices.mail_templates import render_invoice_mail
+
+        api_client.post("/api/invoices/mail-templates/", {
+            "kind": "invoice",
+            "body": "{{ invoice.invoice_number }}|{{ invoice.customer_name }}|"
+                    "{{ tenant.users.count }}|{{ invoice.items.all }}|{{ tenant.iban }}",
+        }, format="json")
+
+        body = render_invoice_mail(finalized_invoice)[1]
+        assert body == f"{finalized_invoice.invoice_number}|Kunde GmbH|||"
+
+    def test_broken_template_fails_delivery_permanently(self, finalized_invoice, fake_validator):
+        from unittest import mock
+        from apps.invoices.models import MailTemplate
+        from apps.invoices.outbox import claim, deliver, enqueue_invoice_email
+
+        MailTemplate.objects.create(
+            tenant=finalized_invoice.tenant, kind="invoice", body='{% include "fehlt.txt" %}')
+        email = enqueue_invoice_email(finalized_invoice, "kunde@example.com")
+
+        with mock.patch("apps.invoices.outbox.send_message") as send:
+            assert deliver(claim(email.id)) == "failed"
+
+        send.assert_not_called()
+        email.refresh_from_db()
+        assert "fehlt.txt" in email.last_error
+
+    def test_fragments_cached_until_tenant_changes(self, tenant, finalized_invoice):
+        from unittest import mock
+        from apps.invoices import mail_templates
+
+        mail_templates.render_invoice_mail(finalized_invoice)
+        with mock.patch.object(mail_templates, "mail_engine", wraps=mail_templates.mail_engine) as engine:
+            # Neu geladene Instanz trifft denselben Eintrag (Schlüssel: ID und updated_at)
+            mail_templates.tenant_fragments(type(tenant).objects.get(pk=tenant.pk))
+            assert engine.call_count == 0
+
+        tenant.iban = "DE89370400440532013000"
+        tenant.save()
+        assert "DE89370400440532013000" in mail_templates.tenant_fragments(tenant)["bank_details"]
+
+    def test_defaults_endpoint(self, api_client):
+        response = api_client.get("/api/invoices/mail-templates/defaults/")
+
+        assert "{{ signature }}" in response.data["reminder"]["body"]
@@ -1,8 +1,22 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import InvoiceViewSet, InvoiceItemViewSet
+from . import async_views
+from .views import (
+    ArchiveIndexViewSet, DatevExportRunViewSet, ExportJobViewSet, InvoiceViewSet, InvoiceItemViewSet,
+    MailTemplateViewSet, OutboundEmailViewSet,
+)
 
 router = DefaultRouter()
 router.register('items', InvoiceItemViewSet, basename='invoice-item')
+router.register('archive-index', ArchiveIndexViewSet, basename='archive-index')
+router.register('datev-exports', DatevExportRunViewSet, basename='datev-export')
+router.register('export-jobs', ExportJobViewSet, basename='export-job')
+router.register('outbox', OutboundEmailViewSet, basename='outbound-email')
+router.register('mail-templates', MailTemplateViewSet, basename='mail-template')
 router.register('', InvoiceViewSet, basename='invoice')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    # Async Varianten für ASGI (blockieren keinen Thread während der Validierung)
+    path('async/<int:pk>/validate/', async_views.validate, name='invoice-validate-async'),
+    path('async/validator-status/', async_views.validator_status, name='invoice-validator-status-async'),
+] + router.urls
\ No newline at end of file
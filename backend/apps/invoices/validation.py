@@ -0,0 +1,195 @@
+"""
+Validierungs-Cache für XRechnung
+- Ergebnisse werden je SHA-256(XML) + Validator-Version gespeichert (Version
+  aus VALIDATOR_VERSION und der vom Health-Monitor gemeldeten Version)
+- Identisches XML wird nicht erneut an den Validator geschickt
+- Die letzte Validierung wird an der Rechnung vermerkt
+"""
+
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError
+
+from .validator import ValidationResult, avalidate_xrechnung, validate_xrechnung
+
+
+class InvoiceNotValid(ValueError):
+    """XRechnung wurde vom Validator abgelehnt."""
+
+    def __init__(self, result: ValidationResult):
+        self.result = result
+        super().__init__("Rechnung ist nicht XRechnung-konform: " + "; ".join(result.errors[:3]))
+
+
+def _version_key(status: dict | None) -> str:
+    configured = getattr(settings, 'VALIDATOR_VERSION', '')
+    reported = status and status.get('version')
+    return f"{configured}@{reported}"[:100] if reported else configured
+
+
+def validator_version() -> str:
+    """
+    Version im Cache-Schlüssel: VALIDATOR_VERSION plus die vom Health-Monitor
+    gemeldete Version der laufenden Instanzen (validator_status).
+
+    Ein neues Validator-Image ergibt damit neue Schlüssel, auch wenn
+    VALIDATOR_VERSION nicht angepasst wurde. Ohne Monitor-Status gilt nur
+    VALIDATOR_VERSION und muss mit dem Image geändert werden.
+    """
+    from .validator_status import validator_status
+
+    return _version_key(validator_status())
+
+
+async def avalidator_version() -> str:
+    from .validator_status import avalidator_status
+
+    return _version_key(await avalidator_status())
+
+
+def xml_digest(xml_content: str | bytes) -> str:
+    if isinstance(xml_content, str):
+        xml_content = xml_content.encode('utf-8')
+    return hashlib.sha256(xml_content).hexdigest()
+
+
+def _as_result(record) -> ValidationResult:
+    return ValidationResult(
+        is_valid=record.is_valid,
+        errors=list(record.errors),
+        warnings=list(record.warnings),
+        cacheable=True,
+    )
+
+
+def _lookup_queryset(xml_content, version: str):
+    from .models import ValidationRecord
+
+    return ValidationRecord.objects.filter(
+        xml_hash=xml_digest(xml_content),
+        validator_version=version,
+    )
+
+
+def lookup_validation(xml_content: str | bytes, version: str = None):
+    """Gespeichertes Ergebnis für dieses XML (ohne Validator-Aufruf), sonst None."""
+    return _lookup_queryset(xml_content, version or validator_version()).first()
+
+
+def validate_cached(xml_content: str) -> tuple[ValidationResult, object]:
+    """
+    Validiert über den Cache.
+
+    Returns:
+        (Ergebnis, ValidationRecord oder None falls nicht cachebar,
+        z.B. weil der Validator nicht erreichbar war)
+    """
+    from .models import ValidationRecord
+
+    version = validator_version()
+    record = lookup_validation(xml_content, version)
+    if record:
+        return _as_result(record), record
+
+    result = validate_xrechnung(xml_content)
+    if not result.cacheable:
+        return result, None
+
+    try:
+        record, _ = ValidationRecord.objects.get_or_create(
+            xml_hash=xml_digest(xml_content),
+            validator_version=version,
+            defaults={
+                'is_valid': result.is_valid,
+                'errors': result.errors,
+                'warnings': result.warnings,
+            },
+        )
+    except IntegrityError:
+        # Parallel von einem anderen Prozess gespeichert
+        record = lookup_validation(xml_content, version)
+
+    return result, record
+
+
+def validate_invoice(invoice, xml_content: str = None) -> ValidationResult:
+    """Validiert die XRechnung einer Rechnung und vermerkt das Ergebnis an ihr."""
+    from .models import Invoice
+    from .xrechnung import generate_xrechnung
+
+    if xml_content is None:
+        xml_content = generate_xrechnung(invoice)
+
+    result, record = validate_cached(xml_content)
+
+    if record is not None and invoice.validation_id != record.pk:
+        # update() statt save(): updated_at bleibt unverändert (DATEV-Watermark)
+        Invoice.objects.filter(pk=invoice.pk).update(validation=record)
+        invoice.validation = record
+
+    return result
+
+
+def ensure_valid(invoice, xml_content: str = None) -> ValidationResult:
+    """
+    Wie validate_invoice, bricht aber bei abgelehntem XML ab.
+
+    Ist der Validator nicht erreichbar, wird nicht blockiert.
+
+    Raises:
+        InvoiceNotValid
+    """
+    result = validate_invoice(invoice, xml_content)
+    if not result.is_valid:
+        raise InvoiceNotValid(result)
+    return result
+
+
+# --- Async (ASGI) ---
+
+async def avalidate_cached(xml_content: str) -> tuple[ValidationResult, object]:
+    """Async-Variante von validate_cached (async ORM, httpx)."""
+    from .models import ValidationRecord
+
+    version = await avalidator_version()
+    record = await _lookup_queryset(xml_content, version).afirst()
+    if record:
+        return _as_result(record), record
+
+    result = await avalidate_xrechnung(xml_content)
+    if not result.cacheable:
+        return result, None
+
+    try:
+        record, _ = await ValidationRecord.objects.aget_or_create(
+            xml_hash=xml_digest(xml_content),
+            validator_version=version,
+            defaults={
+                'is_valid': result.is_valid,
+                'errors': result.errors,
+                'warnings': result.warnings,
+            },
+        )
+    except IntegrityError:
+        record = await _lookup_queryset(xml_content, version).afirst()
+
+    return result, record
+
+
+async def avalidate_invoice(invoice, xml_content: str = None) -> ValidationResult:
+    """Async-Variante von validate_invoice."""
+    from .models import Invoice
+    from .xrechnung import generate_xrechnung
+
+    if xml_content is None:
+        xml_content = await sync_to_async(generate_xrechnung)(invoice)
+
+    result, record = await avalidate_cached(xml_content)
+
+    if record is not None and invoice.validation_id != record.pk:
+        await Invoice.objects.filter(pk=invoice.pk).aupdate(validation=record)
+        invoice.validation = record
+
+    return result
@@ -0,0 +1,198 @@
+"""
+Massenvalidierung von XRechnungen
+- XML wird ohne weitere Queries erzeugt (Rechnungen vorab mit allen Relationen geladen)
+- Nur XML ohne gespeichertes Ergebnis geht an den Validator
+- Anfragen laufen parallel über alle Validator-Instanzen (Round-Robin)
+- Bericht mit Fehlerhäufigkeit je Regel (z.B. BR-DE-15)
+"""
+
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+
+from .validation import validator_version, xml_digest
+from .validator import get_validator_client, get_validator_clients, validate_xrechnung
+
+RULE_ID = re.compile(r'^\[([A-Za-z0-9_.\-]+)\]')
+
+UNKNOWN_RULE = 'sonstige'
+
+
+@dataclass
+class BatchReport:
+    total: int = 0
+    valid: int = 0
+    invalid: int = 0
+    skipped: int = 0  # Validator nicht erreichbar
+    cached: int = 0
+    rule_counts: Counter = field(default_factory=Counter)
+    invoices: list = field(default_factory=list)
+
+    def as_dict(self) -> dict:
+        return {
+            'total': self.total,
+            'valid': self.valid,
+            'invalid': self.invalid,
+            'skipped': self.skipped,
+            'cached': self.cached,
+            'rules': [
+                {'rule': rule, 'count': count}
+                for rule, count in self.rule_counts.most_common()
+            ],
+            'invoices': self.invoices,
+        }
+
+
+def rule_id(message: str) -> str:
+    match = RULE_ID.match(message)
+    return match.group(1) if match else UNKNOWN_RULE
+
+
+def batch_concurrency() -> int:
+    """Parallele Validierungen: Pool-Größe je Instanz mal Anzahl Instanzen."""
+    per_instance = getattr(settings, 'VALIDATOR_MAX_CONNECTIONS', 10)
+    return max(1, per_instance * len(get_validator_clients()))
+
+
+def select_invoices(tenant, params: dict):
+    """Rechnungen für die Massenvalidierung: ids oder Filter from/to/status."""
+    from django.utils.dateparse import parse_date
+
+    from .models import Invoice
+
+    invoices = Invoice.objects.filter(tenant=tenant).exclude(status='draft')
+
+    if params.get('ids'):
+        invoices = invoices.filter(pk__in=params['ids'])
+    if parse_date(params.get('from') or ''):
+        invoices = invoices.filter(invoice_date__gte=parse_date(params['from']))
+    if parse_date(params.get('to') or ''):
+        invoices = invoices.filter(invoice_date__lte=parse_date(params['to']))
+    if params.get('status'):
+        invoices = invoices.filter(status=params['status'])
+
+    return invoices
+
+
+def validate_batch(invoices, workers: int = None, progress=None) -> BatchReport:
+    """
+    Validiert viele Rechnungen.
+
+    Args:
+        invoices: QuerySet der Rechnungen (Entwürfe werden übersprungen)
+        workers: parallele Validator-Anfragen (Standard: batch_concurrency())
+        progress: wird mit der Anzahl fertig geprüfter Rechnungen bzw. Dokumente aufgerufen
+    """
+    from .models import Invoice, ValidationRecord
+    from .xrechnung import generate_xrechnung
+
+    invoices = list(
+        invoices.exclude(status='draft')
+        .select_related('tenant', 'customer')
+        .prefetch_related('items')
+        .order_by('invoice_date', 'invoice_number', 'id')
+    )
+    report = BatchReport(total=len(invoices))
+    if not invoices:
+        return report
+
+    workers = workers or batch_concurrency()
+    version = validator_version()
+
+    # 1. XML erzeugen (ohne weitere Queries, alles vorab geladen). Im Haupt-
+    #    thread: reine Python-Arbeit, Threads brächten wegen des GIL nichts.
+    xml_by_invoice = {invoice.pk: generate_xrechnung(invoice) for invoice in invoices}
+    hash_by_invoice = {pk: xml_digest(xml) for pk, xml in xml_by_invoice.items()}
+
+    # 2. Gespeicherte Ergebnisse in einer Query
+    records = {
+        record.xml_hash: record
+        for record in ValidationRecord.objects.filter(
+            xml_hash__in=set(hash_by_invoice.values()), validator_version=version)
+    }
+
+    # 3. Fehlendes XML (je Inhalt einmal) parallel über alle Instanzen validieren
+    pending = {}
+    for pk, digest in hash_by_invoice.items():
+        if digest not in records:
+            pending.setdefault(digest, xml_by_invoice[pk])
+
+    if progress and len(pending) < len(invoices):
+        progress(len(invoices) - len(pending))
+
+    clients = get_validator_clients()
+
+    def validate(job):
+        index, xml = job
+        client = clients[index % len(clients)]
+        if client.breaker.is_open:
+            client = get_validator_client()
+        return validate_xrechnung(xml, client=client)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='validation') as pool:
+        for digest, result in zip(pending, pool.map(validate, enumerate(pending.values()))):
+            results[digest] = result
+            if progress:
+                progress(1)
+
+    ValidationRecord.objects.bulk_create(
+        [
+            ValidationRecord(
+                xml_hash=digest,
+                validator_version=version,
+                is_valid=result.is_valid,
+                errors=result.errors,
+                warnings=result.warnings,
+            )
+            for digest, result in results.items()
+            if result.cacheable
+        ],
+        ignore_conflicts=True,
+    )
+    records.update({
+        record.xml_hash: record
+        for record in ValidationRecord.objects.filter(
+            xml_hash__in=list(results), validator_version=version)
+    })
+
+    # 4. Rechnungen verknüpfen (eine UPDATE-Query je Ergebnis) und Bericht
+    invoices_by_record = {}
+    for invoice in invoices:
+        digest = hash_by_invoice[invoice.pk]
+        record = records.get(digest)
+
+        if digest not in results:
+            report.cached += 1
+
+        if record is not None:
+            invoices_by_record.setdefault(record.pk, []).append(invoice.pk)
+            is_valid, errors, skipped = record.is_valid, record.errors, False
+        else:
+            result = results[digest]
+            is_valid, errors = result.is_valid, result.errors
+            skipped = not result.cacheable and result.is_valid
+
+        if skipped:
+            report.skipped += 1
+        elif is_valid:
+            report.valid += 1
+        else:
+            report.invalid += 1
+
+        report.rule_counts.update(rule_id(message) for message in errors)
+        report.invoices.append({
+            'id': invoice.pk,
+            'invoice_number': invoice.invoice_number,
+            'is_valid': is_valid,
+            'skipped': skipped,
+            'error_count': len(errors),
+        })
+
+    for record_pk, invoice_ids in invoices_by_record.items():
+        Invoice.objects.filter(pk__in=invoice_ids).update(validation_id=record_pk)
+
+    return report
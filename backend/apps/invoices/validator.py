@@ -1,15 +1,33 @@
 """
 XRechnung Validator Service
 Nutzt den Kosit Validator für offizielle Konformitätsprüfung
+
+Der Client hält einen Verbindungspool (Keep-Alive), begrenzt parallele
+Anfragen, wiederholt transiente Fehler mit Backoff und öffnet nach
+wiederholten Ausfällen einen Circuit Breaker, damit Requests nicht auf
+Timeouts eines toten Validators warten.
+
+Für ASGI gibt es async Varianten (avalidate_xrechnung, acheck_validator_health)
+auf Basis von httpx, die während des Validator-Aufrufs keinen Thread belegen.
 """
 import requests
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, Iterator
+import asyncio
+import itertools
+import json
 import logging
+import threading
+import time
+import weakref
 import xml.etree.ElementTree as ET
 
-logger = logging.getLogger(__name__)
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
-VALIDATOR_URL = "http://localhost:8081"
+logger = logging.getLogger(__name__)
 
 
 @dataclass
@@ -18,89 +36,652 @@ class ValidationResult:
     is_valid: bool
     errors: list[str]
     warnings: list[str]
+    # Nur vollständige Validator-Berichte dürfen gecacht werden
+    cacheable: bool = False
 
 
-def validate_xrechnung(xml_content: str) -> ValidationResult:
-    """Validiert XRechnung XML gegen den Kosit Validator."""
-    try:
-        response = requests.post(
-            VALIDATOR_URL,
-            data=xml_content.encode('utf-8'),
-            headers={'Content-Type': 'application/xml'},
-            timeout=30
+class ValidatorUnavailable(Exception):
+    """Validator nicht erreichbar oder Circuit Breaker offen."""
+
+
+class CircuitBreaker:
+    """
+    Einfacher Circuit Breaker (closed -> open -> half-open).
+
+    Nach failure_threshold Fehlern in Folge werden Aufrufe für reset_timeout
+    Sekunden sofort abgelehnt; danach darf genau ein Probeaufruf durch, bis
+    er Erfolg oder Fehler meldet. Meldet er sich nicht (Absturz), wird nach
+    weiteren reset_timeout Sekunden erneut ein Probeaufruf zugelassen.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probe_started_at = None
+        self._lock = threading.Lock()
+
+    def _blocked(self, now: float) -> bool:
+        """Offen oder Probeaufruf unterwegs (Lock muss gehalten werden)."""
+        if self.opened_at is None:
+            return False
+        if now - self.opened_at < self.reset_timeout:
+            return True
+        return self.probe_started_at is not None and now - self.probe_started_at < self.reset_timeout
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._blocked(time.monotonic())
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if self._blocked(now):
+                return False
+            # Half-open: nur dieser Aufruf, bei Fehler sofort wieder offen
+            self.probe_started_at = now
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probe_started_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self.probe_started_at = None
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning("Validator: Circuit Breaker geöffnet nach %s Fehlern", self.failures)
+                self.opened_at = time.monotonic()
+
+
+class ValidatorClient:
+    """HTTP-Client für den KoSIT Validator mit Pool, Retries und Circuit Breaker."""
+
+    def __init__(self, base_url: str, timeout: float = 30, health_timeout: float = 5,
+                 max_connections: int = 10, retries: int = 2, backoff: float = 0.5,
+                 circuit_failures: int = 5, circuit_reset: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.health_timeout = health_timeout
+        self.max_connections = max_connections
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = CircuitBreaker(circuit_failures, circuit_reset)
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,  # Validierung kann lange dauern, Lese-Timeouts nicht wiederholen
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({'GET', 'POST'}),
+            raise_on_status=False,
         )
-        
-        # 200 = valid, 406 = invalid aber trotzdem verarbeitet
-        if response.status_code in [200, 406]:
-            errors = []
-            warnings = []
-            is_valid = False
-            
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections,
+                              max_retries=retry, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    # Abbruch während der Übertragung (auch beim Lesen eines gestreamten Berichts)
+    TRANSPORT_ERRORS = (
+        requests.exceptions.ConnectionError,
+        requests.exceptions.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+    )
+
+    def _allow(self) -> None:
+        if not self.breaker.allow():
+            raise ValidatorUnavailable("Validator vorübergehend deaktiviert (Circuit Breaker offen)")
+
+    def _send(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Anfrage senden; der Aufrufer hält einen Slot."""
+        try:
+            return self.session.request(method, url, **kwargs)
+        except self.TRANSPORT_ERRORS as e:
+            self.breaker.record_failure()
+            raise ValidatorUnavailable(str(e)) from e
+
+    def _record(self, response: requests.Response) -> None:
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        self._allow()
+        with self._slots:
+            response = self._send(method, url, **kwargs)
+        self._record(response)
+        return response
+
+    def _validate_kwargs(self, xml_content: bytes) -> dict:
+        return {
+            'data': xml_content,
+            'headers': {'Content-Type': 'application/xml'},
+            'timeout': self.timeout,
+        }
+
+    def validate(self, xml_content: bytes) -> requests.Response:
+        return self._request('POST', self.base_url, **self._validate_kwargs(xml_content))
+
+    @contextmanager
+    def validate_stream(self, xml_content: bytes) -> Iterator[requests.Response]:
+        """
+        Validierung mit gestreamtem Bericht (im with-Block lesen).
+
+        Der Slot bleibt belegt, bis der Bericht gelesen und die Antwort
+        geschlossen ist. Abbrüche beim Lesen zählen für den Circuit Breaker
+        und werden als ValidatorUnavailable gemeldet, Erfolg erst nach dem
+        vollständigen Lesen.
+        """
+        self._allow()
+        kwargs = self._validate_kwargs(xml_content)
+        with self._slots:
+            with self._send('POST', self.base_url, stream=True, **kwargs) as response:
+                if response.status_code >= 500:
+                    self.breaker.record_failure()
+                    yield response
+                    return
+                try:
+                    yield response
+                except self.TRANSPORT_ERRORS as e:
+                    self.breaker.record_failure()
+                    raise ValidatorUnavailable(f"Bericht unvollständig übertragen: {e}") from e
+                self.breaker.record_success()
+
+    def health(self) -> bool:
+        try:
+            response = self._request('GET', f"{self.base_url}/server/health", timeout=self.health_timeout)
+        except ValidatorUnavailable:
+            return False
+        return response.status_code == 200
+
+    def probe(self) -> dict:
+        """
+        Health-Check für den Monitor: Status, Latenz, Version.
+
+        Geht am Circuit Breaker vorbei (der Monitor soll gerade auch offene
+        Instanzen prüfen); ein erfolgreicher Check schließt den Breaker.
+        """
+        start = time.monotonic()
+        try:
+            response = self.session.get(f"{self.base_url}/server/health", timeout=self.health_timeout)
+        except requests.exceptions.RequestException:
+            return {'url': self.base_url, 'available': False, 'latency_ms': None, 'version': None}
+
+        available = response.status_code == 200
+        if available:
+            self.breaker.record_success()
+        return {
+            'url': self.base_url,
+            'available': available,
+            'latency_ms': round((time.monotonic() - start) * 1000, 1),
+            'version': _health_version(response.content) if available else None,
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+
+def _health_version(content: bytes) -> str | None:
+    """Version aus der Health-Antwort des Validators (XML oder JSON), falls enthalten."""
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return None
+        return str(data['version']) if isinstance(data, dict) and data.get('version') else None
+
+    for elem in root.iter():
+        if elem.tag.rsplit('}', 1)[-1] == 'version' and (elem.text or '').strip():
+            return elem.text.strip()
+    return None
+
+
+_clients = []
+_client_config = None
+_client_lock = threading.Lock()
+_next_client = itertools.count()
+
+
+def validator_urls() -> list[str]:
+    """Alle Validator-Instanzen (VALIDATOR_URLS, sonst VALIDATOR_URL)."""
+    urls = getattr(settings, 'VALIDATOR_URLS', None) or [
+        getattr(settings, 'VALIDATOR_URL', 'http://localhost:8081')]
+    return list(urls)
+
+
+def _settings_config() -> tuple:
+    return (
+        tuple(validator_urls()),
+        getattr(settings, 'VALIDATOR_TIMEOUT', 30),
+        getattr(settings, 'VALIDATOR_HEALTH_TIMEOUT', 5),
+        getattr(settings, 'VALIDATOR_MAX_CONNECTIONS', 10),
+        getattr(settings, 'VALIDATOR_RETRIES', 2),
+        getattr(settings, 'VALIDATOR_RETRY_BACKOFF', 0.5),
+        getattr(settings, 'VALIDATOR_CIRCUIT_FAILURES', 5),
+        getattr(settings, 'VALIDATOR_CIRCUIT_RESET_SECONDS', 30),
+    )
+
+
+def get_validator_clients() -> list[ValidatorClient]:
+    """Prozessweite Clients je Instanz; werden bei geänderten Settings neu aufgebaut."""
+    global _clients, _client_config
+
+    config = _settings_config()
+    with _client_lock:
+        if not _clients or config != _client_config:
+            for client in _clients:
+                client.close()
+            urls, *options = config
+            _clients = [ValidatorClient(url, *options) for url in urls]
+            _client_config = config
+        return _clients
+
+
+def get_validator_client(down: set = frozenset()) -> ValidatorClient:
+    """
+    Nächster Client im Round-Robin.
+
+    Instanzen mit offenem Circuit Breaker oder laut Health-Monitor
+    ausgefallene (down: URLs) werden übersprungen, solange eine andere
+    verfügbar ist.
+    """
+    clients = get_validator_clients()
+    start = next(_next_client)
+
+    for offset in range(len(clients)):
+        client = clients[(start + offset) % len(clients)]
+        if not client.breaker.is_open and client.base_url not in down:
+            return client
+    return clients[start % len(clients)]
+
+
+# Berichtselemente mit aufgelösten Namespaces (KoSIT-Report bzw. SVRL);
+# ohne Namespace nur zur Sicherheit für abweichende Validator-Versionen
+SVRL_NS = 'http://purl.oclc.org/dsdl/svrl'
+REPORT_NS = 'http://www.xoev.de/de/validator/varl/1'
+
+_FAILED_ASSERT = frozenset({f'{{{SVRL_NS}}}failed-assert', 'failed-assert'})
+_SUCCESSFUL_REPORT = frozenset({f'{{{SVRL_NS}}}successful-report', 'successful-report'})
+_SVRL_TEXT = frozenset({f'{{{SVRL_NS}}}text', 'text'})
+_MESSAGE = frozenset({f'{{{REPORT_NS}}}message', 'message'})
+_COLLECTED = _FAILED_ASSERT | _SUCCESSFUL_REPORT | _MESSAGE
+
+REPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _collect(elem: ET.Element, errors: list, warnings: list) -> None:
+    if elem.tag in _MESSAGE:
+        if elem.text:
+            level = elem.get('level', 'error')
+            if level in ('error', 'fatal'):
+                errors.append(elem.text.strip())
+            elif level == 'warning':
+                warnings.append(elem.text.strip())
+        return
+
+    # failed-assert = Fehler, successful-report = Warnung
+    target = errors if elem.tag in _FAILED_ASSERT else warnings
+    for child in elem:
+        if child.tag in _SVRL_TEXT and child.text:
+            target.append(child.text.strip())
+
+
+class ReportParser:
+    """
+    Liest den Validator-Bericht inkrementell (Pull-Parser).
+
+    Nur failed-assert, successful-report und message werden ausgewertet;
+    alle abgeschlossenen Elemente werden sofort verworfen, der Speicher
+    bleibt auch bei mehreren MB SVRL konstant. Wird von der sync und der
+    async Validierung gleichermaßen mit Chunks gefüttert.
+    """
+
+    def __init__(self):
+        self._parser = ET.XMLPullParser(events=('start', 'end'))
+        self._open_elements = []
+        self._inside = 0  # > 0: innerhalb eines ausgewerteten Elements
+        self._error = None
+        self.errors = []
+        self.warnings = []
+        self.is_valid = False
+
+    def feed(self, chunk: bytes) -> None:
+        if self._error is None:
             try:
-                root = ET.fromstring(response.content)
-                
-                # Check valid attribute im root report element
-                if 'valid' in root.attrib:
-                    is_valid = root.attrib['valid'].lower() == 'true'
-                
-                # Suche nach Fehlern und Warnungen
-                for elem in root.iter():
-                    tag_local = elem.tag.split('}')[-1] if '}' in elem.tag else elem.tag
-                    
-                    # failed-assert = Fehler
-                    if tag_local == 'failed-assert':
-                        for child in elem:
-                            child_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                            if child_local == 'text' and child.text:
-                                errors.append(child.text.strip())
-                    
-                    # successful-report = Warnung
-                    if tag_local == 'successful-report':
-                        for child in elem:
-                            child_local = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-                            if child_local == 'text' and child.text:
-                                warnings.append(child.text.strip())
-                    
-                    # Auch assessment messages prüfen
-                    if tag_local == 'message' and elem.text:
-                        msg = elem.text.strip()
-                        level = elem.attrib.get('level', 'error')
-                        if level in ['error', 'fatal']:
-                            errors.append(msg)
-                        elif level == 'warning':
-                            warnings.append(msg)
-                            
+                self._parser.feed(chunk)
+                self._read_events()
             except ET.ParseError as e:
-                logger.warning(f"Could not parse validator response: {e}")
-                errors.append("Validator-Antwort konnte nicht verarbeitet werden")
-            
-            return ValidationResult(is_valid=is_valid, errors=errors, warnings=warnings)
-        else:
+                self._error = e
+
+    def _read_events(self) -> None:
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if not self._open_elements:
+                    self.is_valid = elem.get('valid', '').lower() == 'true'
+                self._open_elements.append(elem)
+                if self._inside or elem.tag in _COLLECTED:
+                    self._inside += 1
+                continue
+
+            self._open_elements.pop()
+            if self._inside:
+                self._inside -= 1
+                if self._inside:
+                    # Kind (z.B. svrl:text), wird mit dem Elternelement gelesen
+                    continue
+                _collect(elem, self.errors, self.warnings)
+
+            # Abgeschlossenes Element ist immer das letzte Kind seines Elternelements
+            if self._open_elements:
+                del self._open_elements[-1][-1]
+
+    def result(self) -> ValidationResult:
+        if self._error is None:
+            try:
+                self._parser.close()
+                self._read_events()
+            except ET.ParseError as e:
+                self._error = e
+
+        if self._error is not None:
+            logger.warning(f"Could not parse validator response: {self._error}")
             return ValidationResult(
                 is_valid=False,
-                errors=[f"Validator-Fehler: HTTP {response.status_code}"],
-                warnings=[]
+                errors=self.errors + ["Validator-Antwort konnte nicht verarbeitet werden"],
+                warnings=self.warnings,
             )
-            
-    except requests.exceptions.ConnectionError:
+
         return ValidationResult(
-            is_valid=True,
-            errors=[],
-            warnings=["Validator nicht erreichbar - Validierung übersprungen"]
-        )
+            is_valid=self.is_valid, errors=self.errors, warnings=self.warnings, cacheable=True)
+
+
+def _parse_report_stream(chunks: Iterable[bytes]) -> ValidationResult:
+    parser = ReportParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+    return parser.result()
+
+
+def _parse_report(content: bytes) -> ValidationResult:
+    return _parse_report_stream([content])
+
+
+def _prevalidation_failed(xml_content: str):
+    if getattr(settings, 'XRECHNUNG_PREVALIDATION', True):
+        from .prevalidation import prevalidate
+
+        result = prevalidate(xml_content)
+        if not result.is_valid:
+            return result
+    return None
+
+
+def _http_error(status_code: int) -> ValidationResult:
+    return ValidationResult(
+        is_valid=False,
+        errors=[f"Validator-Fehler: HTTP {status_code}"],
+        warnings=[]
+    )
+
+
+def _unavailable(error: Exception) -> ValidationResult:
+    logger.info("Validator nicht erreichbar: %s", error)
+    return ValidationResult(
+        is_valid=True,
+        errors=[],
+        warnings=["Validator nicht erreichbar - Validierung übersprungen"]
+    )
+
+
+def _failed(error: Exception) -> ValidationResult:
+    logger.exception("Fehler bei der Validierung")
+    return ValidationResult(
+        is_valid=False,
+        errors=[f"Validierungsfehler: {str(error)}"],
+        warnings=[]
+    )
+
+
+def validate_xrechnung(xml_content: str, client: ValidatorClient = None) -> ValidationResult:
+    """
+    Validiert XRechnung XML gegen den Kosit Validator.
+
+    Dokumente mit Befund der Vorprüfung (prevalidation.py) werden ohne
+    Validator-Aufruf abgelehnt.
+    """
+    from .validator_status import down_instances, validator_status
+
+    rejected = _prevalidation_failed(xml_content)
+    if rejected:
+        return rejected
+
+    status = validator_status()
+    if status and not status['available']:
+        return _unavailable("laut Health-Monitor ausgefallen")
+    down = down_instances(status)
+    if client is None or client.base_url in down:
+        client = get_validator_client(down)
+
+    try:
+        with client.validate_stream(xml_content.encode('utf-8')) as response:
+            # 200 = valid, 406 = invalid aber trotzdem verarbeitet
+            if response.status_code in [200, 406]:
+                return _parse_report_stream(response.iter_content(REPORT_CHUNK_SIZE))
+            else:
+                return _http_error(response.status_code)
+
+    except ValidatorUnavailable as e:
+        return _unavailable(e)
     except Exception as e:
-        logger.exception("Fehler bei der Validierung")
-        return ValidationResult(
-            is_valid=False,
-            errors=[f"Validierungsfehler: {str(e)}"],
-            warnings=[]
-        )
+        return _failed(e)
 
 
 def check_validator_health() -> bool:
-    """Prüft ob der Validator erreichbar ist."""
+    """Prüft ob (mindestens) ein Validator erreichbar ist."""
+    try:
+        return any(client.health() for client in get_validator_clients())
+    except Exception:
+        return False
+
+
+# --- Async (ASGI) ---
+
+def _httpx():
     try:
-        response = requests.get(f"{VALIDATOR_URL}/server/health", timeout=5)
+        import httpx
+    except ImportError:
+        raise ImportError("Für die async Validierung wird httpx benötigt (pip install httpx).")
+    return httpx
+
+
+class AsyncValidatorClient:
+    """
+    Async-Gegenstück zu ValidatorClient (httpx) für ASGI-Deployments.
+
+    Übernimmt Einstellungen und Circuit Breaker des sync Clients derselben
+    Instanz, beide Wege sehen also denselben Ausfallzustand.
+    """
+
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, client: ValidatorClient):
+        httpx = _httpx()
+        self.base_url = client.base_url
+        self.timeout = client.timeout
+        self.health_timeout = client.health_timeout
+        self.retries = client.retries
+        self.backoff = client.backoff
+        self.breaker = client.breaker
+
+        limits = httpx.Limits(max_connections=client.max_connections,
+                              max_keepalive_connections=client.max_connections)
+        # Transport wiederholt nur Verbindungsfehler, Status-Retries siehe _request
+        self.http = httpx.AsyncClient(
+            transport=httpx.AsyncHTTPTransport(retries=client.retries, limits=limits))
+
+    async def _send(self, method: str, url: str, **kwargs):
+        """Antwort wird gestreamt geliefert (aclose() nicht vergessen)."""
+        httpx = _httpx()
+        if not self.breaker.allow():
+            raise ValidatorUnavailable("Validator vorübergehend deaktiviert (Circuit Breaker offen)")
+
+        for attempt in range(self.retries + 1):
+            request = self.http.build_request(method, url, **kwargs)
+            try:
+                response = await self.http.send(request, stream=True)
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                raise ValidatorUnavailable(str(e)) from e
+
+            if response.status_code not in self.RETRY_STATUS or attempt == self.retries:
+                break
+            await response.aclose()
+            await asyncio.sleep(self.backoff * 2 ** attempt)
+
+        return response
+
+    async def _request(self, method: str, url: str, **kwargs):
+        """Wie _send, Erfolg bzw. Serverfehler zählen sofort für den Circuit Breaker."""
+        response = await self._send(method, url, **kwargs)
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    @asynccontextmanager
+    async def validate_stream(self, xml_content: bytes) -> AsyncIterator:
+        """Wie ValidatorClient.validate_stream: Erfolg erst nach vollständig gelesenem Bericht."""
+        httpx = _httpx()
+        response = await self._send(
+            'POST', self.base_url,
+            content=xml_content,
+            headers={'Content-Type': 'application/xml'},
+            timeout=self.timeout,
+        )
+        try:
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                yield response
+                return
+            try:
+                yield response
+            except httpx.TransportError as e:
+                self.breaker.record_failure()
+                raise ValidatorUnavailable(f"Bericht unvollständig übertragen: {e}") from e
+            self.breaker.record_success()
+        finally:
+            await response.aclose()
+
+    async def health(self) -> bool:
+        try:
+            response = await self._request('GET', f"{self.base_url}/server/health",
+                                           timeout=self.health_timeout)
+        except ValidatorUnavailable:
+            return False
+        await response.aclose()
         return response.status_code == 200
-    except:
-        return False
\ No newline at end of file
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+
+
+# httpx-Clients sind an ihre Event-Loop gebunden: ein Client je Loop und Instanz,
+# je Loop zusammen mit der Konfiguration, für die sie gebaut wurden
+_async_clients = weakref.WeakKeyDictionary()
+_closing_tasks = set()
+
+
+def _async_client_for(client: ValidatorClient) -> AsyncValidatorClient:
+    """
+    Async-Client der laufenden Loop zum sync Client.
+
+    Hat get_validator_clients die Clients neu aufgebaut (geänderte Settings),
+    werden die Clients dieser Loop geschlossen und ebenfalls neu aufgebaut.
+    """
+    loop = asyncio.get_running_loop()
+    config, clients = _async_clients.get(loop, (None, {}))
+
+    if config != _client_config:
+        for stale in clients.values():
+            task = loop.create_task(stale.aclose())
+            _closing_tasks.add(task)
+            task.add_done_callback(_closing_tasks.discard)
+        clients = {}
+        _async_clients[loop] = (_client_config, clients)
+
+    if client not in clients:
+        clients[client] = AsyncValidatorClient(client)
+    return clients[client]
+
+
+async def aclose_async_clients() -> None:
+    """
+    Clients der laufenden Loop schließen.
+
+    Für Loops, die mit dem Request enden (async_to_sync unter WSGI): dort
+    gibt es nichts wiederzuverwenden, offene Verbindungen würden liegen bleiben.
+    """
+    _, clients = _async_clients.pop(asyncio.get_running_loop(), (None, {}))
+    await asyncio.gather(*(client.aclose() for client in clients.values()), return_exceptions=True)
+
+
+def get_async_validator_client(down: set = frozenset()) -> AsyncValidatorClient:
+    """Nächster Client im Round-Robin (wie get_validator_client), für die laufende Loop."""
+    return _async_client_for(get_validator_client(down))
+
+
+async def avalidate_xrechnung(xml_content: str, client: AsyncValidatorClient = None) -> ValidationResult:
+    """Wie validate_xrechnung, blockiert aber keinen Thread während des Validator-Aufrufs."""
+    from .validator_status import avalidator_status, down_instances
+
+    rejected = _prevalidation_failed(xml_content)
+    if rejected:
+        return rejected
+
+    status = await avalidator_status()
+    if status and not status['available']:
+        return _unavailable("laut Health-Monitor ausgefallen")
+    down = down_instances(status)
+    if client is None or client.base_url in down:
+        client = get_async_validator_client(down)
+
+    try:
+        async with client.validate_stream(xml_content.encode('utf-8')) as response:
+            if response.status_code in [200, 406]:
+                parser = ReportParser()
+                async for chunk in response.aiter_bytes(REPORT_CHUNK_SIZE):
+                    parser.feed(chunk)
+                return parser.result()
+            else:
+                return _http_error(response.status_code)
+
+    except ValidatorUnavailable as e:
+        return _unavailable(e)
+    except Exception as e:
+        return _failed(e)
+
+
+async def acheck_validator_health() -> bool:
+    """Async-Variante von check_validator_health (Instanzen parallel)."""
+    try:
+        clients = [_async_client_for(client) for client in get_validator_clients()]
+        return any(await asyncio.gather(*(client.health() for client in clients)))
+    except Exception:
+        return False
@@ -0,0 +1,62 @@
+"""
+Validator-Status (Health-Monitor)
+- Celery Beat prüft alle Instanzen periodisch (probe_validator_health_task)
+- Status, Latenz und Version liegen im gemeinsamen Cache
+- API und Validierung lesen nur den Cache, kein Live-Check pro Request
+- Ist der Validator laut Monitor ausgefallen, wird die Validierung sofort übersprungen
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+STATUS_CACHE_KEY = 'invoices:validator-status'
+
+
+def health_interval() -> int:
+    return int(getattr(settings, 'VALIDATOR_HEALTH_INTERVAL', 15))
+
+
+def probe_validator_health() -> dict:
+    """Prüft alle Instanzen und legt das Ergebnis im Cache ab."""
+    from .validator import get_validator_clients
+
+    instances = [client.probe() for client in get_validator_clients()]
+    available = [instance for instance in instances if instance['available']]
+
+    status = {
+        'available': bool(available),
+        'latency_ms': min(instance['latency_ms'] for instance in available) if available else None,
+        'version': next((instance['version'] for instance in available if instance['version']), None),
+        'checked_at': timezone.now().isoformat(),
+        'instances': instances,
+    }
+    # Bleibt der Monitor aus, verfällt der Status und gilt als unbekannt
+    cache.set(STATUS_CACHE_KEY, status, timeout=health_interval() * 3)
+    return status
+
+
+def validator_status() -> dict | None:
+    """Letzter Status des Monitors oder None (unbekannt)."""
+    return cache.get(STATUS_CACHE_KEY)
+
+
+async def avalidator_status() -> dict | None:
+    return await cache.aget(STATUS_CACHE_KEY)
+
+
+def down_instances(status: dict | None) -> set[str]:
+    """URLs der laut Monitor ausgefallenen Instanzen."""
+    if not status:
+        return set()
+    return {instance['url'] for instance in status['instances'] if not instance['available']}
+
+
+def status_payload(status: dict) -> dict:
+    """Antwort für validator_status (validator_available bleibt für das Frontend)."""
+    return {
+        'validator_available': status['available'],
+        'latency_ms': status['latency_ms'],
+        'version': status['version'],
+        'checked_at': status['checked_at'],
+    }
@@ -1,17 +1,36 @@
-from django.http import HttpResponse
-from rest_framework import viewsets, permissions, filters, status
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework import mixins, viewsets, permissions, filters, status
 from rest_framework.decorators import action
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from .models import Invoice, InvoiceItem, Reminder
-from .serializers import InvoiceSerializer, InvoiceItemSerializer, InvoiceItemCreateSerializer, ReminderSerializer
+from .models import (
+    ArchiveIndex, DatevExportRun, ExportJob, Invoice, InvoiceItem, InvoiceSummary, MailTemplate, OutboundEmail,
+)
+from .serializers import (
+    ArchiveIndexSerializer, DateRangeSerializer, DatevExportRunSerializer, ExportJobSerializer, InvoiceSerializer,
+    InvoiceItemSerializer, InvoiceItemCreateSerializer, MailTemplateSerializer, OutboundEmailSerializer,
+    ReminderSerializer, job_params,
+)
 from .xrechnung import generate_xrechnung
-from .validator import validate_xrechnung, check_validator_health
+from .validator_status import probe_validator_health, status_payload, validator_status
+from .validation import InvoiceNotValid, ensure_valid, validate_invoice
 from .zugferd import generate_zugferd_pdf
-from .email import send_invoice_email
+from .outbox import enqueue_invoice_email, enqueue_reminder_email
 from datetime import date
-from .datev import generate_datev_simple
-from .archive import archive_invoice, verify_archive, download_archive
+from decimal import Decimal, InvalidOperation
+from .export_jobs import enqueue_export
+from .summaries import track_summaries
+from .datev import (
+    EXCLUDED_STATUSES, extf_period_error, extf_settings_error, iter_datev_extf, load_datev_bookings,
+)
+from .archive import (
+    archive_invoice, verify_archive, download_archive, schedule_archive,
+    list_archive_members, read_archive_member, MEMBER_CONTENT_TYPES,
+)
+
+
+DATEV_EXPORT_CHUNK_SIZE = 2000
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -25,11 +44,25 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     ordering = ['-invoice_date']
 
     def get_queryset(self):
-        return Invoice.objects.filter(tenant=self.request.user.tenant).prefetch_related('items')
+        return (
+            Invoice.objects.filter(tenant=self.request.user.tenant)
+            .select_related('validation')
+            .prefetch_related('items')
+        )
 
     def perform_create(self, serializer):
-        serializer.save(tenant=self.request.user.tenant,
-                        created_by=self.request.user)
+        with track_summaries() as tracked:
+            serializer.save(tenant=self.request.user.tenant,
+                            created_by=self.request.user)
+            tracked.add(serializer.instance)
+
+    def perform_update(self, serializer):
+        with track_summaries(serializer.instance):
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with track_summaries(instance):
+            instance.delete()
 
     @action(detail=True, methods=['post'])
     def finalize(self, request, pk=None):
@@ -45,13 +78,11 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        invoice.calculate_totals()
-        invoice.status = 'final'
-        invoice.save()
-        try:
-            archive_result = archive_invoice(invoice)
-        except Exception as e:
-            pass
+        with track_summaries(invoice):
+            invoice.calculate_totals()
+            invoice.status = 'final'
+            invoice.save()
+        schedule_archive(invoice)
         return Response(InvoiceSerializer(invoice).data)
 
     @action(detail=True, methods=['post'])
@@ -63,13 +94,14 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 {'error': 'Rechnung muss finalisiert sein.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        invoice.status = 'sent'
-        invoice.save()
+        with track_summaries(invoice):
+            invoice.status = 'sent'
+            invoice.save()
         return Response(InvoiceSerializer(invoice).data)
 
     @action(detail=True, methods=['post'])
     def send_email(self, request, pk=None):
-        """Rechnung per E-Mail versenden"""
+        """Rechnung per E-Mail versenden (Outbox, Zustellung im Hintergrund)"""
         invoice = self.get_object()
 
         if invoice.status == 'draft':
@@ -87,29 +119,31 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            send_invoice_email(invoice, recipient)
+        # Abgelehnte XRechnungen sofort melden (Ergebnis landet im Cache,
+        # der Worker validiert beim Versand ohne erneute Anfrage)
+        if invoice.format == 'xrechnung':
+            try:
+                ensure_valid(invoice)
+            except InvoiceNotValid as e:
+                return Response(
+                    {'error': str(e), 'errors': e.result.errors},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-            # Status auf "versendet" setzen
-            if invoice.status == 'final':
-                invoice.status = 'sent'
-                invoice.save()
+        email = enqueue_invoice_email(invoice, recipient, user=request.user)
 
-            return Response({
-                'success': True,
-                'message': f'Rechnung an {recipient} versendet.',
-                'invoice': InvoiceSerializer(invoice).data
-            })
-        except Exception as e:
-            return Response(
-                {'error': f'Fehler beim Versenden: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        # Status "versendet" setzt der Worker nach erfolgreicher Zustellung
+        return Response({
+            'success': True,
+            'message': f'Rechnung an {recipient} wird versendet.',
+            'outbound_email': OutboundEmailSerializer(email).data,
+            'invoice': InvoiceSerializer(invoice).data
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['get', 'post'])
     def reminders(self, request, pk=None):
-        """Mahnungen abrufen oder neue Mahnung senden"""
-        from .email import send_reminder_email
+        """Mahnungen abrufen oder neue Mahnung senden (Outbox)"""
+        from django.db.models import Max
 
         invoice = self.get_object()
 
@@ -130,9 +164,11 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Nächste Mahnstufe ermitteln
-        last_reminder = invoice.reminders.order_by('-level').first()
-        next_level = (last_reminder.level + 1) if last_reminder else 1
+        # Nächste Mahnstufe ermitteln (nicht zugestellte Mahnungen zählen nicht)
+        current_level = (
+            invoice.reminders.exclude(delivery_status='failed').aggregate(level=Max('level'))['level'] or 0
+        )
+        next_level = current_level + 1
 
         if next_level > 3:
             return Response(
@@ -149,26 +185,14 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            send_reminder_email(invoice, next_level, recipient, fee)
-
-            reminder = Reminder.objects.create(
-                invoice=invoice,
-                level=next_level,
-                sent_to=recipient,
-                fee=fee,
-            )
+        email = enqueue_reminder_email(invoice, next_level, recipient, fee, user=request.user)
 
-            return Response({
-                'success': True,
-                'message': f'Mahnung Stufe {next_level} an {recipient} versendet.',
-                'reminder': ReminderSerializer(reminder).data
-            })
-        except Exception as e:
-            return Response(
-                {'error': f'Fehler beim Versenden: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        return Response({
+            'success': True,
+            'message': f'Mahnung Stufe {next_level} an {recipient} wird versendet.',
+            'outbound_email': OutboundEmailSerializer(email).data,
+            'reminder': ReminderSerializer(email.reminder).data
+        }, status=status.HTTP_202_ACCEPTED)
 
     @action(detail=True, methods=['post'])
     def mark_paid(self, request, pk=None):
@@ -179,8 +203,9 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 {'error': 'Rechnung muss versendet oder finalisiert sein.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        invoice.status = 'paid'
-        invoice.save()
+        with track_summaries(invoice):
+            invoice.status = 'paid'
+            invoice.save()
         return Response(InvoiceSerializer(invoice).data)
 
     @action(detail=True, methods=['post'])
@@ -192,8 +217,9 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 {'error': 'Rechnung ist bereits storniert.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        invoice.status = 'cancelled'
-        invoice.save()
+        with track_summaries(invoice):
+            invoice.status = 'cancelled'
+            invoice.save()
         return Response(InvoiceSerializer(invoice).data)
 
     @action(detail=True, methods=['post'])
@@ -204,38 +230,40 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         original = self.get_object()
         today = timezone.now().date()
 
-        # Neue Rechnung erstellen
-        new_invoice = Invoice.objects.create(
-            tenant=original.tenant,
-            customer=original.customer,
-            invoice_date=today,
-            due_date=today +
-            timezone.timedelta(days=original.customer.payment_terms_days),
-            status='draft',
-            format=original.format,
-            leitweg_id=original.leitweg_id,
-            payment_terms=original.payment_terms,
-            notes=original.notes,
-            created_by=request.user,
-        )
-
-        # Positionen kopieren
-        for item in original.items.all():
-            InvoiceItem.objects.create(
-                invoice=new_invoice,
-                product=item.product,
-                position=item.position,
-                sku=item.sku,
-                description=item.description,
-                quantity=item.quantity,
-                unit=item.unit,
-                unit_price=item.unit_price,
-                vat_rate=item.vat_rate,
+        with track_summaries() as tracked:
+            # Neue Rechnung erstellen
+            new_invoice = Invoice.objects.create(
+                tenant=original.tenant,
+                customer=original.customer,
+                invoice_date=today,
+                due_date=today +
+                timezone.timedelta(days=original.customer.payment_terms_days),
+                status='draft',
+                format=original.format,
+                leitweg_id=original.leitweg_id,
+                payment_terms=original.payment_terms,
+                notes=original.notes,
+                created_by=request.user,
             )
 
-        # Summen berechnen
-        new_invoice.calculate_totals()
-        new_invoice.save()
+            # Positionen kopieren
+            for item in original.items.all():
+                InvoiceItem.objects.create(
+                    invoice=new_invoice,
+                    product=item.product,
+                    position=item.position,
+                    sku=item.sku,
+                    description=item.description,
+                    quantity=item.quantity,
+                    unit=item.unit,
+                    unit_price=item.unit_price,
+                    vat_rate=item.vat_rate,
+                )
+
+            # Summen berechnen
+            new_invoice.calculate_totals()
+            new_invoice.save()
+            tracked.add(new_invoice)
 
         return Response(
             InvoiceSerializer(new_invoice).data,
@@ -313,8 +341,8 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        xml_content = generate_xrechnung(invoice)
-        result = validate_xrechnung(xml_content)
+        # Ergebnis für identisches XML kommt aus dem Validierungs-Cache
+        result = validate_invoice(invoice)
 
         return Response({
             'is_valid': result.is_valid,
@@ -322,15 +350,99 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             'warnings': result.warnings,
         })
 
+    @action(detail=False, methods=['post'])
+    def validate_batch(self, request):
+        """
+        Massenvalidierung (ids oder Filter from/to/status).
+
+        Kleine Mengen werden direkt geprüft, größere als Export-Job
+        (kind=validation) im Hintergrund - Antwort dann 202.
+        """
+        from django.conf import settings
+        from .serializers import ValidationBatchSerializer
+        from .validation_batch import select_invoices, validate_batch
+
+        serializer = ValidationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Als JSON für den Export-Job (Datumswerte als ISO-Text)
+        params = {key: value for key, value in serializer.data.items() if value}
+        invoices = select_invoices(request.user.tenant, params)
+
+        if invoices.count() > getattr(settings, 'VALIDATION_BATCH_SYNC_LIMIT', 20):
+            job = enqueue_export(request.user.tenant, 'validation', params=params, user=request.user)
+            return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+        return Response(validate_batch(invoices).as_dict())
+
+    @action(detail=False, methods=['post'])
+    def send_bulk(self, request):
+        """
+        Massenversand finalisierter Rechnungen (ids oder Filter customer/from/to).
+
+        Mit dry_run nur die Auswahl, sonst Versand über die Outbox - Antwort 202
+        mit run_id, Fortschritt unter outbox/progress/?run_id=...
+        """
+        from .bulk_send import enqueue_invoice_emails, select_for_sending
+        from .serializers import BulkSelectionSerializer
+
+        params = BulkSelectionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        invoices = select_for_sending(request.user.tenant, params.validated_data)
+
+        if params.validated_data['dry_run']:
+            return Response({
+                'count': invoices.count(),
+                'invoices': list(invoices.values('id', 'invoice_number', 'invoice_date', 'total')),
+            })
+
+        run_id, count = enqueue_invoice_emails(invoices, user=request.user)
+        return Response({
+            'run_id': str(run_id),
+            'count': count,
+            'message': f'{count} Rechnungen werden versendet.',
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['post'])
+    def dunning_run(self, request):
+        """
+        Mahnlauf: überfällige Rechnungen erhalten ihre nächste Mahnstufe.
+
+        Filter ids/customer/from/to (Fälligkeit) und level, Gebühr über fee;
+        dry_run wie bei send_bulk.
+        """
+        from .bulk_send import enqueue_reminders, select_for_dunning
+        from .serializers import DunningRunSerializer
+
+        params = DunningRunSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        invoices = select_for_dunning(request.user.tenant, params.validated_data)
+
+        if params.validated_data['dry_run']:
+            rows = invoices.values('id', 'invoice_number', 'due_date', 'total', 'reminder_level')
+            return Response({
+                'count': len(rows),
+                'invoices': [{**row, 'next_level': row['reminder_level'] + 1} for row in rows],
+            })
+
+        run_id, count = enqueue_reminders(invoices, fee=params.validated_data['fee'], user=request.user)
+        return Response({
+            'run_id': str(run_id),
+            'count': count,
+            'message': f'{count} Mahnungen werden versendet.',
+        }, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=['get'])
     def validator_status(self, request):
-        """Prüft ob der Validator erreichbar ist"""
-        return Response({'validator_available': check_validator_health()})
+        """
+        Status des Validators aus dem Health-Monitor (Cache).
 
-    @action(detail=False, methods=['get'])
-    def export_datev(self, request):
-        """DATEV CSV Export aller finalisierten Rechnungen"""
-        invoices = self.get_queryset().exclude(status='draft')
+        Nur wenn noch kein Status vorliegt (Monitor läuft nicht), wird live geprüft.
+        """
+        status = validator_status() or probe_validator_health()
+        return Response(status_payload(status))
+
+    def _datev_queryset(self, request):
+        invoices = self.get_queryset().exclude(status__in=EXCLUDED_STATUSES)
 
         # Optional: Datumsfilter
         date_from = request.query_params.get('from')
@@ -341,39 +453,96 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if date_to:
             invoices = invoices.filter(invoice_date__lte=date_to)
 
-        csv_content = generate_datev_simple(list(invoices))
+        return invoices
 
-        response = HttpResponse(
-            csv_content, content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="datev_export_{date.today()}.csv"'
+    @action(detail=False, methods=['post'])
+    def export_datev(self, request):
+        """
+        DATEV CSV Export aller finalisierten Rechnungen als Export-Job (202)
+
+        POST, weil jeder Aufruf einen Export startet. Die Datei liegt danach
+        unter export-jobs/<id>/download/.
+        """
+        params = DateRangeSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+
+        job = enqueue_export(
+            request.user.tenant,
+            'datev',
+            params=job_params(params.validated_data),
+            user=request.user,
+        )
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'])
+    def export_datev_extf(self, request):
+        """DATEV EXTF Buchungsstapel: eine Buchung je Rechnung und MwSt-Satz"""
+        from django.db.models import Max, Min
+        from django.utils.dateparse import parse_date
+
+        error = extf_settings_error(request.user.tenant)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        invoices = self._datev_queryset(request)
+
+        date_from = parse_date(request.query_params.get('from') or '')
+        date_to = parse_date(request.query_params.get('to') or '')
+        if not date_from or not date_to:
+            bounds = invoices.aggregate(first=Min('invoice_date'), last=Max('invoice_date'))
+            date_from = date_from or bounds['first'] or date.today()
+            date_to = date_to or bounds['last'] or date.today()
+
+        error = extf_period_error(request.user.tenant, date_from, date_to)
+        if error:
+            return Response({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        bookings = load_datev_bookings(invoices).iterator(chunk_size=DATEV_EXPORT_CHUNK_SIZE)
+        rows = iter_datev_extf(bookings, request.user.tenant, date_from, date_to)
+
+        # DATEV erwartet ANSI (Windows-1252)
+        response = StreamingHttpResponse(
+            (row.encode('cp1252', errors='replace') for row in rows),
+            content_type='text/csv; charset=windows-1252')
+        response['Content-Disposition'] = (
+            f'attachment; filename="EXTF_Buchungsstapel_{date_from:%Y%m%d}_{date_to:%Y%m%d}.csv"')
         return response
 
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
-        """Dashboard Statistiken"""
-        from django.db.models import Sum, Count
-        from django.db.models.functions import TruncMonth
+        """Dashboard Statistiken (aus den vorverdichteten Monatssummen)"""
+        from django.db.models import F, Sum
         from decimal import Decimal
 
-        invoices = self.get_queryset()
+        summaries = InvoiceSummary.objects.filter(tenant=request.user.tenant)
+        gross = Sum(F('net') + F('tax'))
+
+        by_status = {
+            row['status']: row
+            for row in summaries.values('status').annotate(count=Sum('invoice_count'), total=gross).order_by()
+        }
+
+        def count(*statuses):
+            return sum(by_status[s]['count'] or 0 for s in statuses if s in by_status)
 
-        # Basis-Statistiken
-        total_invoices = invoices.count()
-        draft_count = invoices.filter(status='draft').count()
-        open_count = invoices.filter(status__in=['final', 'sent']).count()
-        paid_count = invoices.filter(status='paid').count()
-        cancelled_count = invoices.filter(status='cancelled').count()
+        def amount(*statuses):
+            return sum((by_status[s]['total'] or Decimal('0') for s in statuses if s in by_status),
+                       Decimal('0.00'))
+
+        total_invoices = count(*by_status)
+        draft_count = count('draft')
+        open_count = count('final', 'sent')
+        paid_count = count('paid')
+        cancelled_count = count('cancelled')
 
         # Beträge
-        total_revenue = invoices.filter(status='paid').aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
-        open_amount = invoices.filter(status__in=['final', 'sent']).aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
+        total_revenue = amount('paid')
+        open_amount = amount('final', 'sent')
 
-        # Überfällige Rechnungen
+        # Überfällige Rechnungen (hängen vom Fälligkeitsdatum ab, nicht vorverdichtet)
         from django.utils import timezone
         today = timezone.now().date()
-        overdue = invoices.filter(
+        overdue = self.get_queryset().filter(
             status__in=['final', 'sent'],
             due_date__lt=today
         )
@@ -381,14 +550,12 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         overdue_amount = overdue.aggregate(total=Sum('total'))[
             'total'] or Decimal('0.00')
 
-        # Umsatz pro Monat (letzte 12 Monate)
-        monthly_revenue = invoices.filter(
+        # Umsatz pro Monat
+        monthly_revenue = summaries.filter(
             status='paid'
-        ).annotate(
-            month=TruncMonth('invoice_date')
         ).values('month').annotate(
-            total=Sum('total'),
-            count=Count('id')
+            total=gross,
+            count=Sum('invoice_count')
         ).order_by('month')
 
         return Response({
@@ -408,13 +575,47 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             'monthly_revenue': [
                 {
                     'month': item['month'].strftime('%Y-%m') if item['month'] else None,
-                    'total': str(item['total']),
+                    'total': f"{item['total']:.2f}",
                     'count': item['count']
                 }
                 for item in monthly_revenue
             ],
         })
 
+    @action(detail=False, methods=['get'])
+    def revenue_summary(self, request):
+        """
+        Umsätze je Monat, Status und USt-Satz (vorverdichtet).
+
+        Query-Parameter: from, to (YYYY-MM-DD), status
+        """
+        from django.utils.dateparse import parse_date
+
+        summaries = InvoiceSummary.objects.filter(tenant=request.user.tenant)
+
+        date_from = parse_date(request.query_params.get('from') or '')
+        date_to = parse_date(request.query_params.get('to') or '')
+        if date_from:
+            summaries = summaries.filter(month__gte=date_from.replace(day=1))
+        if date_to:
+            summaries = summaries.filter(month__lte=date_to)
+        if request.query_params.get('status'):
+            summaries = summaries.filter(status=request.query_params['status'])
+
+        return Response([
+            {
+                'month': summary.month.strftime('%Y-%m'),
+                'status': summary.status,
+                'vat_rate': f"{summary.vat_rate:.2f}",
+                'invoice_count': summary.invoice_count,
+                'item_count': summary.item_count,
+                'net': f"{summary.net:.2f}",
+                'tax': f"{summary.tax:.2f}",
+                'gross': f"{summary.gross:.2f}",
+            }
+            for summary in summaries
+        ])
+
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
 
@@ -478,6 +679,66 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = f'attachment; filename="archiv_{invoice.invoice_number}.zip"'
         return response
 
+    @action(detail=True, methods=['get'], url_path='archive/members')
+    def archive_members(self, request, pk=None):
+        """Inhaltsverzeichnis des Archivs"""
+        invoice = self.get_object()
+
+        if not invoice.archived_at:
+            return Response({
+                'success': False,
+                'error': 'Rechnung ist nicht archiviert.',
+            }, status=400)
+
+        try:
+            members = list_archive_members(invoice)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': f'Archiv konnte nicht geladen werden: {str(e)}',
+            }, status=500)
+
+        if members is None:
+            return Response({
+                'success': False,
+                'error': 'Archiv konnte nicht geladen werden.',
+            }, status=500)
+
+        return Response({'members': members})
+
+    @action(detail=True, methods=['get'], url_path=r'archive/members/(?P<member>[^/]+)')
+    def archive_member(self, request, pk=None, member=None):
+        """Einzelne Datei aus dem Archiv (ohne das gesamte Archiv zu entschlüsseln)"""
+        import os
+
+        invoice = self.get_object()
+
+        if not invoice.archived_at:
+            return Response({
+                'success': False,
+                'error': 'Rechnung ist nicht archiviert.',
+            }, status=400)
+
+        try:
+            content = read_archive_member(invoice, member)
+        except Exception as e:
+            return Response({
+                'success': False,
+                'error': f'Archiv konnte nicht geladen werden: {str(e)}',
+            }, status=500)
+
+        if content is None:
+            return Response({
+                'success': False,
+                'error': f'{member} ist nicht im Archiv enthalten.',
+            }, status=404)
+
+        content_type = MEMBER_CONTENT_TYPES.get(
+            os.path.splitext(member)[1], 'application/octet-stream')
+        response = HttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{invoice.invoice_number}_{member}"'
+        return response
+
     @action(detail=True, methods=['post'])
     def archive(self, request, pk=None):
         """Rechnung manuell archivieren"""
@@ -529,17 +790,232 @@ class InvoiceItemViewSet(viewsets.ModelViewSet):
         )
 
     def perform_create(self, serializer):
-        item = serializer.save()
-        item.invoice.calculate_totals()
-        item.invoice.save()
+        with track_summaries(serializer.validated_data.get('invoice')):
+            item = serializer.save()
+            item.invoice.calculate_totals()
+            item.invoice.save()
 
     def perform_update(self, serializer):
-        item = serializer.save()
-        item.invoice.calculate_totals()
-        item.invoice.save()
+        with track_summaries(serializer.instance.invoice, serializer.validated_data.get('invoice')):
+            item = serializer.save()
+            item.invoice.calculate_totals()
+            item.invoice.save()
 
     def perform_destroy(self, instance):
         invoice = instance.invoice
-        instance.delete()
-        invoice.calculate_totals()
-        invoice.save()
+        with track_summaries(invoice):
+            instance.delete()
+            invoice.calculate_totals()
+            invoice.save()
+
+
+class ArchiveIndexPagination(PageNumberPagination):
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+
+class ArchiveIndexViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Archiv-Index für Prüfer (GoBD).
+
+    Filtert und blättert über archivierte Rechnungen, ohne die verschlüsselten
+    Archivdaten zu laden. Filter z.B. ?invoice_date__gte=2025-01-01&vat_rate=7
+    """
+    serializer_class = ArchiveIndexSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ArchiveIndexPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'invoice_number': ['exact', 'startswith'],
+        'invoice_date': ['exact', 'gte', 'lte'],
+        'due_date': ['gte', 'lte'],
+        'archived_at': ['gte', 'lte'],
+        'customer': ['exact'],
+        'total': ['gte', 'lte'],
+        'item_count': ['gte', 'lte'],
+    }
+    ordering_fields = ['invoice_number', 'invoice_date', 'total', 'archived_at']
+    ordering = ['-invoice_date', '-invoice_number']
+
+    def get_queryset(self):
+        queryset = ArchiveIndex.objects.filter(tenant=self.request.user.tenant)
+
+        vat_rate = self.request.query_params.get('vat_rate')
+        if vat_rate:
+            try:
+                queryset = queryset.filter(vat_breakdown__has_key=f'{Decimal(vat_rate):.2f}')
+            except InvalidOperation:
+                queryset = queryset.none()
+
+        return queryset
+
+
+class DatevExportRunViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    DATEV-Exportläufe je Abnehmer.
+
+    POST legt einen Export-Job für einen Lauf an und antwortet mit 202
+    (mode=incremental exportiert nur Rechnungen seit dem letzten Lauf dieses
+    Abnehmers), frühere Läufe bleiben über download/ erneut abrufbar.
+    """
+    serializer_class = DatevExportRunSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['consumer', 'mode', 'export_format']
+
+    def get_queryset(self):
+        return DatevExportRun.objects.filter(tenant=self.request.user.tenant)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        if data.get('export_format') == 'extf':
+            error = extf_settings_error(request.user.tenant)
+            if error:
+                return Response({'export_format': [error]}, status=status.HTTP_400_BAD_REQUEST)
+            if data.get('date_from') and data.get('date_to'):
+                error = extf_period_error(request.user.tenant, data['date_from'], data['date_to'])
+                if error:
+                    return Response({'date_to': [error]}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Der Lauf entsteht im Worker (Export-Job datev_run); fertig unter
+        # export-jobs/<id>/, die ID des Laufs steht dann in params.run_id
+        job = enqueue_export(
+            request.user.tenant,
+            'datev_run',
+            params=job_params(data),
+            user=request.user,
+        )
+        return Response(ExportJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Datei eines früheren Exportlaufs erneut herunterladen"""
+        from django.http import FileResponse
+
+        run = self.get_object()
+
+        if not run.file:
+            return Response({'error': 'Keine Exportdatei vorhanden.'}, status=404)
+
+        charset = 'windows-1252' if run.export_format == 'extf' else 'utf-8'
+        return FileResponse(
+            run.file.open('rb'),
+            as_attachment=True,
+            filename=run.file.name.rsplit('/', 1)[-1],
+            content_type=f'text/csv; charset={charset}',
+        )
+
+
+class ExportJobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Hintergrund-Exporte.
+
+    POST legt einen Job an und antwortet sofort mit 202; Status, Fortschritt
+    und Durchsatz sind per GET abrufbar, die fertige Datei über download/.
+    """
+    serializer_class = ExportJobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+
+    def get_queryset(self):
+        return ExportJob.objects.filter(tenant=self.request.user.tenant)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        job = enqueue_export(
+            request.user.tenant,
+            serializer.validated_data['kind'],
+            params=serializer.validated_data.get('params'),
+            user=request.user,
+        )
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """Fertige Exportdatei herunterladen"""
+        from django.http import FileResponse
+
+        job = self.get_object()
+
+        if job.status != 'done' or not job.file:
+            return Response(
+                {'error': 'Export ist noch nicht fertig.', 'status': job.status},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        filename = job.file.name.rsplit('/', 1)[-1]
+        if filename.endswith('.zip'):
+            content_type = 'application/zip'
+        elif filename.endswith('.json'):
+            content_type = 'application/json'
+        else:
+            extf = job.kind == 'datev_extf' or job.params.get('export_format') == 'extf'
+            charset = 'windows-1252' if extf else 'utf-8'
+            content_type = f'text/csv; charset={charset}'
+
+        return FileResponse(
+            job.file.open('rb'),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+
+
+class OutboundEmailViewSet(viewsets.ReadOnlyModelViewSet):
+    """Outbox: Versandstatus von Rechnungs- und Mahnungs-Mails"""
+    serializer_class = OutboundEmailSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status', 'invoice', 'run_id']
+
+    def get_queryset(self):
+        return OutboundEmail.objects.filter(tenant=self.request.user.tenant).select_related('invoice')
+
+    @action(detail=False, methods=['get'])
+    def progress(self, request):
+        """Fortschritt eines Massenversands bzw. Mahnlaufs (?run_id=...)"""
+        import uuid
+        from .bulk_send import run_progress
+
+        try:
+            run_id = uuid.UUID(request.query_params.get('run_id', ''))
+        except ValueError:
+            return Response({'error': 'run_id fehlt oder ist ungültig.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        progress = run_progress(request.user.tenant, run_id)
+        if not progress['total']:
+            return Response({'error': 'Lauf nicht gefunden.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(progress)
+
+
+class MailTemplateViewSet(viewsets.ModelViewSet):
+    """
+    E-Mail-Vorlagen des Mandanten (Rechnung, Mahnung).
+
+    Ohne eigene Vorlage gilt der Standardtext, abrufbar unter defaults/.
+    """
+    serializer_class = MailTemplateSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return MailTemplate.objects.filter(tenant=self.request.user.tenant)
+
+    def perform_create(self, serializer):
+        serializer.save(tenant=self.request.user.tenant)
+
+    @action(detail=False, methods=['get'])
+    def defaults(self, request):
+        """Standardvorlagen als Ausgangspunkt für eigene Texte"""
+        from .mail_templates import default_source
+
+        return Response({
+            kind: {part: default_source(kind, part) for part in ('subject', 'body')}
+            for kind, _ in MailTemplate.KIND_CHOICES
+        })
@@ -23,8 +23,13 @@ if TYPE_CHECKING:
 from .xrechnung import generate_xrechnung
 
 
-def generate_zugferd_pdf(invoice: 'Invoice') -> bytes:
-    """Generiert ZUGFeRD 2.1 PDF mit eingebettetem XML."""
+def generate_zugferd_pdf(invoice: 'Invoice', xml_content: str = None) -> bytes:
+    """
+    Generiert ZUGFeRD 2.1 PDF mit eingebettetem XML.
+
+    Ist xml_content bereits gerendert (z.B. bei der Archivierung), wird es
+    direkt eingebettet statt erneut erzeugt.
+    """
     
     pdf_buffer = io.BytesIO()
     doc = SimpleDocTemplate(
@@ -179,7 +184,8 @@ def generate_zugferd_pdf(invoice: 'Invoice') -> bytes:
     doc.build(elements)
     pdf_buffer.seek(0)
     
-    xml_content = generate_xrechnung(invoice)
+    if xml_content is None:
+        xml_content = generate_xrechnung(invoice)
     pdf_with_xml = _embed_xml_in_pdf(pdf_buffer.getvalue(), xml_content, invoice.invoice_number)
     
     return pdf_with_xml
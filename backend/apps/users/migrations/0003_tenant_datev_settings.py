@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_tenant_logo"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tenant",
+            name="datev_consultant_number",
+            field=models.CharField(blank=True, max_length=7),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="datev_client_number",
+            field=models.CharField(blank=True, max_length=5),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="datev_account_length",
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+    ]
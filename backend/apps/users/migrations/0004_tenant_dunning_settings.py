@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_tenant_datev_settings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tenant",
+            name="dunning_enabled",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="dunning_waiting_days",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name="tenant",
+            name="dunning_fees",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
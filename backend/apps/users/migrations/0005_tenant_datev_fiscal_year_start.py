@@ -0,0 +1,23 @@
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0004_tenant_dunning_settings"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tenant",
+            name="datev_fiscal_year_start",
+            field=models.PositiveSmallIntegerField(
+                default=1,
+                validators=[
+                    django.core.validators.MinValueValidator(1),
+                    django.core.validators.MaxValueValidator(12),
+                ],
+            ),
+        ),
+    ]
@@ -4,6 +4,7 @@ Custom User Model with Multi-Tenancy Support
 
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.base_user import BaseUserManager
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 
@@ -29,6 +30,20 @@ class Tenant(models.Model):
 
     logo = models.ImageField(upload_to="logos/", blank=True, null=True)
 
+    # DATEV (EXTF-Kopfsatz)
+    datev_consultant_number = models.CharField(max_length=7, blank=True)  # Beraternummer
+    datev_client_number = models.CharField(max_length=5, blank=True)  # Mandantennummer
+    datev_account_length = models.PositiveSmallIntegerField(default=4)  # Sachkontenlänge
+    # Monat des Wirtschaftsjahresbeginns (1 = Kalenderjahr)
+    datev_fiscal_year_start = models.PositiveSmallIntegerField(
+        default=1, validators=[MinValueValidator(1), MaxValueValidator(12)])
+
+    # Automatischer Mahnlauf; Wartefristen (Tage) und Gebühren je Mahnstufe,
+    # z.B. {"1": 7, "2": 14}, fehlende Stufen aus DUNNING_WAITING_DAYS / DUNNING_FEES
+    dunning_enabled = models.BooleanField(default=False)
+    dunning_waiting_days = models.JSONField(default=dict, blank=True)
+    dunning_fees = models.JSONField(default=dict, blank=True)
+
     is_active = models.BooleanField(default=True)
     subscription_plan = models.CharField(
         max_length=20,
@@ -14,9 +14,39 @@ class TenantSerializer(serializers.ModelSerializer):
             'email', 'phone',
             'bank_name', 'iban', 'bic',
             'logo',
+            'datev_consultant_number', 'datev_client_number', 'datev_account_length', 'datev_fiscal_year_start',
+            'dunning_enabled', 'dunning_waiting_days', 'dunning_fees',
         ]
         read_only_fields = ['id', 'slug']
 
+    def _per_level(self, value, child):
+        """Werte je Mahnstufe ({"1": ..., "3": ...}) prüfen, Schlüssel als Text speichern."""
+        from apps.invoices.bulk_send import MAX_REMINDER_LEVEL
+
+        if not isinstance(value, dict):
+            raise serializers.ValidationError("Erwartet ein Objekt mit Mahnstufe als Schlüssel.")
+
+        levels = {str(level) for level in range(1, MAX_REMINDER_LEVEL + 1)}
+        cleaned = {}
+        for level, item in value.items():
+            if str(level) not in levels:
+                raise serializers.ValidationError(
+                    f"Ungültige Mahnstufe {level!r}, erlaubt: 1-{MAX_REMINDER_LEVEL}.")
+            try:
+                cleaned[str(level)] = child.run_validation(item)
+            except serializers.ValidationError as e:
+                raise serializers.ValidationError({str(level): e.detail})
+        return cleaned
+
+    def validate_dunning_waiting_days(self, value):
+        return self._per_level(value, serializers.IntegerField(min_value=0))
+
+    def validate_dunning_fees(self, value):
+        fees = self._per_level(
+            value, serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0))
+        # JSONField: Beträge als Text, dunning_fees() liest sie als Decimal
+        return {level: str(fee) for level, fee in fees.items()}
+
     def get_logo(self, obj):
         if obj.logo:
             request = self.context.get('request')
@@ -50,4 +50,29 @@ class TestTenantAPI:
     def test_get_current_tenant(self, api_client, tenant):
         response = api_client.get("/api/tenants/current/")
         assert response.status_code == 200
-        assert response.data["name"] == "Test GmbH"
\ No newline at end of file
+        assert response.data["name"] == "Test GmbH"
+    def test_dunning_settings_saved_per_level(self, api_client, tenant):
+        response = api_client.patch("/api/tenants/current/", {
+            "dunning_waiting_days": {"1": 7, "2": 14},
+            "dunning_fees": {"2": "5.00", "3": 10},
+        }, format="json")
+
+        assert response.status_code == 200
+        tenant.refresh_from_db()
+        assert tenant.dunning_waiting_days == {"1": 7, "2": 14}
+        assert tenant.dunning_fees == {"2": "5.00", "3": "10.00"}
+
+    @pytest.mark.parametrize("field,value", [
+        ("dunning_waiting_days", {"1": "abc"}),
+        ("dunning_waiting_days", {"1": -3}),
+        ("dunning_waiting_days", {"4": 7}),
+        ("dunning_waiting_days", [7, 14]),
+        ("dunning_fees", {"1": "abc"}),
+        ("dunning_fees", {"2": "-5"}),
+        ("dunning_fees", {"x": 5}),
+    ])
+    def test_invalid_dunning_settings_rejected(self, api_client, field, value):
+        response = api_client.patch("/api/tenants/current/", {field: value}, format="json")
+
+        assert response.status_code == 400
+        assert field in response.data
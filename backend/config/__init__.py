@@ -1 +1,4 @@
 # Django config package
+from .celery import app as celery_app
+
+__all__ = ("celery_app",)
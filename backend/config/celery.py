@@ -0,0 +1,13 @@
+"""
+Celery App für Hintergrund-Tasks (Archivierung etc.)
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+app = Celery("config")
+app.config_from_object("django.conf:settings", namespace="CELERY")
+app.autodiscover_tasks()
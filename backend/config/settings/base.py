@@ -6,6 +6,7 @@ import os
 from datetime import timedelta
 from pathlib import Path
 
+from celery.schedules import crontab
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -205,8 +206,106 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_RESULT_SERIALIZER = "json"
 CELERY_TIMEZONE = TIME_ZONE
+# Periodische Tasks (celery -A config beat), Einträge bei den jeweiligen Einstellungen
+CELERY_BEAT_SCHEDULE = {}
+
+
+# Cache (zwischen Web-Prozessen und Worker geteilt, z.B. Validator-Status)
+CACHE_URL = os.getenv("CACHE_URL", "")
+if CACHE_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
 
 
 # Archive Settings (GoBD)
 ARCHIVE_ENCRYPTION_KEY = os.getenv("ARCHIVE_ENCRYPTION_KEY", "")
 ARCHIVE_RETENTION_YEARS = 10
+# "chunked" = dedupliziert (Chunks pro Mandant), "zip" = ein verschlüsseltes ZIP je Rechnung
+ARCHIVE_STORAGE_FORMAT = os.getenv("ARCHIVE_STORAGE_FORMAT", "chunked")
+
+
+# DATEV Export
+# Inkrementelle Exporte lassen die letzten Sekunden aus, damit noch offene
+# Transaktionen nicht hinter dem Watermark landen.
+DATEV_EXPORT_WATERMARK_LAG_SECONDS = int(os.getenv("DATEV_EXPORT_WATERMARK_LAG_SECONDS", "60"))
+
+# Exporte über mehrere Monate: Anzahl parallel erzeugter Monate (je eigene DB-Verbindung)
+EXPORT_SHARD_WORKERS = int(os.getenv("EXPORT_SHARD_WORKERS", "4"))
+
+
+# XRechnung Validator (KoSIT)
+VALIDATOR_URL = os.getenv("VALIDATOR_URL", "http://localhost:8081")
+# Mehrere Instanzen (kommagetrennt) werden im Round-Robin genutzt, leer = nur VALIDATOR_URL
+VALIDATOR_URLS = [url.strip() for url in os.getenv("VALIDATOR_URLS", "").split(",") if url.strip()]
+# Teil des Cache-Schlüssels für Validierungsergebnisse, zusammen mit der Version aus dem
+# Health-Monitor; ohne Monitor allein maßgeblich und dann bei jedem Validator-Update anpassen
+VALIDATOR_VERSION = os.getenv("VALIDATOR_VERSION", "xr-validator-service:302")
+VALIDATOR_TIMEOUT = float(os.getenv("VALIDATOR_TIMEOUT", "30"))
+VALIDATOR_HEALTH_TIMEOUT = float(os.getenv("VALIDATOR_HEALTH_TIMEOUT", "5"))
+# Health-Monitor (Celery Beat): Prüfintervall in Sekunden, Status verfällt nach 3 Intervallen
+VALIDATOR_HEALTH_INTERVAL = int(os.getenv("VALIDATOR_HEALTH_INTERVAL", "15"))
+CELERY_BEAT_SCHEDULE["validator-health"] = {
+    "task": "apps.invoices.tasks.probe_validator_health_task",
+    "schedule": VALIDATOR_HEALTH_INTERVAL,
+}
+# Verbindungspool = maximale Anzahl paralleler Validierungen je Prozess
+VALIDATOR_MAX_CONNECTIONS = int(os.getenv("VALIDATOR_MAX_CONNECTIONS", "10"))
+VALIDATOR_RETRIES = int(os.getenv("VALIDATOR_RETRIES", "2"))
+VALIDATOR_RETRY_BACKOFF = float(os.getenv("VALIDATOR_RETRY_BACKOFF", "0.5"))
+# Circuit Breaker: nach N Fehlern in Folge für X Sekunden keine Anfragen
+VALIDATOR_CIRCUIT_FAILURES = int(os.getenv("VALIDATOR_CIRCUIT_FAILURES", "5"))
+VALIDATOR_CIRCUIT_RESET_SECONDS = float(os.getenv("VALIDATOR_CIRCUIT_RESET_SECONDS", "30"))
+# XRechnung-Vorprüfung im Prozess (Pflichtfelder, Summen, Codelisten) vor dem Validator
+XRECHNUNG_PREVALIDATION = os.getenv("XRECHNUNG_PREVALIDATION", "True").lower() in ("true", "1", "yes")
+# Massenvalidierung: bis zu dieser Anzahl direkt, darüber als Hintergrund-Job
+VALIDATION_BATCH_SYNC_LIMIT = int(os.getenv("VALIDATION_BATCH_SYNC_LIMIT", "20"))
+
+
+# E-Mail-Outbox: Versand im Worker, Fehlschläge mit exponentiellem Backoff
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_RETRY_DELAY", "60"))  # Sekunden, verdoppelt sich je Versuch
+# Einträge, die so lange in "sending" hängen (Worker abgestürzt), werden neu eingereiht
+EMAIL_OUTBOX_SENDING_TIMEOUT = int(os.getenv("EMAIL_OUTBOX_SENDING_TIMEOUT", "600"))
+# SMTP-Verbindung je Worker: Mails je Verbindung (und je Batch-Task), max. Leerlauf in Sekunden
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", "100"))
+EMAIL_CONNECTION_MAX_IDLE = int(os.getenv("EMAIL_CONNECTION_MAX_IDLE", "60"))
+# Ratenbegrenzung: Mails je Zeitfenster (Sekunden) je Mandant und je SMTP-Server, 0 = unbegrenzt
+EMAIL_RATE_LIMIT_WINDOW = int(os.getenv("EMAIL_RATE_LIMIT_WINDOW", "60"))
+EMAIL_RATE_LIMIT_PER_TENANT = int(os.getenv("EMAIL_RATE_LIMIT_PER_TENANT", "600"))
+EMAIL_RATE_LIMIT_PER_PROVIDER = int(os.getenv("EMAIL_RATE_LIMIT_PER_PROVIDER", "1200"))
+CELERY_BEAT_SCHEDULE["email-outbox"] = {
+    "task": "apps.invoices.tasks.flush_outbox_task",
+    "schedule": 60,
+}
+
+
+# Automatischer Mahnlauf (Celery Beat, täglich; je Mandant über Tenant.dunning_enabled)
+# Wartefrist in Tagen: Stufe 1 ab Fälligkeit, weitere Stufen ab der vorherigen Mahnung
+DUNNING_WAITING_DAYS = {1: 7, 2: 14, 3: 14}
+DUNNING_FEES = {1: "0.00", 2: "5.00", 3: "10.00"}
+# Mahnungen je Transaktion beim Einreihen
+DUNNING_BATCH_SIZE = int(os.getenv("DUNNING_BATCH_SIZE", "500"))
+DUNNING_RUN_HOUR = int(os.getenv("DUNNING_RUN_HOUR", "6"))
+CELERY_BEAT_SCHEDULE["dunning-run"] = {
+    "task": "apps.invoices.tasks.run_dunning_task",
+    "schedule": crontab(hour=DUNNING_RUN_HOUR, minute=0),
+}
+
+
+# Nächtlicher Neuaufbau der Umsatz-Zusammenfassungen (Dashboard): gleicht Änderungen
+# außerhalb von track_summaries aus (queryset.update(), Shell)
+INVOICE_SUMMARY_REBUILD_HOUR = int(os.getenv("INVOICE_SUMMARY_REBUILD_HOUR", "3"))
+CELERY_BEAT_SCHEDULE["invoice-summaries"] = {
+    "task": "apps.invoices.tasks.rebuild_invoice_summaries_task",
+    "schedule": crontab(hour=INVOICE_SUMMARY_REBUILD_HOUR, minute=30),
+}
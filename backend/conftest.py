@@ -1,3 +1,6 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
 from decimal import Decimal
 from django.utils import timezone
@@ -9,11 +12,116 @@ from apps.products.models import Product
 from apps.invoices.models import Invoice, InvoiceItem
 
 
+@pytest.fixture(autouse=True)
+def archive_encryption_key(settings):
+    # Ohne festen Schlüssel erzeugt get_encryption_key() bei jedem Aufruf einen neuen
+    settings.ARCHIVE_ENCRYPTION_KEY = "test-archive-key"
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # LocMemCache lebt prozessweit, z.B. Validator-Status nicht zwischen Tests teilen
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
+    cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def close_smtp_connection():
+    # Die SMTP-Verbindung des Workers lebt im Thread weiter, je Test neu aufbauen
+    from apps.invoices.smtp_pool import close_connection
+
+    close_connection()
+    yield
+    close_connection()
+
+
+VALID_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<rep:report xmlns:rep="http://www.xoev.de/de/validator/varl/1" valid="true"/>""".encode("utf-8")
+
+INVALID_REPORT = """<?xml version="1.0" encoding="UTF-8"?>
+<rep:report xmlns:rep="http://www.xoev.de/de/validator/varl/1"
+            xmlns:svrl="http://purl.oclc.org/dsdl/svrl" valid="false">
+  <svrl:failed-assert id="BR-DE-15" flag="fatal">
+    <svrl:text>[BR-DE-15] Das Element "Buyer reference" (BT-10) muss übermittelt werden.</svrl:text>
+  </svrl:failed-assert>
+</rep:report>""".encode("utf-8")
+
+
+HEALTH_REPORT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<health><status>UP</status><version>1.5.0</version></health>"""
+
+
+class FakeValidator:
+    """Lokaler Ersatz für den KoSIT Validator (HTTP/1.1, Keep-Alive)."""
+
+    def __init__(self):
+        self.responses = []  # (status, body) in Reihenfolge, danach default
+        self.default = (200, VALID_REPORT)
+        self.requests = []
+        self.clients = set()
+        self.lock = threading.Lock()
+
+    def next_response(self):
+        with self.lock:
+            return self.responses.pop(0) if self.responses else self.default
+
+
+def _fake_validator_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, status, body):
+            self.send_response(status)
+            self.send_header("Content-Type", "application/xml")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with fake.lock:
+                fake.requests.append(body)
+                fake.clients.add(self.client_address)
+            self._reply(*fake.next_response())
+
+        def do_GET(self):
+            self._reply(200, HEALTH_REPORT)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def fake_validator(settings):
+    fake = FakeValidator()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _fake_validator_handler(fake))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    fake.url = f"http://127.0.0.1:{server.server_address[1]}"
+    settings.VALIDATOR_URL = fake.url
+    settings.VALIDATOR_RETRY_BACKOFF = 0
+    yield fake
+
+    server.shutdown()
+    server.server_close()
+
+
 @pytest.fixture
 def tenant(db):
     return Tenant.objects.create(
         name="Test GmbH",
         slug="test-gmbh",
+        street="Teststr. 1",
+        zip_code="10115",
+        city="Berlin",
+        email="rechnung@test-gmbh.de",
+        phone="+49 30 123456",
     )
 
 
@@ -69,6 +177,7 @@ def invoice(db, tenant, customer, user):
         due_date=timezone.now().date(),
         status="draft",
         format="xrechnung",
+        buyer_reference="PO-4711",
         created_by=user,
     )
 
@@ -1,6 +1,6 @@
 import { Injectable } from '@angular/core';
 import { HttpClient, HttpParams } from '@angular/common/http';
-import { Observable } from 'rxjs';
+import { Observable, filter, switchMap, take, throwError, timer } from 'rxjs';
 
 export interface PaginatedResponse<T> {
   count: number;
@@ -116,6 +116,15 @@ export interface Reminder {
   notes: string;
 }
 
+export interface ExportJob {
+  id: number;
+  kind: string;
+  status: 'queued' | 'running' | 'done' | 'failed';
+  processed_rows: number;
+  total_rows: number | null;
+  error: string;
+}
+
 export interface User {
   id: number;
   username: string;
@@ -286,16 +295,20 @@ export class ApiService {
   }
 
   exportDatev(from?: string, to?: string): Observable<Blob> {
-    let params = '';
-    if (from || to) {
-      const p = new URLSearchParams();
-      if (from) p.set('from', from);
-      if (to) p.set('to', to);
-      params = '?' + p.toString();
-    }
-    return this.http.get(`${this.API_URL}/invoices/export_datev/${params}`, {
-      responseType: 'blob'
-    });
+    const data: { from?: string; to?: string } = {};
+    if (from) data.from = from;
+    if (to) data.to = to;
+    // Export läuft als Hintergrund-Job: anlegen, Status abfragen, Datei laden
+    return this.http.post<ExportJob>(`${this.API_URL}/invoices/export_datev/`, data).pipe(
+      switchMap(job => timer(0, 1000).pipe(
+        switchMap(() => this.http.get<ExportJob>(`${this.API_URL}/invoices/export-jobs/${job.id}/`))
+      )),
+      filter(job => job.status === 'done' || job.status === 'failed'),
+      take(1),
+      switchMap(job => job.status === 'done'
+        ? this.http.get(`${this.API_URL}/invoices/export-jobs/${job.id}/download/`, { responseType: 'blob' })
+        : throwError(() => new Error(job.error)))
+    );
   }
 
   getDashboardStats(): Observable<DashboardStats> {